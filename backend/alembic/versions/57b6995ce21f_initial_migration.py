@@ -20,13 +20,29 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    # The tables as they were at this revision; later revisions add to them
+    op.create_table('items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('examine', sa.String(), nullable=True),
+    sa.Column('members', sa.String(), nullable=True),
+    sa.Column('icon', sa.String(), nullable=True),
+    sa.Column('icon_large', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('item_prices',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('high', sa.Float(), nullable=True),
+    sa.Column('highTime', sa.DateTime(), nullable=True),
+    sa.Column('low', sa.Float(), nullable=True),
+    sa.Column('lowTime', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_table('item_prices')
+    op.drop_table('items')
@@ -0,0 +1,33 @@
+"""unique index on item_prices.item_id
+
+Revision ID: aaf0ee5828dc
+Revises: 241f6e73cc0a
+Create Date: 2026-10-18 09:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aaf0ee5828dc'
+down_revision: Union[str, None] = '241f6e73cc0a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the newest price row per item so the unique index can be built
+    op.execute(
+        "DELETE FROM item_prices WHERE id NOT IN "
+        "(SELECT MAX(id) FROM item_prices GROUP BY item_id)"
+    )
+    op.create_index(op.f('ix_item_prices_item_id'), 'item_prices', ['item_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_item_prices_item_id'), table_name='item_prices')
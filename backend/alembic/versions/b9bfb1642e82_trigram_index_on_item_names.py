@@ -0,0 +1,35 @@
+"""trigram index on item names
+
+Revision ID: b9bfb1642e82
+Revises: 7a4d068bc5f3
+Create Date: 2026-10-18 11:20:53.904127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9bfb1642e82'
+down_revision: Union[str, None] = '7a4d068bc5f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # LOWER(name) LIKE '%q%' can only use an index through pg_trgm;
+    # other dialects search the in-process index instead.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_items_name_trgm ON items USING gin (lower(name) gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_items_name_trgm')
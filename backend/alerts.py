@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from models import PriceAlert
+
+logger = logging.getLogger(__name__)
+
+ALERT_FIELDS = ("high", "low")
+ALERT_DIRECTIONS = ("above", "below")
+# Untriggered alerts one client may hold at a time
+MAX_ALERTS_PER_CLIENT = int(os.getenv("MAX_ALERTS_PER_CLIENT", "100"))
+# Seconds between the leader's full reloads of its index, which pick up
+# alert events the backplane dropped
+ALERT_RESYNC_INTERVAL = float(os.getenv("ALERT_RESYNC_INTERVAL", "900"))
+
+
+class Rule(NamedTuple):
+    client_id: str
+    item_id: int
+    field: str
+    direction: str
+    threshold: float
+
+
+class AlertIndex:
+    """Active alerts as sorted ``(threshold, alert_id)`` lists per item.
+
+    There is one list per (item, field, direction). A price moving up from
+    ``old`` to ``new`` triggers the "above" alerts with thresholds in
+    ``(old, new]`` and a move down the "below" alerts in ``[new, old)``,
+    both found by bisection, so a refresh costs O(changed x log rules)
+    plus the matches themselves instead of a scan over every rule.
+
+    The index is read from the table once; after that every worker keeps
+    it current from the alert events and refreshes on the backplane.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thresholds: Dict[Tuple[int, str, str], List[Tuple[float, int]]] = {}
+        self.rules: Dict[int, Rule] = {}
+        # Set by sync(); until then alerts created on other workers may be missing
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def add(self, alert_id: int, rule: Rule):
+        with self.lock:
+            if alert_id in self.rules:
+                return
+            self.rules[alert_id] = rule
+            insort(self.thresholds.setdefault((rule.item_id, rule.field, rule.direction), []),
+                   (rule.threshold, alert_id))
+
+    def remove(self, alert_id: int) -> Optional[Rule]:
+        with self.lock:
+            rule = self.rules.pop(alert_id, None)
+            if rule is None:
+                return None
+            key = (rule.item_id, rule.field, rule.direction)
+            bucket = self.thresholds[key]
+            bucket.pop(bisect_left(bucket, (rule.threshold, alert_id)))
+            if not bucket:
+                del self.thresholds[key]
+            return rule
+
+    def match(self, item_id: int, field: str, old: Optional[float], new: Optional[float]) -> List[int]:
+        """Ids of the alerts a move from ``old`` to ``new`` crosses.
+
+        A missing price on either side crosses nothing.
+        """
+        if old is None or new is None or old == new:
+            return []
+        with self.lock:
+            if new > old:
+                bucket = self.thresholds.get((item_id, field, "above"), ())
+                start = bisect_right(bucket, (old, float("inf")))
+                end = bisect_right(bucket, (new, float("inf")))
+            else:
+                bucket = self.thresholds.get((item_id, field, "below"), ())
+                start = bisect_left(bucket, (new, float("-inf")))
+                end = bisect_left(bucket, (old, float("-inf")))
+            return [alert_id for _, alert_id in bucket[start:end]]
+
+    def sync(self, db: Session):
+        """Replace the index with every untriggered alert in the table.
+
+        Reading them all, rather than ids above the last one seen, picks up
+        alerts whose transactions committed out of id order and drops ones
+        deleted or triggered by any process.
+        """
+        rows = db.execute(
+            select(PriceAlert.id, PriceAlert.client_id, PriceAlert.item_id, PriceAlert.field,
+                   PriceAlert.direction, PriceAlert.threshold)
+            .where(PriceAlert.triggered_at.is_(None))
+        ).all()
+        rules = {alert_id: Rule(*rule) for alert_id, *rule in rows}
+        thresholds: Dict[Tuple[int, str, str], List[Tuple[float, int]]] = {}
+        for alert_id, rule in rules.items():
+            thresholds.setdefault((rule.item_id, rule.field, rule.direction), []).append((rule.threshold, alert_id))
+        for bucket in thresholds.values():
+            bucket.sort()
+        with self.lock:
+            self.rules, self.thresholds = rules, thresholds
+            self.loaded = True
+
+
+alert_index = AlertIndex()
+
+
+def sync_alerts(db: Session):
+    """Reload this worker's index from the table."""
+    alert_index.sync(db)
+
+
+def alert_event(alert_id: int, rule: Optional[Rule] = None) -> Dict:
+    """Backplane message adding an alert to every worker's index, or removing it without ``rule``."""
+    return {"type": "alert", "alert_id": alert_id, "rule": rule._asdict() if rule is not None else None}
+
+
+def apply_alert_event(message: Dict):
+    if message.get("rule") is None:
+        alert_index.remove(message["alert_id"])
+    else:
+        alert_index.add(message["alert_id"], Rule(**message["rule"]))
+
+
+def drop_alerts(alert_ids: Iterable[int]):
+    """Remove alerts another worker triggered from this worker's index."""
+    for alert_id in alert_ids:
+        alert_index.remove(alert_id)
+
+
+def rule_for(alert: PriceAlert) -> Rule:
+    return Rule(alert.client_id, alert.item_id, alert.field, alert.direction, alert.threshold)
+
+
+def check_alerts(db: Session, changes: Iterable[Tuple[int, str, Optional[float], Optional[float]]],
+                 at: Optional[datetime] = None) -> List[Dict]:
+    """Fire the alerts crossed by ``(item_id, field, old, new)`` price moves.
+
+    Crossed alerts are confirmed against the table, marked triggered and
+    dropped from the index; one ``price_alert`` message is returned per
+    alert that was still active.
+    """
+    if not alert_index.loaded:
+        alert_index.sync(db)
+    crossed: Dict[int, float] = {}
+    for item_id, field, old, new in changes:
+        for alert_id in alert_index.match(item_id, field, old, new):
+            crossed[alert_id] = new
+    if not crossed:
+        return []
+
+    active = set(db.execute(
+        select(PriceAlert.id).where(PriceAlert.id.in_(crossed), PriceAlert.triggered_at.is_(None))
+    ).scalars())
+    at = at or datetime.now()
+    messages = []
+    for alert_id, price in crossed.items():
+        rule = alert_index.remove(alert_id)
+        if rule is None or alert_id not in active:
+            continue
+        messages.append({
+            "type": "price_alert",
+            "alert_id": alert_id,
+            "client_id": rule.client_id,
+            "item_id": rule.item_id,
+            "field": rule.field,
+            "direction": rule.direction,
+            "threshold": rule.threshold,
+            "price": price,
+            "triggered_at": at.isoformat(),
+        })
+    if messages:
+        db.execute(update(PriceAlert), [
+            {"id": message["alert_id"], "triggered_at": at, "triggered_price": message["price"]}
+            for message in messages
+        ])
+        db.commit()
+        logger.info(f"Triggered {len(messages)} price alerts")
+    return messages
@@ -0,0 +1,98 @@
+from typing import Dict, Iterable, Optional, Sequence
+import numpy as np
+import os
+
+NATURE_RUNE_ID = 561
+# Grand Exchange sale tax, rounded down and capped per item
+GE_TAX_RATE = float(os.getenv("GE_TAX_RATE", "0.02"))
+GE_TAX_CAP = float(os.getenv("GE_TAX_CAP", "5000000"))
+# History window the volatility is computed over, from 5m rollups
+VOLATILITY_WINDOW_HOURS = float(os.getenv("VOLATILITY_WINDOW_HOURS", "24"))
+
+ANALYTICS_FIELDS = ("margin", "roi", "alch_profit", "spread_pct", "volatility")
+
+
+def to_floats(values: Iterable[Optional[float]]) -> np.ndarray:
+    """Float array with NaN for missing (None) values."""
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+
+def rolling_volatility(ids: Sequence[int], tick_item_ids: Sequence[int],
+                       tick_highs: Sequence[Optional[float]], tick_lows: Sequence[Optional[float]]) -> np.ndarray:
+    """Standard deviation of log returns of the mid price, in percent.
+
+    Ticks, such as 5m rollup averages, must be ordered by item id, then
+    time. Items with fewer than two
+    returns in the window get NaN.
+    """
+    result = np.full(len(ids), np.nan)
+    if len(tick_item_ids) < 3 or not len(ids):
+        return result
+
+    items = np.asarray(tick_item_ids)
+    high, low = to_floats(tick_highs), to_floats(tick_lows)
+    # One-sided ticks use the side that traded
+    mid = np.where(np.isnan(high), low, np.where(np.isnan(low), high, (high + low) / 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.diff(np.log(np.where(mid > 0, mid, np.nan)))
+    keep = (items[1:] == items[:-1]) & np.isfinite(returns)
+    if not keep.any():
+        return result
+
+    unique, inverse = np.unique(items[1:][keep], return_inverse=True)
+    returns = returns[keep]
+    counts = np.bincount(inverse)
+    sums = np.bincount(inverse, weights=returns)
+    squares = np.bincount(inverse, weights=returns * returns)
+    variance = (squares - sums * sums / counts) / np.maximum(counts - 1, 1)
+    volatility = np.where(counts >= 2, np.sqrt(np.maximum(variance, 0)) * 100, np.nan)
+
+    id_array = np.asarray(ids)
+    order = np.argsort(id_array, kind="stable")
+    index = np.searchsorted(id_array[order], unique).clip(max=len(ids) - 1)
+    found = id_array[order][index] == unique
+    result[order[index[found]]] = volatility[found]
+    return result
+
+
+def compute_analytics(ids: Sequence[int], highs: Sequence[Optional[float]], lows: Sequence[Optional[float]],
+                      highalchs: Sequence[Optional[int]],
+                      volatility: Optional[Sequence[Optional[float]]] = None) -> Dict[str, np.ndarray]:
+    """Trading signals for every item in one vectorized pass.
+
+    ``margin`` is the instant-sell price after tax minus the instant-buy
+    price, ``roi`` that margin as a percentage of the buy price, and
+    ``alch_profit`` what high-alching an item bought at its high price
+    earns after paying for a nature rune. ``volatility`` is passed through,
+    aligned with ``ids`` (see ``rolling_volatility``). Missing inputs give
+    NaN.
+    """
+    high = to_floats(highs)
+    low = to_floats(lows)
+    highalch = to_floats(highalchs)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tax = np.minimum(np.floor(high * GE_TAX_RATE), GE_TAX_CAP)
+        margin = high - tax - low
+        roi = np.where(low > 0, margin / low * 100, np.nan)
+        spread_pct = np.where(high > 0, (high - low) / high * 100, np.nan)
+
+    nature = np.nan
+    if NATURE_RUNE_ID in ids:
+        nature = high[list(ids).index(NATURE_RUNE_ID)]
+    alch_profit = highalch - high - nature
+
+    volatility = to_floats(volatility) if volatility is not None else np.full(len(ids), np.nan)
+
+    return {
+        "margin": margin,
+        "roi": roi,
+        "alch_profit": alch_profit,
+        "spread_pct": spread_pct,
+        "volatility": volatility,
+    }
+
+
+def as_column(values: np.ndarray) -> tuple:
+    """Snapshot column: floats, with None where a value is missing."""
+    return tuple(None if value != value else value for value in values.tolist())
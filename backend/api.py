@@ -1,12 +1,32 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from sqlalchemy import func, asc, desc
-from database import SessionLocal
-from models import Item, ItemPrice
-from schemas import ItemsPricesResponse, ItemSchema, ItemDetailSchema
+from sqlalchemy import func, asc, desc, and_, or_
+from database import SessionLocal, run_in_db_thread
+from models import Item, ItemPrice, PriceAlert
+from schemas import (
+    ItemsPricesResponse, ItemSchema, ItemAnalyticsSchema, ItemDetailSchema, PriceHistoryResponse,
+    PricePointSchema, ItemBatchResponse, SuggestResponse, SuggestionSchema, AnalyticsTopResponse, AlertCreate, AlertSchema
+)
+from snapshot import SNAPSHOT_ENABLED, get_snapshot
+from search import suggest_rows
+from serialization import LISTING_FIELDS, encode_row, page_json
+from history import pick_resolution, query_history
+from analytics import ANALYTICS_FIELDS
+from cache import RESPONSE_CACHE_MAX_AGE, generation, response_cache
+from metrics import render_metrics
+from alerts import MAX_ALERTS_PER_CLIENT, alert_event, alert_index, rule_for
+from backplane import backplane
+from jobs import scheduler as job_scheduler
+from export import EXPORT_COLUMNS, export_stream, pa
+import base64
+import json
 import logging
-from typing import Optional
-from datetime import datetime
+import os
+from collections import OrderedDict
+from typing import Callable, List, Optional, Union
+from datetime import datetime, timedelta
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -18,122 +38,567 @@ def get_db():
     finally:
         db.close()
 
+SORT_COLUMNS = {
+    "name": Item.name,
+    "high": ItemPrice.high,
+    "low": ItemPrice.low,
+    "highTime": ItemPrice.highTime,
+    "lowTime": ItemPrice.lowTime,
+}
+# Columns a listing row is projected from, in ItemSchema order
+LISTING_COLUMNS = {"id": Item.id, **SORT_COLUMNS}
+# Everything ``fields=`` may select
+ROW_FIELDS = LISTING_FIELDS + ANALYTICS_FIELDS
+# Tiebreaker per sort column: the id on the same table, so the composite
+# (column, id) index serves the whole ORDER BY
+TIEBREAKERS = {"name": Item.id}
+TIME_COLUMNS = {"highTime", "lowTime"}
+ANALYTICS_PATTERN = "|".join(ANALYTICS_FIELDS)
+
+# Most ids /api/items/batch answers in one request
+BATCH_MAX_IDS = int(os.getenv("ITEMS_BATCH_MAX_IDS", "500"))
+
+# Filtered totals for the SQL path, keyed by data generation
+COUNT_CACHE_SIZE = 256
+_count_cache: "OrderedDict[tuple, int]" = OrderedDict()
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def _encode(payload) -> bytes:
+    if isinstance(payload, bytes):
+        # Already assembled from pre-encoded fragments
+        return payload
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+async def cached_json(request: Request, key: tuple, build: Callable[[], object]) -> Response:
+    """Serve ``build()`` as JSON through the response cache.
+
+    ``key`` must identify the normalized request parameters. Cached bodies
+    are reused until the next data refresh bumps the generation, and a
+    matching ``If-None-Match`` gets an empty 304. Hits are answered on the
+    event loop; misses build and encode on the database thread pool.
+    """
+    entry = response_cache.get(key)
+    if entry is None:
+        built_for = generation()
+        body = await run_in_db_thread(lambda: _encode(build()))
+        entry = response_cache.set(key, body, built_for)
+
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={RESPONSE_CACHE_MAX_AGE}"}
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def encode_cursor(sort_by: str, sort_order: str, value, item_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort_by, sort_order, value, item_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str):
+    """Return the ``(value, id)`` of the last row of the previous page."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_order, value, item_id = json.loads(raw)
+        if value is not None and sort_by in TIME_COLUMNS:
+            value = datetime.fromisoformat(value)
+        item_id = int(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (cursor_sort_by, cursor_sort_order) != (sort_by, sort_order):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort_by/sort_order")
+    return value, item_id
+
+def escape_like(value: str) -> str:
+    """Match ``%`` and ``_`` literally, like the in-memory search does."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _keyset_filter(order_col, sort_order: str, value, last_id: int, id_col=Item.id):
+    """Rows strictly after ``(value, last_id)`` in the listing order.
+
+    Ascending puts NULLs last and descending is its exact reverse, which is
+    PostgreSQL's default and what the snapshot path serves.
+    """
+    if sort_order == "desc":
+        if value is None:
+            return or_(and_(order_col.is_(None), id_col < last_id), order_col.isnot(None))
+        return or_(order_col < value, and_(order_col == value, id_col < last_id))
+    if value is None:
+        return and_(order_col.is_(None), id_col > last_id)
+    return or_(order_col > value, and_(order_col == value, id_col > last_id), order_col.is_(None))
+
 @router.get("/api/items-prices", response_model=ItemsPricesResponse)
-def get_items(
+async def get_items(
+    request: Request,
     db: Session = Depends(get_db),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
     search: str = Query("", alias="search"),
-    sort_by: str = Query("name", pattern="^(name|high|low|highTime|lowTime)$"),
+    sort_by: str = Query("name", pattern=f"^(name|high|low|highTime|lowTime|{ANALYTICS_PATTERN})$"),
     sort_order: str = Query("asc", pattern="^(asc|desc)$"),
     min_high: Optional[float] = Query(None),
     max_high: Optional[float] = Query(None),
     min_low: Optional[float] = Query(None),
     max_low: Optional[float] = Query(None),
-    membership: Optional[str] = Query(None)
+    membership: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; offset then counts from the cursor"),
+    include_total: bool = Query(True),
+    analytics: bool = Query(False, description="Include margin, roi, alch_profit, spread_pct and volatility"),
+    min_margin: Optional[float] = Query(None),
+    max_margin: Optional[float] = Query(None),
+    min_roi: Optional[float] = Query(None),
+    max_roi: Optional[float] = Query(None),
+    min_alch_profit: Optional[float] = Query(None),
+    max_alch_profit: Optional[float] = Query(None),
+    min_spread_pct: Optional[float] = Query(None),
+    max_spread_pct: Optional[float] = Query(None),
+    min_volatility: Optional[float] = Query(None),
+    max_volatility: Optional[float] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated row fields to return (id is always included)")
 ):
+    params = dict(
+        limit=limit, offset=offset, search=search, sort_by=sort_by, sort_order=sort_order,
+        min_high=min_high, max_high=max_high, min_low=min_low, max_low=max_low,
+        membership=membership, cursor=cursor, include_total=include_total, analytics=analytics,
+        min_margin=min_margin, max_margin=max_margin, min_roi=min_roi, max_roi=max_roi,
+        min_alch_profit=min_alch_profit, max_alch_profit=max_alch_profit,
+        min_spread_pct=min_spread_pct, max_spread_pct=max_spread_pct,
+        min_volatility=min_volatility, max_volatility=max_volatility, fields=parse_fields(fields)
+    )
+    # Search is case-insensitive on both paths, so fold it into one entry
+    key = ("items-prices",) + tuple(sorted({**params, "search": search.lower()}.items()))
+    return await cached_json(request, key, lambda: list_items(db, encoded=True, **params))
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple]:
+    """``fields=`` as a tuple in row order, without ``id``; None for every field."""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(ROW_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in ROW_FIELDS if field in requested and field != "id")
+
+def list_items(
+    db: Session,
+    limit: int = 50,
+    offset: int = 0,
+    search: str = "",
+    sort_by: str = "name",
+    sort_order: str = "asc",
+    min_high: Optional[float] = None,
+    max_high: Optional[float] = None,
+    min_low: Optional[float] = None,
+    max_low: Optional[float] = None,
+    membership: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    analytics: bool = False,
+    encoded: bool = False,
+    fields: Optional[tuple] = None,
+    **analytics_ranges: Optional[float]
+) -> Union[ItemsPricesResponse, bytes]:
+    """Filtered, sorted page of priced items.
+
+    ``analytics_ranges`` takes ``min_<field>``/``max_<field>`` bounds for
+    the analytics fields. Those fields only exist in the in-memory
+    snapshot, so sorting or filtering on them uses it even when
+    ``PRICE_SNAPSHOT_ENABLED`` is off.
+
+    With ``encoded`` set, snapshot pages without analytics come back as
+    the response body already encoded, joined from the snapshot's cached
+    per-item JSON; the body is identical to encoding the model.
+
+    ``fields`` (see ``parse_fields``) trims rows to those columns plus
+    ``id``, selecting only what they need on the SQL path. Rows that
+    partial do not fit the schema, so such pages are always encoded.
+    """
     try:
-        base_query = db.query(Item).join(ItemPrice).filter(Item.price != None)
-
-        if search:
-            base_query = base_query.filter(func.lower(Item.name).like(f"%{search.lower()}%"))
-        if membership:
-            base_query = base_query.filter(Item.members == membership)
-        if min_high is not None:
-            base_query = base_query.filter(ItemPrice.high >= min_high)
-        if max_high is not None:
-            base_query = base_query.filter(ItemPrice.high <= max_high)
-        if min_low is not None:
-            base_query = base_query.filter(ItemPrice.low >= min_low)
-        if max_low is not None:
-            base_query = base_query.filter(ItemPrice.low <= max_low)
-
-        # Sorting
-        if sort_by == "name":
-            order_col = Item.name
-        elif sort_by == "high":
-            order_col = ItemPrice.high
-        elif sort_by == "low":
-            order_col = ItemPrice.low
-        elif sort_by == "highTime":
-            order_col = ItemPrice.highTime
-        elif sort_by == "lowTime":
-            order_col = ItemPrice.lowTime
-        else:
-            order_col = Item.name
+        if fields is not None and any(field in ANALYTICS_FIELDS for field in fields):
+            analytics = True
+        after = decode_cursor(cursor, sort_by, sort_order) if cursor else None
+        ranges = {
+            field: (analytics_ranges.get(f"min_{field}"), analytics_ranges.get(f"max_{field}"))
+            for field in ANALYTICS_FIELDS
+            if analytics_ranges.get(f"min_{field}") is not None or analytics_ranges.get(f"max_{field}") is not None
+        }
+        needs_analytics = sort_by in ANALYTICS_FIELDS or bool(ranges)
 
-        if sort_order == "desc":
-            base_query = base_query.order_by(desc(order_col))
+        snapshot = get_snapshot() if SNAPSHOT_ENABLED or needs_analytics else None
+        if snapshot is None and needs_analytics:
+            raise HTTPException(status_code=503, detail="Analytics are not available yet")
+        if snapshot is not None:
+            total, page = snapshot.query_positions(
+                limit=limit + 1,
+                offset=offset,
+                search=search,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                min_high=min_high,
+                max_high=max_high,
+                min_low=min_low,
+                max_low=max_low,
+                membership=membership,
+                after=after,
+                ranges=ranges
+            )
+            # The extra row only tells us whether another page exists
+            next_cursor = None
+            if len(page) > limit:
+                page = page[:limit]
+                last = page[-1]
+                next_cursor = encode_cursor(sort_by, sort_order, snapshot.columns[sort_by][last], snapshot.ids[last])
+            if encoded and fields is None and not analytics:
+                return page_json(total if include_total else None, len(page), limit, offset,
+                                 [snapshot.fragment(pos) for pos in page], next_cursor)
+            rows = [snapshot.row(pos) for pos in page]
         else:
-            base_query = base_query.order_by(asc(order_col))
-
-        total = base_query.count()
-        items = base_query.offset(offset).limit(limit).all()
-
-        results = [
-            ItemSchema(
-                id=item.id,
-                name=item.name,
-                high=item.price.high,
-                low=item.price.low,
-                highTime=item.price.highTime,
-                lowTime=item.price.lowTime
+            # Only the columns the page shows (and the cursor needs), as plain rows;
+            # the inner join already drops items without a price
+            columns = {
+                name: column for name, column in LISTING_COLUMNS.items()
+                if fields is None or name in ("id", sort_by) or name in fields
+            }
+            base_query = db.query(*(column.label(name) for name, column in columns.items())).join(
+                ItemPrice, ItemPrice.item_id == Item.id
             )
-            for item in items
-        ]
 
+            if search:
+                base_query = base_query.filter(func.lower(Item.name).like(f"%{escape_like(search.lower())}%", escape="\\"))
+            if membership:
+                base_query = base_query.filter(Item.members == membership)
+            if min_high is not None:
+                base_query = base_query.filter(ItemPrice.high >= min_high)
+            if max_high is not None:
+                base_query = base_query.filter(ItemPrice.high <= max_high)
+            if min_low is not None:
+                base_query = base_query.filter(ItemPrice.low >= min_low)
+            if max_low is not None:
+                base_query = base_query.filter(ItemPrice.low <= max_low)
+
+            total = None
+            if include_total:
+                count_key = (generation(), search.lower(), membership, min_high, max_high, min_low, max_low)
+                total = _count_cache.get(count_key)
+                if total is None:
+                    total = base_query.count()
+                    _count_cache[count_key] = total
+                    if len(_count_cache) > COUNT_CACHE_SIZE:
+                        _count_cache.popitem(last=False)
+                else:
+                    _count_cache.move_to_end(count_key)
+
+            # Sorting, with id as tiebreaker so keyset pages are stable
+            order_col = SORT_COLUMNS.get(sort_by, Item.name)
+            id_col = TIEBREAKERS.get(sort_by, ItemPrice.item_id)
+            if sort_order == "desc":
+                base_query = base_query.order_by(desc(order_col).nulls_first(), desc(id_col))
+            else:
+                base_query = base_query.order_by(asc(order_col).nulls_last(), asc(id_col))
+
+            if after is not None:
+                base_query = base_query.filter(_keyset_filter(order_col, sort_order, *after, id_col=id_col))
+
+            rows = [row._asdict() for row in base_query.offset(offset).limit(limit + 1).all()]
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(sort_by, sort_order, rows[-1][sort_by], rows[-1]["id"])
+
+        if analytics:
+            # Analytics come from the latest snapshot on both paths
+            current = get_snapshot()
+            rows = [
+                {**row, **(current.analytics(current.positions[row["id"]])
+                           if current is not None and row["id"] in current.positions else {})}
+                for row in rows
+            ]
+
+        if fields is not None:
+            return page_json(total if include_total else None, len(rows), limit, offset,
+                             [encode_row(row, ("id",) + fields) for row in rows], next_cursor)
+
+        schema = ItemAnalyticsSchema if analytics else ItemSchema
         return ItemsPricesResponse(
-            total=total,
-            count=len(results),
+            total=total if include_total else None,
+            count=len(rows),
             limit=limit,
             offset=offset,
-            results=results
+            results=[schema(**row) for row in rows],
+            next_cursor=next_cursor
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in list_items: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/api/items/search/suggest", response_model=SuggestResponse)
+def suggest_items(
+    db: Session = Depends(get_db),
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50)
+):
+    try:
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            index = snapshot.search_index
+            results = [
+                SuggestionSchema(id=index.ids[pos], name=index.names[pos])
+                for pos in index.suggest(q, limit)
+            ]
+            return SuggestResponse(query=q, results=results)
+
+        # No snapshot yet: the pg_trgm index narrows to substring matches,
+        # which are then filtered and ranked exactly like the index does
+        needle = escape_like(q.lower().strip())
+        rows = (
+            db.query(Item.id, Item.name)
+            .join(ItemPrice)
+            .filter(func.lower(Item.name).like(f"%{needle}%", escape="\\"))
+            .all()
         )
+        return SuggestResponse(query=q, results=[
+            SuggestionSchema(id=row.id, name=row.name) for row in suggest_rows(q, rows, limit)
+        ])
     except Exception as e:
-        logger.error(f"Error in get_items: {e}", exc_info=True)
+        logger.error(f"Error in suggest_items: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def _detail_rows(db: Session, ids) -> dict:
+    """``ItemDetailSchema`` per id found, from one projection query."""
+    rows = (
+        db.query(*(column.label(name) for name, column in EXPORT_COLUMNS.items()))
+        .outerjoin(ItemPrice, ItemPrice.item_id == Item.id)
+        .filter(Item.id.in_(ids))
+        .all()
+    )
+    return {row.id: ItemDetailSchema(**row._asdict()) for row in rows}
+
+def parse_ids(ids: str) -> List[int]:
+    """Comma-separated ids, deduplicated in request order."""
+    try:
+        parsed = list(dict.fromkeys(int(item_id) for item_id in ids.split(",") if item_id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not parsed:
+        raise HTTPException(status_code=400, detail="ids is empty")
+    if len(parsed) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request")
+    return parsed
+
+# Registered before /api/items/{item_id} so "batch" is not taken for an id
+@router.get("/api/items/batch", response_model=ItemBatchResponse)
+async def get_items_batch(request: Request, ids: str = Query(..., description="Comma-separated item ids"),
+                          db: Session = Depends(get_db)):
+    item_ids = parse_ids(ids)
+    return await cached_json(request, ("items-batch",) + tuple(item_ids), lambda: items_batch(db, item_ids))
+
+def items_batch(db: Session, item_ids: List[int]) -> ItemBatchResponse:
+    try:
+        found = _detail_rows(db, item_ids)
+        return ItemBatchResponse(
+            results=[found[item_id] for item_id in item_ids if item_id in found],
+            missing=[item_id for item_id in item_ids if item_id not in found]
+        )
+    except Exception as e:
+        logger.error(f"Error in items_batch: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/api/items/{item_id}", response_model=ItemDetailSchema)
-def get_item_detail(item_id: int, db: Session = Depends(get_db)):
+async def get_item_detail(item_id: int, request: Request, db: Session = Depends(get_db)):
+    return await cached_json(request, ("item", item_id), lambda: item_detail(db, item_id))
+
+def item_detail(db: Session, item_id: int) -> ItemDetailSchema:
     try:
-        item = db.query(Item).filter(Item.id == item_id).first()
+        item = _detail_rows(db, [item_id]).get(item_id)
         if not item:
             raise HTTPException(status_code=404, detail="Item not found")
-        
-        return ItemDetailSchema(
-            id=item.id,
-            name=item.name,
-            examine=item.examine,
-            members=item.members,
-            icon=item.icon,
-            icon_large=item.icon_large,
-            high=item.price.high if item.price else None,
-            low=item.price.low if item.price else None,
-            highTime=item.price.highTime if item.price else None,
-            lowTime=item.price.lowTime if item.price else None
+        return item
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in item_detail: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/api/items/{item_id}/history", response_model=PriceHistoryResponse)
+def get_item_history(
+    item_id: int,
+    db: Session = Depends(get_db),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    resolution: str = Query("auto", pattern="^(auto|raw|5m|1h|1d)$")
+):
+    try:
+        end = end or datetime.now()
+        start = start or end - timedelta(days=1)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if resolution == "auto":
+            resolution = pick_resolution(start, end)
+
+        points = query_history(db, item_id, start, end, resolution)
+        return PriceHistoryResponse(
+            item_id=item_id,
+            resolution=resolution,
+            start=start,
+            end=end,
+            points=[PricePointSchema(**point) for point in points]
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in get_item_detail: {e}", exc_info=True)
+        logger.error(f"Error in get_item_history: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/api/stats")
-def get_stats(db: Session = Depends(get_db)):
+async def get_stats(request: Request, db: Session = Depends(get_db)):
+    return await cached_json(request, ("stats",), lambda: stats(db))
+
+def stats(db: Session) -> dict:
     try:
-        total_items = db.query(Item).count()
-        items_with_prices = db.query(Item).join(ItemPrice).count()
-        latest_update = db.query(func.max(ItemPrice.highTime)).scalar()
-        
+        # One pass: item_prices holds at most one row per item
+        total_items, items_with_prices, latest_update = db.query(
+            func.count(Item.id), func.count(ItemPrice.id), func.max(ItemPrice.highTime)
+        ).outerjoin(ItemPrice, ItemPrice.item_id == Item.id).one()
+
         return {
             "total_items": total_items,
             "items_with_prices": items_with_prices,
             "latest_update": latest_update.isoformat() if latest_update else None
         }
     except Exception as e:
-        logger.error(f"Error in get_stats: {e}", exc_info=True)
+        logger.error(f"Error in stats: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/api/analytics/top", response_model=AnalyticsTopResponse)
+async def get_analytics_top(
+    request: Request,
+    metric: str = Query("margin", pattern=f"^({ANALYTICS_PATTERN})$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(20, ge=1, le=100),
+    membership: Optional[str] = Query(None)
+):
+    key = ("analytics-top", metric, order, limit, membership)
+    return await cached_json(request, key, lambda: analytics_top(metric, order, limit, membership))
+
+def analytics_top(metric: str, order: str = "desc", limit: int = 20, membership: Optional[str] = None) -> AnalyticsTopResponse:
+    """Items ranked by one analytics field; items without a value are left out."""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Analytics are not available yet")
+    results = [
+        ItemAnalyticsSchema(**snapshot.row(pos), **snapshot.analytics(pos))
+        for pos in snapshot.top(metric, limit, descending=order == "desc", membership=membership)
+    ]
+    return AnalyticsTopResponse(metric=metric, order=order, results=results)
+
+async def publish_alert_event(message: dict):
+    try:
+        await backplane.publish(message)
+    except Exception as e:
+        # Stored either way; the leader's periodic resync picks the change up
+        logger.error(f"Error publishing alert event: {e}")
+
+@router.post("/api/alerts", response_model=AlertSchema, status_code=201)
+async def create_alert(alert: AlertCreate, db: Session = Depends(get_db)):
+    """Alert once when an item's price crosses ``threshold``.
+
+    Matches are pushed to the client's ``/ws?client_id=...`` sockets.
+    """
+    row, rule = await run_in_db_thread(store_alert, db, alert)
+    alert_index.add(row.id, rule)
+    # Whichever worker leads checks it against new prices
+    await publish_alert_event(alert_event(row.id, rule))
+    return row
+
+def store_alert(db: Session, alert: AlertCreate):
+    try:
+        if db.get(Item, alert.item_id) is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        active = db.query(PriceAlert).filter(
+            PriceAlert.client_id == alert.client_id, PriceAlert.triggered_at.is_(None)
+        ).count()
+        if active >= MAX_ALERTS_PER_CLIENT:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_ALERTS_PER_CLIENT} active alerts per client")
+
+        row = PriceAlert(**alert.model_dump())
+        db.add(row)
+        db.commit()
+        return row, rule_for(row)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in store_alert: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/api/alerts", response_model=List[AlertSchema])
+def list_alerts(client_id: str = Query(..., min_length=1, max_length=64), db: Session = Depends(get_db)):
+    try:
+        return (
+            db.query(PriceAlert)
+            .filter(PriceAlert.client_id == client_id)
+            .order_by(PriceAlert.id)
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"Error in list_alerts: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.delete("/api/alerts/{alert_id}", status_code=204)
+async def delete_alert(alert_id: int, client_id: str = Query(..., min_length=1, max_length=64),
+                       db: Session = Depends(get_db)):
+    await run_in_db_thread(remove_alert, db, alert_id, client_id)
+    alert_index.remove(alert_id)
+    await publish_alert_event(alert_event(alert_id))
+    return Response(status_code=204)
+
+def remove_alert(db: Session, alert_id: int, client_id: str):
+    try:
+        row = db.query(PriceAlert).filter(PriceAlert.id == alert_id, PriceAlert.client_id == client_id).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Alert not found")
+        db.delete(row)
+        db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in remove_alert: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/api/export")
+def export_items(format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$")):
+    """The whole catalogue with prices as one gzip-compressed download.
+
+    Rows are streamed from a server-side cursor in ``EXPORT_BATCH_SIZE``
+    batches and compressed as they go, so memory use does not grow with
+    the catalogue. The stream has its own session, since the body is sent
+    after ``get_db`` would have closed one.
+    """
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=501, detail="Arrow export needs pyarrow installed")
+    return StreamingResponse(
+        export_stream(SessionLocal, format),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="items.{format}.gz"'}
+    )
+
+@router.get("/api/jobs")
+def get_jobs():
+    """Run counts, timings and failures of this worker's background jobs."""
+    return {"jobs": job_scheduler.stats()}
+
+@router.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Database pool and query metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @router.get("/api/health")
 def health_check():
     return {
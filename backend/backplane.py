@@ -0,0 +1,335 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import unquote, urlparse
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# memory://, unix:///path/to/socket or redis://[:password@]host:port/db
+BACKPLANE_URL = os.getenv("BACKPLANE_URL", "memory://")
+# Seconds a leader holds the lock without renewing it
+LEADER_TTL = float(os.getenv("LEADER_TTL", "30"))
+REDIS_CHANNEL = os.getenv("BACKPLANE_CHANNEL", "osrs:prices")
+REDIS_LEADER_KEY = os.getenv("BACKPLANE_LEADER_KEY", "osrs:leader")
+RECONNECT_DELAY = 1.0
+# Largest newline-delimited message accepted on the Unix socket
+MAX_LINE_SIZE = 64 * 1024 * 1024
+
+# Identifies this process in published messages and the leader lock
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+Handler = Callable[[Dict], Awaitable[None]]
+
+
+class Backplane:
+    """Fan-out channel between the processes serving WebSockets.
+
+    Every published message is delivered to the handler of every process,
+    including the publisher's own. ``acquire_leadership`` elects the one
+    process that runs the upstream fetch loop.
+    """
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+        self.leader = False
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def publish(self, message: Dict):
+        raise NotImplementedError
+
+    async def acquire_leadership(self) -> bool:
+        """Take or renew leadership; True while this process holds it."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def _deliver(self, message: Dict):
+        if self.handler is None:
+            return
+        try:
+            await self.handler(message)
+        except Exception as e:
+            logger.error(f"Error handling backplane message: {e}", exc_info=True)
+
+    async def maintain_leadership(self):
+        while True:
+            try:
+                leader = await self.acquire_leadership()
+            except Exception as e:
+                logger.error(f"Leader election error: {e}")
+                leader = False
+            if leader != self.leader:
+                logger.info(f"{NODE_ID} {'is now' if leader else 'is no longer'} the leader")
+            self.leader = leader
+            await asyncio.sleep(LEADER_TTL / 3)
+
+
+class InProcessBackplane(Backplane):
+    """Single process: publishing calls the local handler directly."""
+
+    async def publish(self, message: Dict):
+        await self._deliver(message)
+
+    async def acquire_leadership(self) -> bool:
+        return True
+
+
+class UnixSocketBackplane(Backplane):
+    """Workers on one host, joined through a Unix socket.
+
+    Leadership is an exclusive ``flock`` on ``<path>.lock``, which the OS
+    releases when the leader exits. The leader also runs the hub: it
+    listens on ``path`` and relays every newline-delimited JSON message
+    to all connected workers.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.lock_file = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.peers: Set[asyncio.StreamWriter] = set()
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.follow_task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self.follow_task = asyncio.create_task(self._follow())
+
+    async def acquire_leadership(self) -> bool:
+        if self.server is not None:
+            return True
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        # Whoever held the lock before is gone; its socket file is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve_peer, self.path, limit=MAX_LINE_SIZE)
+        if self.writer is not None:
+            self.writer.close()
+        return True
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.peers.add(writer)
+        try:
+            while line := await reader.readline():
+                await self._relay(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+
+    async def _relay(self, line: bytes):
+        for peer in list(self.peers):
+            try:
+                peer.write(line)
+            except Exception:
+                self.peers.discard(peer)
+        await self._deliver(json.loads(line))
+
+    async def _follow(self):
+        """Receive messages from the hub until this process becomes it."""
+        while self.lock_file is None:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_SIZE)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            if self.lock_file is not None:
+                # Won the election while connecting: this process is the hub
+                writer.close()
+                break
+            self.writer = writer
+            try:
+                while line := await reader.readline():
+                    await self._deliver(json.loads(line))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.writer.close()
+                self.writer = None
+
+    async def publish(self, message: Dict):
+        line = json.dumps(message, separators=(",", ":")).encode() + b"\n"
+        if self.server is not None:
+            await self._relay(line)
+        elif self.writer is not None:
+            self.writer.write(line)
+            await self.writer.drain()
+        else:
+            logger.warning("Backplane hub unavailable, dropping message")
+
+    async def close(self):
+        if self.follow_task is not None:
+            self.follow_task.cancel()
+        if self.server is not None:
+            self.server.close()
+            for peer in list(self.peers):
+                peer.close()
+            self.server = None
+        if self.writer is not None:
+            self.writer.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def _encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RuntimeError(f"Redis error: {body.decode()}")
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(body)
+        return None if length < 0 else [await _read_reply(reader) for _ in range(length)]
+    raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+
+# Compare-and-act on the leader key in one step, so a node whose lock
+# expired meanwhile cannot extend or delete its successor's
+RENEW_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+    "return redis.call('PEXPIRE', KEYS[1], ARGV[2]) else return 0 end"
+)
+RELEASE_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+    "return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+
+
+class RedisBackplane(Backplane):
+    """Nodes joined through Redis pub/sub, spoken directly in RESP.
+
+    Leadership is a ``SET NX PX`` key holding this node's id, renewed by
+    the holder well before it expires.
+    """
+
+    def __init__(self, url: str, channel: str = REDIS_CHANNEL, leader_key: str = REDIS_LEADER_KEY,
+                 node_id: str = NODE_ID):
+        super().__init__()
+        self.node_id = node_id
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.channel = channel
+        self.leader_key = leader_key
+        self.connection = None
+        self.lock = asyncio.Lock()
+        self.subscribe_task: Optional[asyncio.Task] = None
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup: List[tuple] = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(_encode_command(*command))
+            await _read_reply(reader)
+        return reader, writer
+
+    async def command(self, *args):
+        async with self.lock:
+            try:
+                if self.connection is None:
+                    self.connection = await self._connect()
+                reader, writer = self.connection
+                writer.write(_encode_command(*args))
+                return await _read_reply(reader)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                # Reconnect on the next command
+                if self.connection is not None:
+                    self.connection[1].close()
+                self.connection = None
+                raise
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self.subscribe_task = asyncio.create_task(self._subscribe())
+
+    async def _subscribe(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                writer.write(_encode_command("SUBSCRIBE", self.channel))
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and reply[0] == b"message":
+                        await self._deliver(json.loads(reply[2]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Backplane subscription lost: {e}")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def publish(self, message: Dict):
+        await self.command("PUBLISH", self.channel, json.dumps(message, separators=(",", ":")))
+
+    async def acquire_leadership(self) -> bool:
+        ttl_ms = int(LEADER_TTL * 1000)
+        if await self.command("SET", self.leader_key, self.node_id, "NX", "PX", ttl_ms) == "OK":
+            return True
+        return await self.command("EVAL", RENEW_SCRIPT, 1, self.leader_key, self.node_id, ttl_ms) == 1
+
+    async def close(self):
+        if self.subscribe_task is not None:
+            self.subscribe_task.cancel()
+        if self.leader:
+            await self.command("EVAL", RELEASE_SCRIPT, 1, self.leader_key, self.node_id)
+        if self.connection is not None:
+            self.connection[1].close()
+            self.connection = None
+
+
+def create_backplane(url: str = BACKPLANE_URL) -> Backplane:
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return UnixSocketBackplane(parsed.path)
+    if parsed.scheme == "redis":
+        return RedisBackplane(url)
+    if parsed.scheme != "memory":
+        raise RuntimeError(f"Unsupported BACKPLANE_URL: {url}")
+    return InProcessBackplane()
+
+
+backplane = create_backplane()
@@ -0,0 +1,74 @@
+"""Run the benchmark suite and write the results to JSON.
+
+    cd backend
+    python -m benchmarks --output results.json
+    python -m benchmarks --suites ingest --sizes 4000 --postgres postgresql://bench@localhost/bench
+    python -m benchmarks --suites http --base-url http://localhost:8000
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import os
+import sys
+
+# database.py refuses to import without a URL; the benchmarks use their own engines
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.payloads import DEFAULT_SIZES  # noqa: E402
+from benchmarks.results import print_results, write_results  # noqa: E402
+
+SUITES = ("ingest", "http", "ws")
+
+
+def _ints(value: str) -> list:
+    return [int(part) for part in value.split(",") if part]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Ingest and API benchmarks")
+    parser.add_argument("--suites", default=",".join(SUITES), help="comma-separated subset of ingest,http,ws")
+    parser.add_argument("--sizes", type=_ints, default=list(DEFAULT_SIZES), help="item counts, e.g. 4000,40000")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per ingest and fan-out case")
+    parser.add_argument("--postgres", default=os.getenv("BENCH_POSTGRES_URL"),
+                        help="scratch Postgres database for the ingest suite (dropped and recreated)")
+    parser.add_argument("--base-url", help="benchmark a running server instead of an in-process app")
+    parser.add_argument("--requests", type=int, default=500, help="HTTP requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent HTTP requests")
+    parser.add_argument("--ws-clients", type=_ints, default=[10, 100, 1000, 5000], help="client counts to fan out to")
+    parser.add_argument("--ws-updates", type=int, default=1000, help="price entries per broadcast")
+    parser.add_argument("--output", default="benchmark-results.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suites = [suite for suite in args.suites.split(",") if suite]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise SystemExit(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+    results = []
+    if "ingest" in suites:
+        from benchmarks import ingest
+        results += ingest.run(args.sizes, repeat=args.repeat, postgres_url=args.postgres)
+    if "http" in suites or "ws" in suites:
+        from benchmarks import load
+        if "http" in suites:
+            for size in args.sizes:
+                results += load.bench_http(size, args.requests, args.concurrency, base_url=args.base_url)
+                if args.base_url:
+                    # The server's catalogue size is whatever it holds
+                    break
+        if "ws" in suites:
+            results += load.bench_ws(args.ws_clients, args.ws_updates, args.repeat)
+
+    print_results(results)
+    options = {key: value for key, value in vars(args).items() if key != "postgres"}
+    options["postgres"] = bool(args.postgres)
+    write_results(args.output, results, options)
+    print(f"Wrote {len(results)} results to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare two results files case by case.
+
+    python -m benchmarks.compare before.json after.json [--stat p50] [--threshold 0.10]
+
+Exits with status 1 when any case got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+
+def _key(entry: Dict) -> Tuple:
+    return (entry["suite"], entry["name"], tuple(sorted(entry["params"].items())))
+
+
+def compare(before: Dict, after: Dict, stat: str = "p50", threshold: float = 0.10):
+    """``(rows, regressions)`` where each row is ``(key, old, new, ratio)``."""
+    old = {_key(entry): entry["stats"][stat] for entry in before["results"]}
+    rows, regressions = [], []
+    for entry in after["results"]:
+        key = _key(entry)
+        if key not in old:
+            continue
+        new = entry["stats"][stat]
+        ratio = new / old[key] if old[key] else float("inf")
+        rows.append((key, old[key], new, ratio))
+        if ratio > 1 + threshold:
+            regressions.append(rows[-1])
+    return rows, regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--stat", default="p50", choices=("min", "p50", "p99", "mean", "max"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows, regressions = compare(before, after, args.stat, args.threshold)
+
+    print(f"{before['meta'].get('commit') or '?'} -> {after['meta'].get('commit') or '?'} ({args.stat})")
+    for (suite, name, params), old, new, ratio in rows:
+        marker = " REGRESSION" if ratio > 1 + args.threshold else ""
+        label = " ".join(f"{key}={value}" for key, value in params)
+        print(f"{suite:7} {name:32} {label:48} {old:.6f} -> {new:.6f} ({ratio - 1:+.1%}){marker}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Microbenchmarks for the write path: ``upsert_items``, ``update_prices``
+and a whole ``fetch_and_store`` cycle against a local stand-in for the
+prices API.
+
+Every repeat starts from an empty schema, which is dropped and recreated;
+point ``--postgres`` at a scratch database.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import fetcher
+import snapshot
+from backplane import InProcessBackplane
+from models import Base
+
+from benchmarks.payloads import make_latest, make_mapping
+from benchmarks.results import result
+
+
+def _engine(backend: str, url: Optional[str]):
+    if backend == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
+
+def _timed(fn, *args, **kwargs) -> float:
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+class PayloadServer:
+    """Serves generated payloads as ``/mapping`` and ``/latest``, without validators."""
+
+    def __init__(self, mapping: List[Dict], latest: Dict):
+        self.mapping = json.dumps(mapping).encode()
+        self.latest = json.dumps(latest).encode()
+
+    async def mapping_handler(self, request):
+        return web.Response(body=self.mapping, content_type="application/json")
+
+    async def latest_handler(self, request):
+        return web.Response(body=self.latest, content_type="application/json")
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/mapping", self.mapping_handler)
+        app.router.add_get("/latest", self.latest_handler)
+        return app
+
+
+def bench_crud(engine, size: int, backend: str, repeat: int) -> List[Dict]:
+    mapping = make_mapping(size)
+    latest = make_latest(size)
+    moved = make_latest(size, seed=1, base=latest)
+    prices, moved_prices = latest["data"], moved["data"]
+    Session = sessionmaker(bind=engine)
+
+    samples: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = Session()
+        try:
+            for name, fn, payload in (
+                ("upsert_items/insert", crud.upsert_items, mapping),
+                ("upsert_items/unchanged", crud.upsert_items, mapping),
+                ("update_prices/insert", crud.update_prices, prices),
+                ("update_prices/unchanged", crud.update_prices, prices),
+                ("update_prices/changed_10pct", crud.update_prices, moved_prices),
+            ):
+                samples.setdefault(name, []).append(_timed(fn, db, payload))
+        finally:
+            db.close()
+    return [result("ingest", name, times, backend=backend, items=size) for name, times in samples.items()]
+
+
+def bench_fetch_and_store(engine, size: int, backend: str, repeat: int) -> List[Dict]:
+    """Cold cycle into an empty database, then one with 10% of prices moved.
+
+    The fetcher writes through sync sessions, so both backends take the same path.
+    """
+    mapping = make_mapping(size)
+    latest = make_latest(size)
+    server_payloads = PayloadServer(mapping, latest)
+    moved = json.dumps(make_latest(size, seed=1, base=latest)).encode()
+    Session = sessionmaker(bind=engine)
+
+    saved = {name: getattr(fetcher, name)
+             for name in ("SessionLocal", "API_BASE", "backplane", "_price_state")}
+    samples: Dict[str, List[float]] = {"fetch_and_store/cold": [], "fetch_and_store/changed_10pct": []}
+
+    async def scenario():
+        server = TestServer(server_payloads.app())
+        await server.start_server()
+        fetcher.API_BASE = str(server.make_url("")).rstrip("/")
+        try:
+            for _ in range(repeat):
+                Base.metadata.drop_all(bind=engine)
+                Base.metadata.create_all(bind=engine)
+                fetcher._validators.clear()
+                fetcher._mapping_hash = None
+                fetcher._price_state = None
+                server_payloads.latest = json.dumps(latest).encode()
+                for name in samples:
+                    started = time.perf_counter()
+                    # fetch_and_store's steps, minus the handler that would log and hide failures
+                    async with aiohttp.ClientSession() as session:
+                        await fetcher.sync_mapping(session)
+                        await fetcher.sync_prices(session)
+                    samples[name].append(time.perf_counter() - started)
+                    server_payloads.latest = moved
+        finally:
+            await server.close()
+
+    fetcher.SessionLocal = Session
+    fetcher.backplane = InProcessBackplane()
+    try:
+        asyncio.run(scenario())
+    finally:
+        for name, value in saved.items():
+            setattr(fetcher, name, value)
+        snapshot.publish(None)
+    return [result("ingest", name, times, backend=backend, items=size) for name, times in samples.items()]
+
+
+def run(sizes, repeat: int = 3, postgres_url: Optional[str] = None) -> List[Dict]:
+    backends = [("sqlite", None)]
+    if postgres_url:
+        backends.append(("postgres", postgres_url))
+
+    results = []
+    for backend, url in backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = _engine(backend, url or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            try:
+                for size in sizes:
+                    results += bench_crud(engine, size, backend, repeat)
+                    results += bench_fetch_and_store(engine, size, backend, repeat)
+                Base.metadata.drop_all(bind=engine)
+            finally:
+                engine.dispose()
+    return results
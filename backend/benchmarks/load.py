@@ -0,0 +1,177 @@
+"""Load drivers: ``/api/items-prices`` latency under concurrency, and the
+time to fan one refresh out to N WebSocket clients.
+
+HTTP runs in-process against a seeded SQLite database through the ASGI
+transport, or against a running server with ``--base-url``. Fan-out is
+always measured in-process with fake sockets, so it times the server's
+own work: routing, encoding and queueing every frame.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import api
+import cache
+import crud
+import snapshot
+import websocket
+from models import Base
+from websocket import ConnectionManager, PriceFilter
+
+from benchmarks.payloads import make_latest, make_mapping
+from benchmarks.results import result
+
+# (name, query params) for each HTTP scenario; "{offset}" is randomised per request
+HTTP_SCENARIOS = (
+    ("items-prices/first-page", {"limit": 50}),
+    ("items-prices/random-page", {"limit": 50, "offset": "{offset}"}),
+    ("items-prices/search", {"limit": 50, "search": "rune"}),
+    ("items-prices/sorted-filtered", {"limit": 50, "sort_by": "high", "sort_order": "desc",
+                                      "min_high": 1000, "membership": "true"}),
+)
+
+
+def _seeded_app(size: int, url: str) -> FastAPI:
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        crud.upsert_items(db, make_mapping(size))
+        crud.update_prices(db, make_latest(size)["data"])
+        snapshot.refresh_snapshot(db)
+    finally:
+        db.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(api.router)
+    app.dependency_overrides[api.get_db] = get_db
+    return app
+
+
+async def _drive(client: httpx.AsyncClient, params: Dict, requests: int, concurrency: int,
+                 size: int) -> List[float]:
+    rng = random.Random(0)
+    latencies: List[float] = []
+    pending = iter(range(requests))
+
+    async def worker():
+        for _ in pending:
+            query = {key: str(value).format(offset=rng.randrange(0, max(size - 50, 1)))
+                     for key, value in params.items()}
+            started = time.perf_counter()
+            response = await client.get("/api/items-prices", params=query)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def bench_http(size: int, requests: int, concurrency: int, base_url: Optional[str] = None) -> List[Dict]:
+    async def scenario(client):
+        results = []
+        for name, params in HTTP_SCENARIOS:
+            cache.bump_generation()
+            latencies = await _drive(client, params, requests, concurrency, size)
+            results.append(result("http", name, latencies, items=size, concurrency=concurrency,
+                                  target="server" if base_url else "in-process"))
+        return results
+
+    async def against_server():
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            return await scenario(client)
+
+    if base_url:
+        return asyncio.run(against_server())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = _seeded_app(size, f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+
+        async def in_process():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await scenario(client)
+
+        try:
+            return asyncio.run(in_process())
+        finally:
+            snapshot.publish(None)
+
+
+class CountingSocket:
+    """Fake socket that only counts the frames it is sent."""
+
+    def __init__(self, sent: List[int]):
+        self.sent = sent
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent[0] += 1
+
+    async def send_bytes(self, data):
+        self.sent[0] += 1
+
+
+async def _fan_out(clients: int, updates: int, encoding: str, mode: str, repeat: int) -> Dict[str, List[float]]:
+    manager = ConnectionManager()
+    sent = [0]
+    rng = random.Random(0)
+    for _ in range(clients):
+        socket = CountingSocket(sent)
+        await manager.connect(socket, encoding=encoding)
+        if mode == "watchlist":
+            manager.subscribe(socket, item_ids=rng.sample(range(1, updates * 2), 20))
+        elif mode == "filtered":
+            manager.subscribe(socket, price_filter=PriceFilter(min_high=rng.choice((1000, 10000, 100000))))
+    await asyncio.sleep(0)
+
+    base = make_latest(updates)["data"]
+    timings: Dict[str, List[float]] = {"enqueue": [], "delivered": []}
+    for cycle in range(repeat):
+        entries = [
+            websocket.price_entry(int(key), entry["high"], entry["low"], None, None)
+            for key, entry in make_latest(updates, seed=cycle + 1, base={"data": base}, changed=1.0)["data"].items()
+        ]
+        sent[0] = 0
+        started = time.perf_counter()
+        await manager.broadcast_prices(entries)
+        timings["enqueue"].append(time.perf_counter() - started)
+        expected = sum(len(client.queue) for client in manager.active_connections.values())
+        while sent[0] < expected:
+            await asyncio.sleep(0)
+        timings["delivered"].append(time.perf_counter() - started)
+
+    for socket in list(manager.active_connections):
+        manager.disconnect(socket)
+    return timings
+
+
+def bench_ws(client_counts, updates: int, repeat: int, encodings=("json", "packed"),
+             modes=("firehose", "watchlist", "filtered")) -> List[Dict]:
+    results = []
+    for clients in client_counts:
+        for encoding in encodings:
+            for mode in modes:
+                timings = asyncio.run(_fan_out(clients, updates, encoding, mode, repeat))
+                for phase, samples in timings.items():
+                    results.append(result("ws", f"fan-out/{phase}", samples, clients=clients,
+                                          updates=updates, encoding=encoding, mode=mode))
+    return results
@@ -0,0 +1,71 @@
+"""Synthetic /mapping and /latest payloads shaped like the prices API's."""
+import random
+from typing import Dict, List, Optional
+
+# Sizes the suite runs at by default: today's catalogue and two growth steps
+DEFAULT_SIZES = (4000, 40000, 400000)
+
+WORDS = (
+    "abyssal", "adamant", "amulet", "arrow", "bones", "bow", "dragon", "dust", "essence", "gloves",
+    "granite", "helm", "logs", "magic", "maul", "mithril", "ore", "potion", "rune", "scroll",
+    "shield", "staff", "steel", "sword", "teak", "whip", "yew", "zamorak",
+)
+# Upstream timestamps are epoch seconds; fixed so payloads are reproducible
+BASE_TIME = 1700000000
+
+
+def make_mapping(size: int, seed: int = 0) -> List[Dict]:
+    """``size`` items with the fields ``/mapping`` serves."""
+    rng = random.Random(seed)
+    items = []
+    for item_id in range(1, size + 1):
+        name = " ".join(rng.sample(WORDS, 2)).capitalize() + f" {item_id}"
+        value = rng.randint(1, 2_000_000)
+        item = {
+            "id": item_id,
+            "name": name,
+            "examine": f"A synthetic {name.lower()}.",
+            "members": rng.random() < 0.6,
+            "icon": f"{name}.png",
+            "value": value,
+            "limit": rng.choice((70, 100, 8000, 25000)),
+        }
+        # Untradeable-ish items have no alch values upstream
+        if rng.random() < 0.9:
+            item["lowalch"] = value * 2 // 5
+            item["highalch"] = value * 3 // 5
+        items.append(item)
+    return items
+
+
+def make_latest(size: int, seed: int = 0, base: Optional[Dict] = None, changed: float = 0.1) -> Dict:
+    """A ``/latest`` body for items ``1..size``.
+
+    Without ``base`` every price is new. With one, a ``changed`` fraction of
+    its entries move and the rest are repeated as they were, which is what
+    a refresh a minute later looks like.
+    """
+    rng = random.Random(seed)
+    if base is not None:
+        data = {key: dict(entry) for key, entry in base["data"].items()}
+        for key in rng.sample(sorted(data), int(len(data) * changed)):
+            entry = data[key]
+            for side in ("high", "low"):
+                if entry[side] is not None:
+                    entry[side] = max(1, int(entry[side] * rng.uniform(0.95, 1.05)))
+                    entry[f"{side}Time"] += 60
+        return {"data": data}
+
+    data = {}
+    for item_id in range(1, size + 1):
+        low = rng.randint(1, 2_000_000)
+        high = low + rng.randint(0, max(1, low // 20))
+        entry = {"high": high, "highTime": BASE_TIME - rng.randint(0, 3600),
+                 "low": low, "lowTime": BASE_TIME - rng.randint(0, 3600)}
+        # Some items have only traded on one side recently
+        if rng.random() < 0.03:
+            entry["high"] = None
+        elif rng.random() < 0.03:
+            entry["low"] = None
+        data[str(item_id)] = entry
+    return {"data": data}
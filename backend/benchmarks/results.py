@@ -0,0 +1,70 @@
+"""Timing summaries and the JSON results file."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+import sqlalchemy
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict:
+    return {
+        "n": len(samples),
+        "min": min(samples),
+        "p50": percentile(samples, 50),
+        "p99": percentile(samples, 99),
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+    }
+
+
+def result(suite: str, name: str, samples: Sequence[float], unit: str = "s", **params) -> Dict:
+    """One benchmark case; ``params`` identify it across runs."""
+    return {"suite": suite, "name": name, "params": params, "unit": unit,
+            "stats": summarize(samples), "samples": list(samples)}
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(("git", *args), capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def metadata() -> Dict:
+    return {
+        "commit": _git("rev-parse", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlalchemy": sqlalchemy.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path: str, results: List[Dict], options: Dict):
+    with open(path, "w") as f:
+        json.dump({"meta": {**metadata(), "options": options}, "results": results}, f, indent=2)
+
+
+def print_results(results: List[Dict]):
+    for entry in results:
+        stats = entry["stats"]
+        params = " ".join(f"{key}={value}" for key, value in entry["params"].items())
+        scale = 1000 if entry["unit"] == "s" else 1
+        unit = "ms" if entry["unit"] == "s" else entry["unit"]
+        print(f"{entry['suite']:7} {entry['name']:32} {params:40} "
+              f"p50={stats['p50'] * scale:10.2f}{unit} p99={stats['p99'] * scale:10.2f}{unit} n={stats['n']}")
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+import hashlib
+import os
+import threading
+
+# Entries kept across all cached endpoints
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Seconds clients may reuse a response without revalidating
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "30"))
+
+_generation = 0
+
+
+def generation() -> int:
+    """Counter identifying the current data set; bumped after each refresh."""
+    return _generation
+
+
+def bump_generation() -> int:
+    global _generation
+    _generation += 1
+    response_cache.clear()
+    return _generation
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    generation: int
+
+
+class ResponseCache:
+    """Size-capped LRU of encoded JSON bodies.
+
+    Entries remember the generation they were built for and are treated
+    as misses once the data has been refreshed.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.generation != _generation:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: Hashable, body: bytes, built_for: int) -> CachedResponse:
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        entry = CachedResponse(body, etag, built_for)
+        # A response built before a refresh finished must not be stored
+        if built_for != _generation:
+            return entry
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+response_cache = ResponseCache()
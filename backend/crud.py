@@ -1,5 +1,8 @@
+from sqlalchemy import select, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from models import Item, ItemPrice
+from database import run_db
 from datetime import datetime
 import logging
 
@@ -11,99 +14,221 @@ ALLOWED_ITEM_FIELDS = {
     'lowalch', 'highalch', 'value'
 }
 
-def upsert_items(db: Session, items: list):
-    for item_data in items:
+PRICE_FIELDS = ('high', 'highTime', 'low', 'lowTime')
+
+# Rows per multi-row statement. Keeps bind parameter counts far below the
+# SQLite (32766) and PostgreSQL (65535) limits.
+BULK_CHUNK_SIZE = 500
+
+# Dialects with native INSERT ... ON CONFLICT DO UPDATE support
+UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def _chunks(rows: list, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _bulk_write(db: Session, model, conflict_column: str, inserts: list, updates: list):
+    """Write new and changed rows in multi-row statements.
+
+    PostgreSQL and SQLite get a single ``INSERT ... ON CONFLICT DO UPDATE``
+    per chunk. Other dialects fall back to a batched INSERT plus a batched
+    UPDATE by primary key, which requires ``updates`` to carry the key.
+    """
+    upsert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if upsert is None:
+        if inserts:
+            db.execute(insert(model), inserts)
+        if updates:
+            db.execute(update(model), updates)
+        return
+
+    rows = inserts + [
+        {k: v for k, v in row.items() if k != 'id' or conflict_column == 'id'}
+        for row in updates
+    ]
+    for chunk in _chunks(rows):
+        stmt = upsert(model).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[conflict_column],
+            set_={col: stmt.excluded[col] for col in chunk[0] if col not in ('id', conflict_column)}
+        )
+        db.execute(stmt)
+
+
+def _normalize_item(item_data: dict) -> dict:
+    row = {k: v for k, v in item_data.items() if k in ALLOWED_ITEM_FIELDS}
+    row['id'] = int(row['id'])
+
+    # Ensure required fields are present and of correct type
+    for field in ['lowalch', 'highalch', 'value']:
         try:
-            # Ensure required fields are present and of correct type
-            for field in ['lowalch', 'highalch', 'value']:
-                if field not in item_data or item_data[field] is None:
-                    item_data[field] = 0
-                else:
-                    try:
-                        item_data[field] = int(item_data[field])
-                    except Exception:
-                        item_data[field] = 0
-
-            item = db.query(Item).filter_by(id=item_data['id']).first()
-            if item:
-                # Update existing item fields only if allowed
-                for key, value in item_data.items():
-                    if key in ALLOWED_ITEM_FIELDS:
-                        setattr(item, key, value)
-            else:
-                # Filter unwanted fields and create new item
-                filtered_data = {k: v for k, v in item_data.items() if k in ALLOWED_ITEM_FIELDS}
-                item = Item(**filtered_data)
-                db.add(item)
+            row[field] = int(row.get(field) or 0)
+        except Exception:
+            row[field] = 0
 
-            db.commit()
+    # The column is a string; store booleans the way PostgreSQL renders them
+    if isinstance(row.get('members'), bool):
+        row['members'] = 'true' if row['members'] else 'false'
+    return row
+
+
+def upsert_items(db: Session, items: list) -> dict:
+    """Insert or update the item mapping in a single transaction.
+
+    Existing rows are read back once per chunk to classify each entry, and
+    only new or changed items are written. Returns inserted/updated/unchanged
+    counts.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
 
+    rows = {}
+    for item_data in items:
+        try:
+            row = _normalize_item(item_data)
+            rows[row['id']] = row
         except Exception as e:
-            db.rollback()
             logger.error(f"Error upserting item {item_data.get('id')}: {e}")
-            continue
+            counts['skipped'] += 1
+
+    columns = sorted(set().union(*rows.values())) if rows else []
+    item_columns = [getattr(Item, col) for col in columns]
+
+    try:
+        inserts, updates = [], []
+        for chunk in _chunks(list(rows.values())):
+            existing = {
+                row.id: row
+                for row in db.execute(
+                    select(*item_columns).where(Item.id.in_([r['id'] for r in chunk]))
+                )
+            }
+            for row in chunk:
+                row = {col: row.get(col) for col in columns}
+                current = existing.get(row['id'])
+                if current is None:
+                    inserts.append(row)
+                elif any(getattr(current, col) != row[col] for col in columns):
+                    updates.append(row)
+                else:
+                    counts['unchanged'] += 1
 
-    logger.info("Items updated successfully")
+        _bulk_write(db, Item, 'id', inserts, updates)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error in upsert_items: {e}", exc_info=True)
+        db.rollback()
+        raise
 
+    counts['inserted'] = len(inserts)
+    counts['updated'] = len(updates)
+    logger.info(
+        f"Items upserted: {counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged"
+    )
+    return counts
+
+
+def _normalize_price(item_id, data: dict):
+    # Ensure all price keys exist
+    if not all(key in data for key in ["high", "low", "highTime", "lowTime"]):
+        logger.warning(f"Invalid price data for item {item_id}")
+        return None
 
-def update_prices(db: Session, prices: dict):
     try:
-        updated_count = 0
-        for item_id, data in prices.items():
-            try:
-                item = db.query(Item).get(int(item_id))
-                if not item:
-                    logger.warning(f"Item {item_id} not found in database")
-                    continue
+        high_time = datetime.fromtimestamp(data['highTime'])
+        low_time = datetime.fromtimestamp(data['lowTime'])
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid timestamp for item {item_id}: {e}")
+        return None
 
-                # Ensure all price keys exist
-                if not all(key in data for key in ["high", "low", "highTime", "lowTime"]):
-                    logger.warning(f"Invalid price data for item {item_id}")
-                    continue
+    return {
+        'item_id': int(item_id),
+        'high': data['high'],
+        'highTime': high_time,
+        'low': data['low'],
+        'lowTime': low_time,
+    }
+
+
+def update_prices(db: Session, prices: dict, commit: bool = True) -> dict:
+    """Insert or update latest prices in a single transaction.
+
+    Prices for items missing from the database and malformed entries are
+    skipped. With ``commit=False`` the caller owns the transaction, which
+    lets a streamed payload be written chunk by chunk and committed once.
+    Returns inserted/updated/unchanged/skipped counts.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+    rows = []
+    for item_id, data in prices.items():
+        try:
+            row = _normalize_price(item_id, data)
+        except Exception as e:
+            logger.error(f"Error updating price for item {item_id}: {e}")
+            row = None
+        if row is None:
+            counts['skipped'] += 1
+        else:
+            rows.append(row)
 
-                try:
-                    high_time = datetime.fromtimestamp(data['highTime'])
-                    low_time = datetime.fromtimestamp(data['lowTime'])
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Invalid timestamp for item {item_id}: {e}")
+    try:
+        inserts, updates = [], []
+        for chunk in _chunks(rows):
+            chunk_ids = [row['item_id'] for row in chunk]
+            known_ids = set(db.scalars(select(Item.id).where(Item.id.in_(chunk_ids))))
+            existing = {
+                row.item_id: row
+                for row in db.execute(
+                    select(ItemPrice.id, ItemPrice.item_id, *[getattr(ItemPrice, f) for f in PRICE_FIELDS])
+                    .where(ItemPrice.item_id.in_(chunk_ids))
+                )
+            }
+            for row in chunk:
+                if row['item_id'] not in known_ids:
+                    logger.warning(f"Item {row['item_id']} not found in database")
+                    counts['skipped'] += 1
                     continue
 
-                price = db.query(ItemPrice).filter_by(item_id=item.id).first()
-                if price:
-                    # Update only if values are changed
-                    if (
-                        price.high != data['high'] or
-                        price.highTime != high_time or
-                        price.low != data['low'] or
-                        price.lowTime != low_time
-                    ):
-                        price.high = data['high']
-                        price.highTime = high_time
-                        price.low = data['low']
-                        price.lowTime = low_time
-                        updated_count += 1
+                current = existing.get(row['item_id'])
+                if current is None:
+                    inserts.append(row)
+                # Update only if values are changed
+                elif any(getattr(current, f) != row[f] for f in PRICE_FIELDS):
+                    updates.append({'id': current.id, **row})
                 else:
-                    # Create new record
-                    price = ItemPrice(
-                        item_id=item.id,
-                        high=data['high'],
-                        highTime=high_time,
-                        low=data['low'],
-                        lowTime=low_time
-                    )
-                    db.add(price)
-                    updated_count += 1
-            except Exception as e:
-                logger.error(f"Error updating price for item {item_id}: {e}")
-                continue
-
-        if updated_count > 0:
-            db.commit()
-            logger.info(f"Prices updated for {updated_count} items")
-        else:
-            logger.info("No prices were updated")
+                    counts['unchanged'] += 1
 
+        _bulk_write(db, ItemPrice, 'item_id', inserts, updates)
+        if commit:
+            db.commit()
     except Exception as e:
         logger.error(f"Error in update_prices: {e}", exc_info=True)
         db.rollback()
         raise
+
+    counts['inserted'] = len(inserts)
+    counts['updated'] = len(updates)
+    if inserts or updates:
+        logger.info(f"Prices updated for {len(inserts) + len(updates)} items")
+    else:
+        logger.info("No prices were updated")
+    return counts
+
+
+async def upsert_items_async(db, items: list) -> dict:
+    """``upsert_items`` for callers on the event loop.
+
+    Accepts an ``AsyncSession`` or a plain ``Session``; see ``database.run_db``.
+    """
+    return await run_db(db, upsert_items, items)
+
+
+async def update_prices_async(db, prices: dict, commit: bool = True) -> dict:
+    """``update_prices`` for callers on the event loop."""
+    return await run_db(db, update_prices, prices, commit=commit)
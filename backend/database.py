@@ -1,14 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from models import Base
+from metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL environment variable not set!")
 
-engine = create_engine(DATABASE_URL)
+# Threads available for blocking database work started from the event loop
+DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "4"))
+
+# Async drivers used for the same database when installed
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+_url = make_url(DATABASE_URL)
+# Sessions are handed between the loop and worker threads
+connect_args = {"check_same_thread": False} if _url.get_backend_name() == "sqlite" else {}
+
+
+def pool_options(backend: str, is_async: bool = False) -> dict:
+    """Pool settings from the environment.
+
+    SQLite uses single-connection or non-queue pools, so the sizing options
+    and the timed queue pool only apply to server databases.
+    """
+    options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    if backend != "sqlite":
+        options.update(
+            poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+    return options
+
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **pool_options(_url.get_backend_name()))
+instrument(engine, "sync")
 SessionLocal = sessionmaker(bind=engine)
 
+db_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="db")
+
+
+def _create_async_engine():
+    if os.getenv("DB_ASYNC", "true").lower() != "true":
+        return None
+    # Defaults to DATABASE_URL with its driver swapped for the async one
+    async_url = os.getenv("ASYNC_DATABASE_URL")
+    driver = ASYNC_DRIVERS.get(_url.get_backend_name())
+    if not async_url and driver is None:
+        return None
+    url = make_url(async_url) if async_url else _url.set(drivername=f"{_url.get_backend_name()}+{driver}")
+    try:
+        async_engine = create_async_engine(url, **pool_options(url.get_backend_name(), is_async=True))
+    except ImportError:
+        logger.info(f"{driver} not installed, database work runs on {DB_THREAD_POOL_SIZE} worker threads")
+        return None
+    instrument(async_engine.sync_engine, "async")
+    return async_engine
+
+
+async_engine = _create_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False) if async_engine is not None else None
+
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    """Run a blocking call on the bounded database thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(fn, *args, **kwargs))
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Call ``fn(session, *args, **kwargs)`` without blocking the event loop.
+
+    Async sessions run the sync function on their own connection via
+    ``run_sync``; sync sessions are handed to the database thread pool.
+    ``run_sync`` still runs ``fn`` on the loop's thread, so it is only for
+    thin calls that mostly wait on the driver; see ``run_in_session``.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_db_thread(fn, db, *args, **kwargs)
+
+
+async def run_in_session(session_factory, fn, *args, **kwargs):
+    """Call ``fn(session, *args, **kwargs)`` with a fresh sync session on the thread pool.
+
+    For CPU-heavy work such as building snapshots, which would stall the
+    event loop under an async session's ``run_sync``.
+    """
+    def call():
+        db = session_factory()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+    return await run_in_db_thread(call)
+
+
+async def close_db(db):
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_db_thread(db.close)
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,134 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from typing import Callable, Iterator, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Item, ItemPrice
+from serialization import dumps
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: the "arrow" format is then unavailable
+    pa = None
+
+# Rows fetched per round trip; the driver streams them from a server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+# gzip level for export streams (1 fastest, 9 smallest)
+EXPORT_COMPRESSLEVEL = int(os.getenv("EXPORT_COMPRESSLEVEL", "6"))
+
+EXPORT_COLUMNS = {
+    "id": Item.id,
+    "name": Item.name,
+    "examine": Item.examine,
+    "members": Item.members,
+    "icon": Item.icon,
+    "icon_large": Item.icon_large,
+    "high": ItemPrice.high,
+    "low": ItemPrice.low,
+    "highTime": ItemPrice.highTime,
+    "lowTime": ItemPrice.lowTime,
+}
+EXPORT_FIELDS = tuple(EXPORT_COLUMNS)
+
+
+def export_batches(db: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Sequence]:
+    """Every item with its price (None without one), in id order, in batches of rows."""
+    statement = (
+        select(*(column.label(name) for name, column in EXPORT_COLUMNS.items()))
+        .outerjoin(ItemPrice, ItemPrice.item_id == Item.id)
+        .order_by(Item.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = db.execute(statement)
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def _text(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson(batches: Iterator[Sequence]) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(
+            dumps({field: _text(value) for field, value in zip(EXPORT_FIELDS, row)}) + b"\n" for row in rows
+        )
+
+
+def _csv(batches: Iterator[Sequence]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        writer.writerows([_text(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty catalogue
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _arrow_schema():
+    types = {"id": pa.int64(), "high": pa.float64(), "low": pa.float64(),
+             "highTime": pa.timestamp("us"), "lowTime": pa.timestamp("us")}
+    return pa.schema([(field, types.get(field, pa.string())) for field in EXPORT_FIELDS])
+
+
+def _arrow(batches: Iterator[Sequence]) -> Iterator[bytes]:
+    """Arrow IPC stream: the schema, then one record batch per fetched batch."""
+    schema = _arrow_schema()
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain() -> bytes:
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    for rows in batches:
+        columns: List[list] = [list(column) for column in zip(*rows)]
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(values, type=schema.field(i).type) for i, values in enumerate(columns)], schema=schema
+        ))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+ENCODERS = {"ndjson": _ndjson, "csv": _csv, "arrow": _arrow}
+
+
+def gzipped(chunks: Iterator[bytes], level: int = EXPORT_COMPRESSLEVEL) -> Iterator[bytes]:
+    """Compress a byte stream into one gzip member as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(session_factory: Callable[[], Session], fmt: str,
+                  batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """The whole catalogue as a gzip-compressed ``fmt`` stream, in constant memory.
+
+    The stream opens its own session and closes it when it is exhausted or
+    abandoned: the body is sent after the request's own session is gone.
+    """
+    def batches() -> Iterator[Sequence]:
+        db = session_factory()
+        try:
+            yield from export_batches(db, batch_size)
+        finally:
+            db.close()
+
+    return gzipped(ENCODERS[fmt](batches()))
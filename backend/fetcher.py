@@ -1,122 +1,406 @@
 import asyncio
 import aiohttp
+import hashlib
+import json
 import logging
+import os
 from datetime import datetime
-from database import SessionLocal
-from crud import upsert_items, update_prices
-from models import ItemPrice, Item
-from websocket import broadcast_price_update
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+from database import SessionLocal, run_db, run_in_session, close_db
+from crud import upsert_items_async, update_prices_async
+from websocket import manager, price_entry
+from backplane import LEADER_TTL, NODE_ID, backplane
+from snapshot import refresh_snapshot
+from warmstart import SNAPSHOT_FILE, write_snapshot_file
+from cache import bump_generation
+from history import record_ticks, compaction_loop
+from alerts import ALERT_FIELDS, ALERT_RESYNC_INTERVAL, apply_alert_event, check_alerts, drop_alerts, sync_alerts
+from jobs import Job, scheduler as job_scheduler
+from jsonstream import iter_object_members
+from pricestate import PriceState
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def fetch_data(session, url):
+API_BASE = os.getenv("OSRS_API_BASE", "https://prices.runescape.wiki/api/v1/osrs")
+# Seconds between /latest polls and between /mapping polls
+LATEST_INTERVAL = float(os.getenv("FETCH_LATEST_INTERVAL", "60"))
+MAPPING_INTERVAL = float(os.getenv("FETCH_MAPPING_INTERVAL", "3600"))
+# Optional "5m" or "1h": only diff prices for items traded in new windows
+INCREMENTAL_SOURCE = os.getenv("FETCH_INCREMENTAL", "")
+INCREMENTAL_SECONDS = {"5m": 300, "1h": 3600}
+# Parse /latest incrementally and write it in fixed-size chunks. Parsing and
+# writing hold one chunk; the entries published with the refresh (and the
+# alert moves) still grow with the number of changed prices
+STREAM_PRICES = os.getenv("FETCH_STREAMING", "false").lower() == "true"
+STREAM_CHUNK_SIZE = int(os.getenv("FETCH_STREAM_CHUNK_SIZE", "1000"))
+STREAM_READ_SIZE = 64 * 1024
+
+# Returned by fetch_body/fetch_data when the server answers 304
+NOT_MODIFIED = object()
+
+# ETag/Last-Modified validators per URL, sent back on the next request
+_validators: Dict[str, Dict[str, str]] = {}
+_mapping_hash: Optional[str] = None
+_last_window: Optional[int] = None
+# Stored prices to diff against, kept in step with this worker's writes;
+# None until loaded, and dropped whenever it may have fallen behind
+_price_state: Optional[PriceState] = None
+
+async def fetch_body(session, url, params=None):
+    headers = {}
+    validators = _validators.get(url, {})
+    if "etag" in validators:
+        headers["If-None-Match"] = validators["etag"]
+    if "last_modified" in validators:
+        headers["If-Modified-Since"] = validators["last_modified"]
+
     try:
-        async with session.get(url) as response:
+        async with session.get(url, params=params, headers=headers) as response:
+            if response.status == 304:
+                logger.info(f"{url} not modified")
+                return NOT_MODIFIED
             if response.status != 200:
                 logger.error(f"Failed to fetch data from {url}. Status: {response.status}")
                 return None
-            return await response.json()
+            body = await response.read()
+            if params is None:
+                _validators[url] = {
+                    key: response.headers[header]
+                    for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+                    if header in response.headers
+                }
+            return body
     except Exception as e:
         logger.error(f"Error fetching data from {url}: {str(e)}")
         return None
 
-async def fetch_and_store():
-    async with aiohttp.ClientSession() as session:
+async def fetch_data(session, url, params=None):
+    body = await fetch_body(session, url, params=params)
+    if body is None or body is NOT_MODIFIED:
+        return body
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        logger.error(f"Invalid JSON from {url}: {str(e)}")
+        return None
+
+async def fetch_traded_item_ids(session) -> Tuple[Optional[Set[int]], Optional[int]]:
+    """Item ids traded in completed windows not yet consumed, and the window.
+
+    The ids are None when the window sequence has a gap, on the first run
+    and while the window has not advanced (``/latest`` still moves within
+    it), in which case every price has to be diffed. The window only counts
+    as consumed once ``sync_prices`` has stored its prices.
+    """
+    window = await fetch_data(session, f"{API_BASE}/{INCREMENTAL_SOURCE}")
+    if not window or window is NOT_MODIFIED or "timestamp" not in window:
+        return None, None
+
+    timestamp = window["timestamp"]
+    if (_last_window is None or timestamp == _last_window
+            or timestamp - _last_window > INCREMENTAL_SECONDS[INCREMENTAL_SOURCE]):
+        return None, timestamp
+    return {int(item_id) for item_id in window.get("data", {})}, timestamp
+
+async def stream_prices(session, url) -> AsyncIterator[Tuple[int, dict]]:
+    """Yield ``(item_id, price)`` records from ``/latest`` as it downloads.
+
+    Nothing is yielded when the server answers 304.
+    """
+    headers = {}
+    validators = _validators.get(url, {})
+    if "etag" in validators:
+        headers["If-None-Match"] = validators["etag"]
+    if "last_modified" in validators:
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304:
+            logger.info(f"{url} not modified")
+            return
+        if response.status != 200:
+            raise RuntimeError(f"Failed to fetch data from {url}. Status: {response.status}")
+
+        async for item_id, price in iter_object_members(response.content.iter_chunked(STREAM_READ_SIZE), "data"):
+            yield item_id, price
+
+        _validators[url] = {
+            key: response.headers[header]
+            for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+            if header in response.headers
+        }
+
+async def _chunked(records: AsyncIterator, size: int) -> AsyncIterator[list]:
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def open_session():
+    """Sync session for one refresh's writes.
+
+    Every call below goes through ``run_db``, which runs it on the database
+    thread pool. Diffing rows and building statements is CPU work that an
+    async session's ``run_sync`` would do on the event loop. The calls share
+    this session, so a cycle's writes still commit or roll back together.
+    """
+    return SessionLocal()
+
+def price_updates(changed_prices: Dict[int, dict]) -> list:
+    """WebSocket entries for changed prices, skipping any that cannot be encoded."""
+    updates = []
+    for item_id, price_data in changed_prices.items():
         try:
-            # Fetch items and prices concurrently
-            logger.info("Fetching data from OSRS API...")
-            items_task = fetch_data(session, "https://prices.runescape.wiki/api/v1/osrs/mapping")
-            prices_task = fetch_data(session, "https://prices.runescape.wiki/api/v1/osrs/latest")
-            
-            items, prices = await asyncio.gather(items_task, prices_task)
-            
-            if not items or not prices:
-                logger.error("Failed to fetch required data")
-                return
-
-            logger.info(f"Successfully fetched {len(items)} items and price data")
-            db = SessionLocal()
+            updates.append(price_entry(
+                item_id=item_id,
+                high=price_data.get("high"),
+                low=price_data.get("low"),
+                high_time=datetime.fromtimestamp(price_data.get("highTime", 0)),
+                low_time=datetime.fromtimestamp(price_data.get("lowTime", 0))
+            ))
+        except Exception as e:
+            logger.error(f"Error preparing price update for item {item_id}: {e}")
+    return updates
+
+class UpstreamError(RuntimeError):
+    """The prices API failed or sent unusable data; the job backs off."""
+
+async def publish_refresh(updates: list, alerts: list = ()):
+    """Rebuild this worker's snapshot and announce the refresh."""
+    # Swap in a fresh in-memory view for the API and subscription filters,
+    # built off the event loop whichever session the writes used
+    snapshot = await run_in_session(SessionLocal, refresh_snapshot)
+    bump_generation()
+    seq = manager.seq + 1 if updates else None
+    if SNAPSHOT_FILE:
+        # What the next boot serves until its first refresh
+        await asyncio.to_thread(write_snapshot_file, snapshot, seq or manager.seq, SNAPSHOT_FILE)
+
+    # Every worker, this one included, refreshes and fans out from this message
+    logger.info("Publishing refresh to the backplane...")
+    await backplane.publish({
+        "type": "refresh",
+        "origin": NODE_ID,
+        # Sequence numbers follow the leader so resumes work on any worker
+        "seq": seq,
+        "updates": updates,
+        # Delivered by whichever worker holds each owner's sockets
+        "alerts": list(alerts)
+    })
+
+async def sync_mapping(session) -> bool:
+    """Upsert the item mapping when it changed upstream; True if it did."""
+    global _mapping_hash
+    mapping_url = f"{API_BASE}/mapping"
+    logger.info("Fetching item mapping from OSRS API...")
+    items_body = await fetch_body(session, mapping_url)
+    if items_body is None:
+        raise UpstreamError("Failed to fetch item mapping")
+    if items_body is NOT_MODIFIED:
+        return False
+
+    # Skip the item upsert when the mapping is byte-for-byte unchanged
+    mapping_hash = hashlib.sha256(items_body).hexdigest()
+    if mapping_hash == _mapping_hash:
+        logger.info("Item mapping unchanged, skipping upsert")
+        return False
+    try:
+        items = json.loads(items_body)
+    except ValueError as e:
+        _validators.pop(mapping_url, None)
+        raise UpstreamError(f"Invalid JSON from {mapping_url}: {str(e)}")
+
+    global _price_state
+    db = open_session()
+    try:
+        logger.info(f"Updating {len(items)} items in database...")
+        await upsert_items_async(db, items)
+        _mapping_hash = mapping_hash
+        # New items must be picked up before the next diff
+        _price_state = None
+        return True
+    except Exception:
+        # Make sure the next run downloads and applies the mapping again
+        _validators.pop(mapping_url, None)
+        raise
+    finally:
+        await close_db(db)
+
+async def sync_prices(session) -> bool:
+    """Write the prices that changed since the last run and publish them.
+
+    Returns False when no price changed and nothing was published.
+    """
+    global _price_state, _last_window
+    latest_url = f"{API_BASE}/latest"
+    if STREAM_PRICES:
+        # Prices are streamed while they are written
+        prices = None
+    else:
+        logger.info("Fetching latest prices from OSRS API...")
+        prices = await fetch_data(session, latest_url)
+        if prices is None:
+            raise UpstreamError("Failed to fetch latest prices")
+        if prices is NOT_MODIFIED:
+            logger.info("Upstream prices unchanged, nothing to do")
+            return False
+
+    traded_ids = window = None
+    if INCREMENTAL_SOURCE in INCREMENTAL_SECONDS:
+        traded_ids, window = await fetch_traded_item_ids(session)
+        if traded_ids is not None:
+            logger.info(f"Incremental mode: diffing {len(traded_ids)} traded items")
+
+    db = open_session()
+    try:
+        if _price_state is None:
+            logger.info("Loading current prices from database...")
+            _price_state = await run_in_session(SessionLocal, PriceState.load)
+            logger.info(f"Found {len(_price_state)} valid items in database")
+        state = _price_state
+
+        # Update only changed prices
+        logger.info("Processing price updates...")
+        if STREAM_PRICES:
+            # Diff and write each chunk as it arrives, committing once at the
+            # end; only the outgoing entries outlive their chunk
+            updates = []
+            moves = []
+            streamed = False
+            stored = 0
+            async for chunk in _chunked(stream_prices(session, latest_url), STREAM_CHUNK_SIZE):
+                streamed = True
+                changed = state.diff(chunk, traded_ids)
+                if changed:
+                    stored += len(changed)
+                    moves.extend(state.moves(changed, ALERT_FIELDS))
+                    await update_prices_async(db, changed, commit=False)
+                    await run_db(db, record_ticks, changed, commit=False)
+                    # Later chunks hold other items; a failed commit drops the state
+                    state.apply(changed)
+                    updates.extend(price_updates(changed))
+            if not streamed:
+                logger.info("Upstream prices unchanged, nothing to do")
+                return False
+            await run_db(db, lambda sync_db: sync_db.commit())
+            if stored:
+                logger.info(f"Updated {stored} changed prices")
+        else:
+            changed_prices = state.diff(prices.get("data", {}).items(), traded_ids)
+            stored = len(changed_prices)
+            moves = state.moves(changed_prices, ALERT_FIELDS)
+            if changed_prices:
+                logger.info(f"Updating {len(changed_prices)} changed prices")
+                await update_prices_async(db, changed_prices)
+                await run_db(db, record_ticks, changed_prices)
+                state.apply(changed_prices)
+            updates = price_updates(changed_prices)
+        # Only now are the window's trades stored; a failed cycle diffs them again
+        _last_window = window
+        if not stored:
+            # Snapshots, caches and the warm-start file are all still current
+            logger.info("No price changes detected")
+            return False
+
+        alerts = []
+        if moves:
             try:
-                # First, ensure all items are in the database
-                logger.info("Updating items in database...")
-                upsert_items(db, items)
-                
-                # Get current prices and items from database
-                logger.info("Fetching current prices from database...")
-                current_prices = {
-                    price.item_id: price
-                    for price in db.query(ItemPrice).all()
-                }
-                
-                # Get all valid item IDs
-                valid_item_ids = {
-                    item.id for item in db.query(Item).all()
-                }
-                logger.info(f"Found {len(valid_item_ids)} valid items in database")
-                
-                # Update only changed prices
-                price_data = prices.get("data", {})
-                changed_prices = {}
-                
-                logger.info("Processing price updates...")
-                for item_id, data in price_data.items():
-                    try:
-                        item_id = int(item_id)
-                        # Only process items that exist in our database
-                        if item_id not in valid_item_ids:
-                            logger.debug(f"Skipping price update for non-existent item {item_id}")
-                            continue
-                            
-                        if item_id not in current_prices or (
-                            current_prices[item_id].high != data.get("high") or
-                            current_prices[item_id].low != data.get("low")
-                        ):
-                            # Validate price data
-                            if all(key in data for key in ["high", "low", "highTime", "lowTime"]):
-                                changed_prices[item_id] = data
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid item_id or price data for item {item_id}: {e}")
-                        continue
-                
-                if changed_prices:
-                    logger.info(f"Updating {len(changed_prices)} changed prices")
-                    update_prices(db, changed_prices)
-                    
-                    # Broadcast price updates only for valid items
-                    logger.info("Broadcasting price updates...")
-                    for item_id, price_data in changed_prices.items():
-                        try:
-                            if item_id in valid_item_ids:
-                                await broadcast_price_update(
-                                    item_id=item_id,
-                                    high=price_data.get("high"),
-                                    low=price_data.get("low"),
-                                    high_time=datetime.fromtimestamp(price_data.get("highTime", 0)),
-                                    low_time=datetime.fromtimestamp(price_data.get("lowTime", 0))
-                                )
-                        except Exception as e:
-                            logger.error(f"Error broadcasting price update for item {item_id}: {e}")
-                else:
-                    logger.info("No price changes detected")
-                    
+                alerts = await run_db(db, check_alerts, moves)
             except Exception as e:
-                logger.error(f"Error updating database: {str(e)}", exc_info=True)
-            finally:
-                db.close()
+                # Prices are already stored; the refresh still goes out
+                logger.error(f"Error checking price alerts: {str(e)}", exc_info=True)
+                await run_db(db, lambda sync_db: sync_db.rollback())
+
+        await publish_refresh(updates, alerts)
+        return True
+    except Exception:
+        # Make sure the next run downloads and applies everything again,
+        # diffing against what actually got stored
+        _validators.pop(latest_url, None)
+        _price_state = None
+        raise
+    finally:
+        await close_db(db)
+
+async def publish_mapping_change():
+    # Names and alch values feed the snapshot
+    await publish_refresh([])
+
+async def refresh_mapping():
+    async with aiohttp.ClientSession() as session:
+        if await sync_mapping(session):
+            await publish_mapping_change()
+
+async def refresh_prices():
+    async with aiohttp.ClientSession() as session:
+        await sync_prices(session)
+
+async def resync_alerts():
+    await run_in_session(SessionLocal, sync_alerts)
+
+async def fetch_and_store():
+    """One full refresh outside the scheduler: the mapping, then prices."""
+    async with aiohttp.ClientSession() as session:
+        try:
+            mapping_changed = await sync_mapping(session)
+            # One refresh message per cycle covers both
+            if not await sync_prices(session) and mapping_changed:
+                await publish_mapping_change()
         except Exception as e:
             logger.error(f"Error in fetch_and_store: {str(e)}", exc_info=True)
 
+async def apply_refresh(message: Dict):
+    """Backplane handler: bring this worker up to date with a refresh.
+
+    The leader already rebuilt its snapshot while writing; other workers
+    rebuild theirs from the database before fanning the updates out to
+    their own WebSocket clients.
+    """
+    if message.get("type") != "refresh":
+        return
+    if message.get("origin") != NODE_ID:
+        await run_in_session(SessionLocal, refresh_snapshot)
+        bump_generation()
+        # The leader already dropped the alerts it triggered from its index
+        drop_alerts(alert["alert_id"] for alert in message.get("alerts", ()))
+    if message.get("updates"):
+        await manager.broadcast_prices(message["updates"], seq=message.get("seq"))
+    if message.get("alerts"):
+        manager.send_alerts(message["alerts"])
+
+async def handle_message(message: Dict):
+    """Backplane handler for alert events and refreshes."""
+    if message.get("type") == "alert":
+        apply_alert_event(message)
+    else:
+        await apply_refresh(message)
+
+# Mapping first, so a fresh database has items before the first prices arrive
+job_scheduler.add(Job("mapping", refresh_mapping, MAPPING_INTERVAL))
+job_scheduler.add(Job("latest", refresh_prices, LATEST_INTERVAL))
+job_scheduler.add(Job("alerts", resync_alerts, ALERT_RESYNC_INTERVAL))
+
+def _leading() -> bool:
+    global _price_state
+    if not backplane.leader:
+        # Another worker writes prices meanwhile; reload on taking over
+        _price_state = None
+    return backplane.leader
+
 async def scheduler():
-    while True:
-        try:
-            await fetch_and_store()
-        except Exception as e:
-            logger.error(f"Scheduler error: {str(e)}", exc_info=True)
-        await asyncio.sleep(300)  # every 5 min
+    # Followers only fan out what the leader publishes
+    await job_scheduler.run(active=_leading, idle=LEADER_TTL / 3)
 
-def start_background_tasks():
+async def start_background_tasks():
     loop = asyncio.get_event_loop()
+    await backplane.start(handle_message)
+    loop.create_task(backplane.maintain_leadership())
     loop.create_task(scheduler())
+    loop.create_task(compaction_loop())
     logger.info("Background price update task started")
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import select, delete, func, insert
+from sqlalchemy.orm import Session
+from database import SessionLocal, run_in_db_thread
+from models import ItemPriceHistory, ItemPriceRollup
+from backplane import backplane
+
+logger = logging.getLogger(__name__)
+
+RAW_RETENTION = timedelta(days=int(os.getenv("HISTORY_RAW_RETENTION_DAYS", "2")))
+COMPACTION_INTERVAL = int(os.getenv("HISTORY_COMPACTION_INTERVAL", "300"))
+
+# (name, bucket seconds, source resolution, retention); None keeps forever
+RESOLUTIONS = (
+    ("5m", 300, "raw", timedelta(days=7)),
+    ("1h", 3600, "5m", timedelta(days=90)),
+    ("1d", 86400, "1h", None),
+)
+RESOLUTION_SECONDS = {"raw": 300, **{name: seconds for name, seconds, _, _ in RESOLUTIONS}}
+
+# Upper bound on points returned when the resolution is picked automatically
+MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "500"))
+# Source buckets compacted per statement batch
+COMPACTION_WINDOW_BUCKETS = 24
+
+
+def _floor(moment: datetime, seconds: int) -> datetime:
+    return datetime.fromtimestamp(int(moment.timestamp()) // seconds * seconds)
+
+
+def _mid(high: Optional[float], low: Optional[float]) -> Optional[float]:
+    if high is not None and low is not None:
+        return (high + low) / 2
+    return high if high is not None else low
+
+
+def record_ticks(db: Session, prices: Dict[int, dict], at: Optional[datetime] = None, commit: bool = True) -> int:
+    """Append one raw tick per changed price in a single batched insert.
+
+    ``prices`` maps item ids to upstream ``/latest`` entries with epoch
+    ``highTime``/``lowTime``.
+    """
+    at = at or datetime.now()
+    rows = []
+    for item_id, data in prices.items():
+        try:
+            rows.append({
+                "item_id": int(item_id),
+                "timestamp": at,
+                "high": data.get("high"),
+                "highTime": datetime.fromtimestamp(data["highTime"]) if data.get("highTime") else None,
+                "low": data.get("low"),
+                "lowTime": datetime.fromtimestamp(data["lowTime"]) if data.get("lowTime") else None,
+            })
+        except (ValueError, TypeError, OSError) as e:
+            logger.warning(f"Invalid price tick for item {item_id}: {e}")
+
+    if rows:
+        db.execute(insert(ItemPriceHistory), rows)
+        if commit:
+            db.commit()
+    return len(rows)
+
+
+def _raw_points(db: Session, start: datetime, end: datetime, item_id: Optional[int] = None):
+    query = select(
+        ItemPriceHistory.item_id, ItemPriceHistory.timestamp,
+        ItemPriceHistory.high, ItemPriceHistory.low
+    ).where(ItemPriceHistory.timestamp >= start, ItemPriceHistory.timestamp < end)
+    if item_id is not None:
+        query = query.where(ItemPriceHistory.item_id == item_id)
+    return db.execute(query.order_by(ItemPriceHistory.item_id, ItemPriceHistory.timestamp))
+
+
+def _rollup_points(db: Session, resolution: str, start: datetime, end: datetime, item_id: Optional[int] = None):
+    query = select(ItemPriceRollup).where(
+        ItemPriceRollup.resolution == resolution,
+        ItemPriceRollup.bucket >= start,
+        ItemPriceRollup.bucket < end,
+    )
+    if item_id is not None:
+        query = query.where(ItemPriceRollup.item_id == item_id)
+    return db.scalars(query.order_by(ItemPriceRollup.item_id, ItemPriceRollup.bucket))
+
+
+def _new_bucket(item_id: int, resolution: str, bucket: datetime) -> dict:
+    return {
+        "item_id": item_id, "resolution": resolution, "bucket": bucket,
+        "open": None, "high": None, "low": None, "close": None,
+        "avg_high": None, "avg_low": None, "samples": 0,
+        "_high_sum": 0.0, "_high_n": 0, "_low_sum": 0.0, "_low_n": 0,
+    }
+
+
+def _add(bucket: dict, open_, high, low, close, avg_high, avg_low, samples: int):
+    if open_ is None:
+        return
+    if bucket["open"] is None:
+        bucket["open"] = open_
+    bucket["close"] = close
+    bucket["high"] = high if bucket["high"] is None else max(bucket["high"], high)
+    bucket["low"] = low if bucket["low"] is None else min(bucket["low"], low)
+    if avg_high is not None:
+        bucket["_high_sum"] += avg_high * samples
+        bucket["_high_n"] += samples
+    if avg_low is not None:
+        bucket["_low_sum"] += avg_low * samples
+        bucket["_low_n"] += samples
+    bucket["samples"] += samples
+
+
+def _finish(bucket: dict) -> dict:
+    high_n, low_n = bucket.pop("_high_n"), bucket.pop("_low_n")
+    high_sum, low_sum = bucket.pop("_high_sum"), bucket.pop("_low_sum")
+    bucket["avg_high"] = high_sum / high_n if high_n else None
+    bucket["avg_low"] = low_sum / low_n if low_n else None
+    return bucket
+
+
+def _roll(db: Session, resolution: str, seconds: int, source: str, start: datetime, end: datetime) -> int:
+    buckets: Dict[tuple, dict] = {}
+    if source == "raw":
+        for row in _raw_points(db, start, end):
+            mid = _mid(row.high, row.low)
+            key = (row.item_id, _floor(row.timestamp, seconds))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _new_bucket(row.item_id, resolution, key[1])
+            _add(bucket, mid, mid, mid, mid, row.high, row.low, 1)
+    else:
+        for row in _rollup_points(db, source, start, end):
+            key = (row.item_id, _floor(row.bucket, seconds))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _new_bucket(row.item_id, resolution, key[1])
+            _add(bucket, row.open, row.high, row.low, row.close, row.avg_high, row.avg_low, row.samples)
+
+    rows = [_finish(bucket) for bucket in buckets.values() if bucket["samples"]]
+    if rows:
+        db.execute(insert(ItemPriceRollup), rows)
+    return len(rows)
+
+
+def compact(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Roll completed buckets up one level and apply retention limits.
+
+    Each resolution resumes after its newest stored bucket, so every
+    source row is read once per level.
+    """
+    now = now or datetime.now()
+    written = {}
+    for resolution, seconds, source, _ in RESOLUTIONS:
+        last = db.scalar(
+            select(func.max(ItemPriceRollup.bucket)).where(ItemPriceRollup.resolution == resolution)
+        )
+        if last is not None:
+            start = last + timedelta(seconds=seconds)
+        elif source == "raw":
+            first = db.scalar(select(func.min(ItemPriceHistory.timestamp)))
+            start = _floor(first, seconds) if first else None
+        else:
+            first = db.scalar(
+                select(func.min(ItemPriceRollup.bucket)).where(ItemPriceRollup.resolution == source)
+            )
+            start = _floor(first, seconds) if first else None
+
+        written[resolution] = 0
+        if start is None:
+            continue
+
+        # Only buckets that can no longer receive source rows
+        end = _floor(now, seconds)
+        step = timedelta(seconds=seconds * COMPACTION_WINDOW_BUCKETS)
+        while start < end:
+            window_end = min(start + step, end)
+            written[resolution] += _roll(db, resolution, seconds, source, start, window_end)
+            start = window_end
+        db.commit()
+
+    db.execute(delete(ItemPriceHistory).where(ItemPriceHistory.timestamp < now - RAW_RETENTION))
+    for resolution, _, _, retention in RESOLUTIONS:
+        if retention is not None:
+            db.execute(delete(ItemPriceRollup).where(
+                ItemPriceRollup.resolution == resolution,
+                ItemPriceRollup.bucket < now - retention,
+            ))
+    db.commit()
+
+    logger.info(f"History compaction wrote {written}")
+    return written
+
+
+def pick_resolution(start: datetime, end: datetime, now: Optional[datetime] = None) -> str:
+    """Finest resolution that covers the range within MAX_POINTS points."""
+    now = now or datetime.now()
+    span = (end - start).total_seconds()
+    retentions = {"raw": RAW_RETENTION, **{name: retention for name, _, _, retention in RESOLUTIONS}}
+    for resolution, seconds in RESOLUTION_SECONDS.items():
+        retention = retentions[resolution]
+        if span / seconds > MAX_POINTS:
+            continue
+        if retention is not None and start < now - retention:
+            continue
+        return resolution
+    return RESOLUTIONS[-1][0]
+
+
+def query_history(db: Session, item_id: int, start: datetime, end: datetime, resolution: str) -> List[dict]:
+    if resolution == "raw":
+        return [
+            {
+                "timestamp": row.timestamp,
+                "open": _mid(row.high, row.low),
+                "high": _mid(row.high, row.low),
+                "low": _mid(row.high, row.low),
+                "close": _mid(row.high, row.low),
+                "avg_high": row.high,
+                "avg_low": row.low,
+                "samples": 1,
+            }
+            for row in _raw_points(db, start, end, item_id=item_id)
+        ]
+    return [
+        {
+            "timestamp": row.bucket,
+            "open": row.open,
+            "high": row.high,
+            "low": row.low,
+            "close": row.close,
+            "avg_high": row.avg_high,
+            "avg_low": row.avg_low,
+            "samples": row.samples,
+        }
+        for row in _rollup_points(db, resolution, start, end, item_id=item_id)
+    ]
+
+
+async def compaction_loop():
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL)
+        if not backplane.leader:
+            continue
+        db = SessionLocal()
+        try:
+            await run_in_db_thread(compact, db)
+        except Exception as e:
+            await run_in_db_thread(db.rollback)
+            logger.error(f"History compaction error: {str(e)}", exc_info=True)
+        finally:
+            await run_in_db_thread(db.close)
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Each run is due within +/- this fraction of the job's interval
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+# Retry delay after the first failure, doubled per consecutive failure up to the cap
+SCHEDULER_BACKOFF_BASE = float(os.getenv("SCHEDULER_BACKOFF_BASE", "5"))
+SCHEDULER_BACKOFF_MAX = float(os.getenv("SCHEDULER_BACKOFF_MAX", "600"))
+
+JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds", "Scheduled job run time", ("job", "status"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+JOB_FAILURES = Counter("scheduler_job_failures_total", "Scheduled job runs that raised", ("job",))
+
+
+class Job:
+    """A coroutine run every ``interval`` seconds, backing off while it fails.
+
+    The schedule is anchored to when runs were due rather than when they
+    finished, so it does not drift by the run time. Runs are single-flight:
+    calling ``run`` while one is in progress waits for that run instead of
+    starting another.
+    """
+
+    def __init__(self, name: str, fn: Callable[[], Awaitable[None]], interval: float,
+                 jitter: float = SCHEDULER_JITTER, backoff_base: float = SCHEDULER_BACKOFF_BASE,
+                 backoff_max: float = SCHEDULER_BACKOFF_MAX):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Monotonic time the next regular run is anchored to, and when it is actually due
+        self.anchor: Optional[float] = None
+        self.due: Optional[float] = None
+        self.running: Optional[asyncio.Future] = None
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_started: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.total_duration = 0.0
+
+    def schedule(self, now: float, succeeded: bool = True):
+        """Set ``due`` after a run that ended at monotonic time ``now``."""
+        if not succeeded:
+            delay = min(self.backoff_base * 2 ** (self.consecutive_failures - 1), self.backoff_max)
+            # Random in [delay/2, delay] so failing workers do not retry in lockstep
+            self.due = now + delay * random.uniform(0.5, 1.0)
+            return
+        if self.anchor is None:
+            self.anchor = now
+        # Skip slots missed while running long or backing off
+        while self.anchor <= now:
+            self.anchor += self.interval
+        self.due = self.anchor + self.interval * random.uniform(-self.jitter, self.jitter)
+
+    async def run(self) -> bool:
+        """Run once now, or join the run in progress; True if it succeeded."""
+        if self.running is None:
+            self.running = asyncio.ensure_future(self._run())
+        try:
+            return await asyncio.shield(self.running)
+        finally:
+            if self.running is not None and self.running.done():
+                self.running = None
+
+    async def _run(self) -> bool:
+        started = time.monotonic()
+        self.last_started = datetime.now()
+        succeeded = True
+        try:
+            await self.fn()
+        except Exception as e:
+            succeeded = False
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(e)
+            JOB_FAILURES.inc(self.name)
+            logger.error(f"Job {self.name} failed ({self.consecutive_failures} in a row): {e}", exc_info=True)
+        else:
+            self.consecutive_failures = 0
+            self.last_error = None
+        finished = time.monotonic()
+        self.runs += 1
+        self.last_duration = finished - started
+        self.total_duration += self.last_duration
+        JOB_DURATION.observe(self.last_duration, self.name, "ok" if succeeded else "error")
+        self.schedule(finished, succeeded)
+        return succeeded
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "running": self.running is not None and not self.running.done(),
+            "last_started": self.last_started.isoformat() if self.last_started else None,
+            "last_duration": self.last_duration,
+            "average_duration": self.total_duration / self.runs if self.runs else None,
+            "last_error": self.last_error,
+            "next_run_in": max(self.due - time.monotonic(), 0) if self.due is not None else None,
+        }
+
+
+class JobScheduler:
+    """Runs registered jobs one at a time, each when it falls due.
+
+    Jobs start in registration order and never overlap one another. While
+    ``active()`` is false (e.g. this worker is not the leader) nothing runs
+    and jobs are resumed from scratch once it turns true again.
+    """
+
+    def __init__(self):
+        self.jobs: List[Job] = []
+
+    def add(self, job: Job) -> Job:
+        self.jobs.append(job)
+        return job
+
+    def get(self, name: str) -> Optional[Job]:
+        return next((job for job in self.jobs if job.name == name), None)
+
+    async def run(self, active: Callable[[], bool] = lambda: True, idle: float = 10.0):
+        while True:
+            if not active() or not self.jobs:
+                for job in self.jobs:
+                    job.anchor = job.due = None
+                await asyncio.sleep(idle)
+                continue
+            now = time.monotonic()
+            for job in self.jobs:
+                if job.due is None:
+                    job.due = job.anchor = now
+            job = min(self.jobs, key=lambda job: job.due)
+            if job.due > now:
+                # Sleep until due, but stay responsive to leadership changes
+                await asyncio.sleep(min(job.due - now, idle))
+                continue
+            await job.run()
+
+    def stats(self) -> List[Dict]:
+        return [job.stats() for job in self.jobs]
+
+
+scheduler = JobScheduler()
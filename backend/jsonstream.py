@@ -0,0 +1,100 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, Tuple
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+# Consumed text is dropped from the buffer once it grows past this size
+_COMPACT_THRESHOLD = 1 << 16
+
+
+class _Buffer:
+    """Text buffer over an async byte stream, refilled on demand."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self.chunks = chunks.__aiter__()
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self.eof = True
+            self.text += self.decoder.decode(b"", final=True)
+            return False
+        if self.pos > _COMPACT_THRESHOLD:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        self.text += self.decoder.decode(chunk)
+        return True
+
+    async def peek(self) -> str:
+        """Next non-whitespace character, without consuming it."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    async def expect(self, char: str):
+        if await self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of JSON stream")
+        self.pos += 1
+
+    async def value(self) -> Any:
+        """Decode one complete JSON value, reading more input as needed."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            await self.fill()
+
+
+async def iter_object_members(chunks: AsyncIterator[bytes], key: str) -> AsyncIterator[Tuple[str, Any]]:
+    """Yield ``(name, value)`` pairs of the object under a top-level key.
+
+    Only one member is decoded at a time, so memory stays proportional
+    to the largest member rather than the whole document. Other
+    top-level members are decoded and discarded.
+    """
+    buffer = _Buffer(chunks)
+    await buffer.expect("{")
+    if await buffer.peek() == "}":
+        return
+
+    while True:
+        name = await buffer.value()
+        await buffer.expect(":")
+        if name == key and await buffer.peek() == "{":
+            buffer.pos += 1
+            if await buffer.peek() != "}":
+                while True:
+                    member = await buffer.value()
+                    await buffer.expect(":")
+                    yield member, await buffer.value()
+                    if await buffer.peek() != ",":
+                        break
+                    buffer.pos += 1
+            await buffer.expect("}")
+        else:
+            await buffer.value()
+
+        if await buffer.peek() != ",":
+            break
+        buffer.pos += 1
+    await buffer.expect("}")
@@ -3,7 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from database import init_db
 from api import router as api_router
 from fetcher import start_background_tasks
-from websocket import manager
+from backplane import backplane
+from websocket import manager, PriceFilter
+from snapshot import publish as publish_snapshot
+from warmstart import read_snapshot_file
 import logging
 import json
 import traceback
@@ -29,16 +32,38 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup():
     init_db()
-    start_background_tasks()
+    # Serve the last persisted prices until the first refresh reconciles with upstream
+    loaded = read_snapshot_file()
+    if loaded is not None:
+        snapshot, header = loaded
+        publish_snapshot(snapshot)
+        # Clients resuming from the cycle the file was written at are up to date
+        manager.seq = header["seq"]
+        logger.info(f"Warm start: serving {len(snapshot)} items from the snapshot file (cycle {manager.seq})")
+    await start_background_tasks()
     logger.info("✅ Application startup complete")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await backplane.close()
+
+
 app.include_router(api_router)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # Clients may ask for a compact price stream, e.g. /ws?encoding=packed,
+    # and resume after the last sequence number they saw with ?since=<seq>.
+    # ?client_id=<id> receives the price alerts created under that id.
+    since = websocket.query_params.get("since")
+    await manager.connect(
+        websocket,
+        encoding=websocket.query_params.get("encoding", "json"),
+        since=int(since) if since and since.lstrip("-").isdigit() else None,
+        client_id=websocket.query_params.get("client_id") or None
+    )
     logger.info("🌐 WebSocket connection established")
 
     try:
@@ -50,11 +75,34 @@ async def websocket_endpoint(websocket: WebSocket):
                 # Handle JSON messages
                 try:
                     message = json.loads(data)
-                    if message.get("type") == "ping":
-                        await websocket.send_json({"type": "pong"})
+                    message_type = message.get("type")
+                    if message_type == "ping":
+                        manager.send_personal(websocket, {"type": "pong"})
                         logger.debug("🔁 Received ping, sent pong")
+                    elif message_type == "subscribe":
+                        manager.subscribe(
+                            websocket,
+                            item_ids=message.get("item_ids") or [],
+                            price_filter=PriceFilter.from_message(message["filter"]) if message.get("filter") else None,
+                            replace=bool(message.get("replace"))
+                        )
+                        manager.send_personal(websocket, manager.subscription(websocket))
+                    elif message_type == "unsubscribe":
+                        if "item_ids" in message or "filter" in message:
+                            manager.unsubscribe(
+                                websocket,
+                                item_ids=message.get("item_ids") or [],
+                                price_filter=bool(message.get("filter"))
+                            )
+                        else:
+                            # A bare unsubscribe returns the client to receiving everything
+                            manager.clear_subscriptions(websocket)
+                        manager.send_personal(websocket, manager.subscription(websocket))
                 except json.JSONDecodeError:
                     logger.warning(f"⚠️ Invalid JSON message: {data}")
+                except (TypeError, ValueError, AttributeError) as e:
+                    logger.warning(f"⚠️ Invalid subscription message {data}: {e}")
+                    manager.send_personal(websocket, {"type": "error", "message": "Invalid subscription message"})
 
             except WebSocketDisconnect:
                 logger.info("❌ WebSocket client disconnected")
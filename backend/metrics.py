@@ -0,0 +1,227 @@
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged and counted
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in sorted(self.values.items())]
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Gauge(Counter):
+    """Settable value, or one read from ``collect`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, *labels, value: float):
+        with self.lock:
+            self.values[labels] = value
+
+    def render(self) -> str:
+        if self.collect is not None:
+            self.values = dict(self.collect())
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = []
+        for key, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "".join(metric.render() for metric in _registry)
+
+
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Statement execution time", ("engine", "operation")
+)
+QUERY_ERRORS = Counter("db_query_errors_total", "Statements that raised", ("engine",))
+SLOW_QUERIES = Counter("db_slow_queries_total", f"Statements slower than {SLOW_QUERY_MS:g} ms", ("engine",))
+POOL_CONNECT = Histogram("db_pool_connect_seconds", "Time to open a new DBAPI connection", ("engine",))
+POOL_WAIT = Histogram("db_pool_wait_seconds", "Time to check a connection out of the pool", ("engine",))
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Connections checked out of the pool", ("engine",))
+POOL_OPENED = Counter("db_pool_connections_opened_total", "New DBAPI connections", ("engine",))
+
+_engines: Dict[str, object] = {}
+
+
+def _pool_sizes() -> Dict[Tuple, float]:
+    return {
+        (label,): engine.pool.size()
+        for label, engine in _engines.items()
+        if isinstance(engine.pool, QueuePool)
+    }
+
+
+def _pool_overflow() -> Dict[Tuple, float]:
+    return {
+        (label,): max(engine.pool.overflow(), 0)
+        for label, engine in _engines.items()
+        if isinstance(engine.pool, QueuePool)
+    }
+
+
+POOL_SIZE = Gauge("db_pool_size", "Configured pool size", ("engine",), collect=_pool_sizes)
+# Pinned at max_overflow while in-use connections hit the limit: callers are queueing
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", ("engine",),
+                      collect=_pool_overflow)
+
+
+class _TimedCheckout:
+    """Pool mixin timing ``connect()``, queueing for a free slot included."""
+
+    # Set by instrument(); carried over when the engine recreates its pool
+    label = "unknown"
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_WAIT.observe(perf_counter() - start, self.label)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def instrument(engine, label: str):
+    """Record statement latency and pool usage for a (sync) engine.
+
+    For an ``AsyncEngine`` pass its ``sync_engine``. Checkout waits are only
+    recorded when the engine was created with a timed pool class.
+    """
+    _engines[label] = engine
+    if isinstance(engine.pool, _TimedCheckout):
+        engine.pool.label = label
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["query_start"].pop()
+        QUERY_DURATION.observe(elapsed, label, _operation(statement))
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc(label)
+            logger.warning(f"Slow query ({elapsed * 1000:.0f} ms): {statement[:200]}")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        QUERY_ERRORS.inc(label)
+
+    @event.listens_for(engine, "do_connect")
+    def do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_start"] = perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        POOL_OPENED.inc(label)
+        start = connection_record.info.pop("connect_start", None)
+        if start is not None:
+            POOL_CONNECT.observe(perf_counter() - start, label)
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_IN_USE.inc(label)
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        POOL_IN_USE.inc(label, amount=-1)
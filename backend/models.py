@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -18,13 +18,80 @@ class Item(Base):
 
     price = relationship("ItemPrice", back_populates="item", uselist=False)
 
+    __table_args__ = (
+        Index("ix_items_members", "members"),
+        Index("ix_items_name_id", "name", "id"),
+    )
+
 class ItemPrice(Base):
     __tablename__ = "item_prices"
     id = Column(Integer, primary_key=True)
-    item_id = Column(Integer, ForeignKey("items.id"))
+    item_id = Column(Integer, ForeignKey("items.id"), unique=True, index=True)
     high = Column(Float)
     highTime = Column(DateTime)
     low = Column(Float)
     lowTime = Column(DateTime)
 
     item = relationship("Item", back_populates="price")
+
+    # One per sortable column, with item_id as the listing's tiebreaker
+    __table_args__ = (
+        Index("ix_item_prices_high_item_id", "high", "item_id"),
+        Index("ix_item_prices_low_item_id", "low", "item_id"),
+        Index("ix_item_prices_highTime_item_id", "highTime", "item_id"),
+        Index("ix_item_prices_lowTime_item_id", "lowTime", "item_id"),
+    )
+
+class ItemPriceHistory(Base):
+    """Append-only raw price ticks, one row per item per refresh that changed it."""
+    __tablename__ = "item_price_history"
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    high = Column(Float)
+    highTime = Column(DateTime)
+    low = Column(Float)
+    lowTime = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_item_price_history_item_id_timestamp", "item_id", "timestamp"),
+        Index("ix_item_price_history_timestamp", "timestamp"),
+    )
+
+class ItemPriceRollup(Base):
+    """OHLC buckets of the mid price at 5m/1h/1d resolution."""
+    __tablename__ = "item_price_rollups"
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    resolution = Column(String(4), nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    avg_high = Column(Float)
+    avg_low = Column(Float)
+    samples = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("item_id", "resolution", "bucket", name="uq_item_price_rollups_item_resolution_bucket"),
+        Index("ix_item_price_rollups_resolution_bucket", "resolution", "bucket"),
+    )
+
+class PriceAlert(Base):
+    """A one-shot alert on an item's high or low price crossing a threshold."""
+    __tablename__ = "price_alerts"
+    id = Column(Integer, primary_key=True)
+    # Opaque id chosen by the browser; matches are sent to its /ws?client_id= sockets
+    client_id = Column(String(64), nullable=False)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    field = Column(String(4), nullable=False)
+    direction = Column(String(5), nullable=False)
+    threshold = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    triggered_at = Column(DateTime)
+    triggered_price = Column(Float)
+
+    __table_args__ = (
+        Index("ix_price_alerts_client_id", "client_id"),
+    )
@@ -0,0 +1,120 @@
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+
+import numpy as np
+from sqlalchemy import select
+
+from analytics import to_floats
+from models import Item, ItemPrice
+
+logger = logging.getLogger(__name__)
+
+# Keys a /latest entry needs before it is written
+PRICE_KEYS = ("high", "low", "highTime", "lowTime")
+
+
+def _differs(stored: np.ndarray, new: np.ndarray) -> np.ndarray:
+    # NaN stands for "no price", so two missing prices are equal
+    return ~((stored == new) | (np.isnan(stored) & np.isnan(new)))
+
+
+class PriceState:
+    """Last stored high/low of every known item, as arrays sorted by id.
+
+    Loaded with one projection query, then kept in step with what the
+    fetcher writes, so each refresh diffs the payload against it with a
+    few vectorized comparisons instead of loading every row. Missing
+    prices are NaN; ``priced`` marks items that have an ``item_prices``
+    row at all.
+    """
+
+    def __init__(self, ids: np.ndarray, high: np.ndarray, low: np.ndarray, priced: np.ndarray):
+        self.ids = ids
+        self.high = high
+        self.low = low
+        self.priced = priced
+
+    @classmethod
+    def load(cls, db) -> "PriceState":
+        rows = db.execute(
+            select(Item.id, ItemPrice.id, ItemPrice.high, ItemPrice.low)
+            .outerjoin(ItemPrice, ItemPrice.item_id == Item.id)
+            .order_by(Item.id)
+        ).all()
+        ids, price_ids, high, low = zip(*rows) if rows else ((), (), (), ())
+        return cls(
+            np.array(ids, dtype=np.int64),
+            to_floats(high),
+            to_floats(low),
+            np.array([price_id is not None for price_id in price_ids], dtype=bool),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _positions(self, item_ids: np.ndarray):
+        """Positions of ``item_ids`` and a mask of the ones that are known."""
+        positions = np.searchsorted(self.ids, item_ids)
+        clipped = np.minimum(positions, len(self.ids) - 1)
+        return clipped, (positions < len(self.ids)) & (self.ids[clipped] == item_ids)
+
+    def diff(self, records: Iterable, traded_ids: Optional[Set[int]] = None) -> Dict[int, dict]:
+        """Entries of ``(item_id, data)`` records whose high or low changed.
+
+        Unknown items and entries missing a price key are skipped; items
+        without a stored price always count as changed.
+        """
+        item_ids: List[int] = []
+        highs: List[float] = []
+        lows: List[float] = []
+        entries: List[dict] = []
+        for item_id, data in records:
+            try:
+                item_id = int(item_id)
+                if traded_ids is not None and item_id not in traded_ids:
+                    continue
+                if not all(key in data for key in PRICE_KEYS):
+                    continue
+                high = np.nan if data["high"] is None else float(data["high"])
+                low = np.nan if data["low"] is None else float(data["low"])
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"Invalid item_id or price data for item {item_id}: {e}")
+                continue
+            item_ids.append(item_id)
+            highs.append(high)
+            lows.append(low)
+            entries.append(data)
+        if not entries or not len(self.ids):
+            return {}
+
+        new_ids = np.array(item_ids, dtype=np.int64)
+        positions, known = self._positions(new_ids)
+        changed = known & (
+            ~self.priced[positions]
+            | _differs(self.high[positions], np.array(highs))
+            | _differs(self.low[positions], np.array(lows))
+        )
+        return {item_ids[i]: entries[i] for i in np.flatnonzero(changed)}
+
+    def moves(self, changed: Dict[int, dict], fields=("high", "low")) -> list:
+        """``(item_id, field, old, new)`` for each changed item that had a price."""
+        moves = []
+        for item_id, data in changed.items():
+            pos = int(np.searchsorted(self.ids, item_id))
+            if pos == len(self.ids) or self.ids[pos] != item_id or not self.priced[pos]:
+                continue
+            for field in fields:
+                old = getattr(self, field)[pos]
+                moves.append((item_id, field, None if np.isnan(old) else float(old), data.get(field)))
+        return moves
+
+    def apply(self, changed: Dict[int, dict]):
+        """Record prices once they are stored."""
+        if not changed or not len(self.ids):
+            return
+        positions, known = self._positions(np.fromiter(changed, dtype=np.int64, count=len(changed)))
+        positions = positions[known]
+        entries = [data for data, is_known in zip(changed.values(), known) if is_known]
+        self.high[positions] = to_floats(data["high"] for data in entries)
+        self.low[positions] = to_floats(data["low"] for data in entries)
+        self.priced[positions] = True
@@ -1,18 +1,26 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, SerializeAsAny
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class ItemSchema(BaseModel):
     id: int
     name: str
-    high: float
-    low: float
+    # Items that only traded on one side recently have no price on the other
+    high: Optional[float] = None
+    low: Optional[float] = None
     highTime: Optional[datetime] = None
     lowTime: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class ItemAnalyticsSchema(ItemSchema):
+    margin: Optional[float] = None
+    roi: Optional[float] = None
+    alch_profit: Optional[float] = None
+    spread_pct: Optional[float] = None
+    volatility: Optional[float] = None
+
 class ItemDetailSchema(BaseModel):
     id: int
     name: str
@@ -29,8 +37,64 @@ class ItemDetailSchema(BaseModel):
         from_attributes = True
 
 class ItemsPricesResponse(BaseModel):
-    total: int
+    total: Optional[int] = None
     count: int
     limit: int
     offset: int
-    results: List[ItemSchema] 
\ No newline at end of file
+    # Rows carry analytics fields when requested with analytics=true
+    results: List[SerializeAsAny[ItemSchema]]
+    next_cursor: Optional[str] = None
+
+class PricePointSchema(BaseModel):
+    timestamp: datetime
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    close: Optional[float] = None
+    avg_high: Optional[float] = None
+    avg_low: Optional[float] = None
+    samples: int
+
+class PriceHistoryResponse(BaseModel):
+    item_id: int
+    resolution: str
+    start: datetime
+    end: datetime
+    points: List[PricePointSchema]
+
+
+class SuggestionSchema(BaseModel):
+    id: int
+    name: str
+
+class ItemBatchResponse(BaseModel):
+    results: List[ItemDetailSchema]
+    # Requested ids that are not in the catalogue
+    missing: List[int]
+
+class SuggestResponse(BaseModel):
+    query: str
+    results: List[SuggestionSchema]
+
+
+class AnalyticsTopResponse(BaseModel):
+    metric: str
+    order: str
+    results: List[ItemAnalyticsSchema]
+
+
+class AlertCreate(BaseModel):
+    client_id: str = Field(min_length=1, max_length=64)
+    item_id: int
+    field: Literal["high", "low"]
+    direction: Literal["above", "below"]
+    threshold: float
+
+class AlertSchema(AlertCreate):
+    id: int
+    created_at: datetime
+    triggered_at: Optional[datetime] = None
+    triggered_price: Optional[float] = None
+
+    class Config:
+        from_attributes = True
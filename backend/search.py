@@ -0,0 +1,130 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import heapq
+import re
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Rank buckets, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _has_word_prefix(needle: str, name: str) -> bool:
+    return any(word.startswith(needle) for word in _WORD.findall(name))
+
+
+def suggests(needle: str, name: str) -> bool:
+    """Whether lowercased ``name`` is a suggestion for stripped, lowercased ``needle``.
+
+    One- and two-character queries only match word prefixes, longer ones
+    any substring.
+    """
+    return _has_word_prefix(needle, name) if len(needle) < 3 else needle in name
+
+
+def rank(needle: str, name: str, item_id: int) -> tuple:
+    """Sort key for a suggestion; ids break ties between equal names."""
+    if name == needle:
+        bucket = EXACT
+    elif name.startswith(needle):
+        bucket = PREFIX
+    elif _has_word_prefix(needle, name):
+        bucket = WORD_PREFIX
+    else:
+        bucket = SUBSTRING
+    return (bucket, len(name), name, item_id)
+
+
+def suggest_rows(query: str, rows: Iterable[Tuple[int, Optional[str]]], limit: int = 10) -> list:
+    """``SearchIndex.suggest`` over ``(id, name)`` rows instead of an index.
+
+    ``rows`` may be any superset of the matches, such as a ``LIKE``
+    prefilter; rows without a name never match.
+    """
+    needle = query.lower().strip()
+    if not needle:
+        return []
+    matches = ((row, row[1].lower()) for row in rows if row[1] is not None)
+    return [row for row, _ in heapq.nsmallest(
+        limit,
+        ((row, name) for row, name in matches if suggests(needle, name)),
+        key=lambda match: rank(needle, match[1], match[0][0])
+    )]
+
+
+class SearchIndex:
+    """Trigram and word-prefix index over item names.
+
+    Positions refer to the ``names`` sequence the index was built from, so
+    a snapshot can intersect matches with its own filters. Substring
+    matches are exact: trigram postings only narrow the candidates before
+    a final ``in`` check, mirroring ``LOWER(name) LIKE '%q%'``.
+    """
+
+    def __init__(self, ids: Sequence[int], names: Sequence[Optional[str]]):
+        self.ids = ids
+        self.names = names
+        self.names_lower = tuple((name or "").lower() for name in names)
+
+        postings: Dict[str, List[int]] = {}
+        for pos, name in enumerate(self.names_lower):
+            for gram in _trigrams(name):
+                postings.setdefault(gram, []).append(pos)
+        self.trigrams = {gram: array("I", positions) for gram, positions in postings.items()}
+
+        # Sorted (word, position) pairs for short prefix lookups
+        self.words = sorted(
+            (word, pos)
+            for pos, name in enumerate(self.names_lower)
+            for word in set(_WORD.findall(name))
+        )
+
+    def __len__(self):
+        return len(self.names_lower)
+
+    def matches(self, query: str) -> Set[int]:
+        """Positions whose name contains ``query``, case-insensitively."""
+        needle = query.lower()
+        if len(needle) < 3:
+            return {pos for pos, name in enumerate(self.names_lower) if needle in name}
+
+        grams = sorted(_trigrams(needle), key=lambda gram: len(self.trigrams.get(gram, ())))
+        candidates = set(self.trigrams.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(self.trigrams.get(gram, ()))
+        return {pos for pos in candidates if needle in self.names_lower[pos]}
+
+    def _word_prefix(self, prefix: str) -> Set[int]:
+        found = set()
+        start = bisect_left(self.words, (prefix, -1))
+        for word, pos in self.words[start:]:
+            if not word.startswith(prefix):
+                break
+            found.add(pos)
+        return found
+
+    def rank(self, query: str, pos: int) -> tuple:
+        return rank(query.lower().strip(), self.names_lower[pos], self.ids[pos])
+
+    def suggest(self, query: str, limit: int = 10) -> List[int]:
+        """Best matching positions for search-as-you-type.
+
+        Exact names come first, then names and words starting with the
+        query, then other substring matches; shorter names win ties.
+        One- and two-character queries only match word prefixes.
+        """
+        needle = query.lower().strip()
+        if not needle:
+            return []
+        if len(needle) < 3:
+            positions = self._word_prefix(needle)
+        else:
+            positions = self.matches(needle)
+        return heapq.nsmallest(limit, positions, key=lambda pos: self.rank(needle, pos))
@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Iterable, Optional
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON, as ``api._encode`` writes it."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _iso(value: datetime) -> str:
+    return value.isoformat()
+
+
+# Row fields in ItemSchema order, with the coercion the schema applies
+LISTING_FIELDS = ("id", "name", "high", "low", "highTime", "lowTime")
+FIELD_ENCODERS = {"id": int, "name": str, "high": float, "low": float, "highTime": _iso, "lowTime": _iso}
+
+
+def encode_row(row: dict, fields: Iterable[str]) -> bytes:
+    """``fields`` of a listing row, encoded like the schema would (other fields are floats)."""
+    encoded = {}
+    for field in fields:
+        value = row.get(field)
+        encoded[field] = FIELD_ENCODERS.get(field, float)(value) if value is not None else None
+    return dumps(encoded)
+
+
+def item_fragment(item_id: int, name: str, high, low, high_time: Optional[datetime],
+                  low_time: Optional[datetime]) -> bytes:
+    """One listing row encoded exactly like ``ItemSchema``."""
+    return encode_row({
+        "id": item_id,
+        "name": name,
+        "high": high,
+        "low": low,
+        "highTime": high_time,
+        "lowTime": low_time,
+    }, LISTING_FIELDS)
+
+
+def page_json(total: Optional[int], count: int, limit: int, offset: int, fragments: Iterable[bytes],
+              next_cursor: Optional[str]) -> bytes:
+    """An ``ItemsPricesResponse`` body assembled from pre-encoded rows."""
+    return b"".join((
+        b'{"total":', dumps(total),
+        b',"count":', dumps(count),
+        b',"limit":', dumps(limit),
+        b',"offset":', dumps(offset),
+        b',"results":[', b",".join(fragments),
+        b'],"next_cursor":', dumps(next_cursor),
+        b"}",
+    ))
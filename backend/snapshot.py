@@ -0,0 +1,273 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models import Item, ItemPrice, ItemPriceRollup
+from search import SearchIndex
+from analytics import ANALYTICS_FIELDS, VOLATILITY_WINDOW_HOURS, as_column, compute_analytics, rolling_volatility
+from serialization import item_fragment
+from typing import Dict, Optional, Sequence, Tuple
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Serve /api/items-prices from memory; set to "false" to always query SQL
+SNAPSHOT_ENABLED = os.getenv("PRICE_SNAPSHOT_ENABLED", "true").lower() == "true"
+
+SORT_COLUMNS = ("name", "high", "low", "highTime", "lowTime") + ANALYTICS_FIELDS
+RANGE_COLUMNS = ("high", "low") + ANALYTICS_FIELDS
+
+
+def sort_key(value, item_id: int) -> tuple:
+    """Ascending listing order: NULLs last, ties broken by item id."""
+    return (value is None, value if value is not None else 0, item_id)
+
+
+class PriceSnapshot:
+    """Immutable, process-local view of every item that has a price.
+
+    Rows are stored column-wise. For each sortable column an index array
+    holds row positions in ascending order with NULLs last, which matches
+    PostgreSQL's default ordering; descending requests walk it backwards.
+
+    Listing rows are JSON-encoded on first use and carried over to the
+    next snapshot for every item whose row did not change, so a refresh
+    only re-encodes the items whose prices moved.
+    """
+
+    def __init__(self, rows: list, version: int = 0, volatility: Optional[Dict[int, float]] = None,
+                 previous: Optional["PriceSnapshot"] = None, signals: Optional[Dict[str, Sequence]] = None):
+        self.version = version
+        self.ids = tuple(row.id for row in rows)
+        self.columns = {
+            "name": tuple(row.name for row in rows),
+            "members": tuple(row.members for row in rows),
+            "high": tuple(row.high for row in rows),
+            "low": tuple(row.low for row in rows),
+            "highTime": tuple(row.highTime for row in rows),
+            "lowTime": tuple(row.lowTime for row in rows),
+        }
+        # Derived trading signals, with volatility given per item id. A
+        # warm-start file brings them precomputed, as NaN-for-None arrays
+        if signals is None:
+            signals = compute_analytics(
+                self.ids, self.columns["high"], self.columns["low"],
+                [getattr(row, "highalch", None) for row in rows],
+                [volatility.get(item_id) for item_id in self.ids] if volatility else None
+            )
+        for field in ANALYTICS_FIELDS:
+            self.columns[field] = as_column(signals[field])
+        self.search_index = SearchIndex(self.ids, self.columns["name"])
+        self.names_lower = self.search_index.names_lower
+        self.positions = {item_id: pos for pos, item_id in enumerate(self.ids)}
+
+        self.order = {}
+        self.sort_keys = {}
+        for column in SORT_COLUMNS:
+            values = self.columns[column]
+            keys = [sort_key(values[pos], self.ids[pos]) for pos in range(len(rows))]
+            self.order[column] = array("I", sorted(range(len(rows)), key=keys.__getitem__))
+            self.sort_keys[column] = [keys[pos] for pos in self.order[column]]
+
+        # Non-NULL values in ascending order, aligned with the head of self.order
+        self.sorted_values = {
+            column: array("d", (self.columns[column][pos] for pos in self.order[column]
+                                if self.columns[column][pos] is not None))
+            for column in RANGE_COLUMNS
+        }
+
+        self.members_index = {}
+        for pos, members in enumerate(self.columns["members"]):
+            self.members_index.setdefault(members, set()).add(pos)
+
+        # Row position -> encoded listing row
+        self.fragments: Dict[int, bytes] = {}
+        if previous is not None:
+            for old_pos, fragment in list(previous.fragments.items()):
+                pos = self.positions.get(previous.ids[old_pos])
+                if pos is not None and self.row_key(pos) == previous.row_key(old_pos):
+                    self.fragments[pos] = fragment
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, pos: int) -> dict:
+        return {
+            "id": self.ids[pos],
+            "name": self.columns["name"][pos],
+            "high": self.columns["high"][pos],
+            "low": self.columns["low"][pos],
+            "highTime": self.columns["highTime"][pos],
+            "lowTime": self.columns["lowTime"][pos],
+        }
+
+    def row_key(self, pos: int) -> tuple:
+        columns = self.columns
+        return (columns["name"][pos], columns["high"][pos], columns["low"][pos],
+                columns["highTime"][pos], columns["lowTime"][pos])
+
+    def fragment(self, pos: int) -> bytes:
+        """``row(pos)`` as listing JSON, encoded once per item and price."""
+        fragment = self.fragments.get(pos)
+        if fragment is None:
+            fragment = self.fragments[pos] = item_fragment(self.ids[pos], *self.row_key(pos))
+        return fragment
+
+    def analytics(self, pos: int) -> dict:
+        return {field: self.columns[field][pos] for field in ANALYTICS_FIELDS}
+
+    def top(self, metric: str, limit: int, descending: bool = True, membership: Optional[str] = None) -> list:
+        """Positions with the highest (or lowest) non-NULL ``metric``."""
+        ranked = self.order[metric][:len(self.sorted_values[metric])]
+        if descending:
+            ranked = ranked[::-1]
+        members = self.members_index.get(membership, set()) if membership else None
+        found = []
+        for pos in ranked:
+            if members is None or pos in members:
+                found.append(pos)
+                if len(found) == limit:
+                    break
+        return found
+
+    def _range(self, column: str, lower: Optional[float], upper: Optional[float]) -> set:
+        values = self.sorted_values[column]
+        start = bisect_left(values, lower) if lower is not None else 0
+        end = bisect_right(values, upper) if upper is not None else len(values)
+        return set(self.order[column][start:end])
+
+    def query(self, *args, **kwargs):
+        """Like ``query_positions``, with the page as ``row`` dicts."""
+        total, page = self.query_positions(*args, **kwargs)
+        return total, [self.row(pos) for pos in page]
+
+    def query_positions(
+        self,
+        limit: int,
+        offset: int = 0,
+        search: str = "",
+        sort_by: str = "name",
+        sort_order: str = "asc",
+        min_high: Optional[float] = None,
+        max_high: Optional[float] = None,
+        min_low: Optional[float] = None,
+        max_low: Optional[float] = None,
+        membership: Optional[str] = None,
+        after: Optional[tuple] = None,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+    ):
+        """Filter, sort and page the snapshot.
+
+        ``after`` is the ``(value, id)`` of the last row already served;
+        the page starts right after it. ``ranges`` maps analytics fields to
+        inclusive ``(min, max)`` bounds. Returns ``(total, positions)`` with
+        the same semantics as the SQL path in ``api.list_items``.
+        """
+        candidates = None
+
+        def narrow(matches):
+            nonlocal candidates
+            candidates = matches if candidates is None else candidates & matches
+
+        if membership:
+            narrow(self.members_index.get(membership, set()))
+        if min_high is not None or max_high is not None:
+            narrow(self._range("high", min_high, max_high))
+        if min_low is not None or max_low is not None:
+            narrow(self._range("low", min_low, max_low))
+        for column, (lower, upper) in (ranges or {}).items():
+            if lower is not None or upper is not None:
+                narrow(self._range(column, lower, upper))
+        if search:
+            narrow(self.search_index.matches(search))
+
+        if sort_by not in self.order:
+            sort_by = "name"
+        order = self.order[sort_by]
+        if after is not None:
+            key = sort_key(*after)
+            if sort_order == "desc":
+                order = order[:bisect_left(self.sort_keys[sort_by], key)][::-1]
+            else:
+                order = order[bisect_right(self.sort_keys[sort_by], key):]
+        elif sort_order == "desc":
+            order = order[::-1]
+
+        if candidates is None:
+            return len(self.ids), list(order[offset:offset + limit])
+
+        page = []
+        skipped = 0
+        for pos in order:
+            if pos not in candidates:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            page.append(pos)
+            if len(page) == limit:
+                break
+        return len(candidates), page
+
+
+_current: Optional[PriceSnapshot] = None
+# Newest 5m rollup bucket the volatility was computed at, and the values per item
+_volatility: Tuple[Optional[datetime], Dict[int, float]] = (None, {})
+
+
+def get_snapshot() -> Optional[PriceSnapshot]:
+    return _current
+
+
+def publish(snapshot: PriceSnapshot):
+    """Atomically replace the snapshot served to readers."""
+    global _current
+    _current = snapshot
+
+
+def item_volatility(db: Session) -> Dict[int, float]:
+    """Volatility per item id over the window's 5m rollups.
+
+    Rollups only change when compaction adds a bucket, so the values are
+    reused until the newest 5m bucket moves and most rebuilds cost one
+    indexed ``max()`` rather than reading the window's history.
+    """
+    global _volatility
+    newest = db.scalar(select(func.max(ItemPriceRollup.bucket)).where(ItemPriceRollup.resolution == "5m"))
+    if newest is None:
+        return {}
+    if newest == _volatility[0]:
+        return _volatility[1]
+
+    buckets = db.execute(
+        select(ItemPriceRollup.item_id, ItemPriceRollup.avg_high, ItemPriceRollup.avg_low)
+        .where(ItemPriceRollup.resolution == "5m",
+               ItemPriceRollup.bucket >= datetime.now() - timedelta(hours=VOLATILITY_WINDOW_HOURS))
+        .order_by(ItemPriceRollup.item_id, ItemPriceRollup.bucket)
+    ).all()
+    item_ids, highs, lows = zip(*buckets) if buckets else ((), (), ())
+    ids = sorted(set(item_ids))
+    values = rolling_volatility(ids, item_ids, highs, lows).tolist()
+    volatility = {item_id: value for item_id, value in zip(ids, values) if value == value}
+    _volatility = (newest, volatility)
+    return volatility
+
+
+def build_snapshot(db: Session) -> PriceSnapshot:
+    rows = db.execute(
+        select(
+            Item.id, Item.name, Item.members, Item.highalch,
+            ItemPrice.high, ItemPrice.low, ItemPrice.highTime, ItemPrice.lowTime
+        ).join(ItemPrice, ItemPrice.item_id == Item.id)
+    ).all()
+    version = _current.version + 1 if _current is not None else 1
+    return PriceSnapshot(rows, version=version, volatility=item_volatility(db), previous=_current)
+
+
+def refresh_snapshot(db: Session) -> PriceSnapshot:
+    snapshot = build_snapshot(db)
+    publish(snapshot)
+    logger.info(f"Price snapshot v{snapshot.version} built with {len(snapshot)} items")
+    return snapshot
@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import alerts
+import api
+from alerts import AlertIndex, Rule, check_alerts
+from backplane import InProcessBackplane
+from models import Item, PriceAlert
+from websocket import ConnectionManager
+from .conftest import TestingSessionLocal, override_get_db
+
+
+app = FastAPI()
+app.include_router(api.router)
+app.dependency_overrides[api.get_db] = override_get_db
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    index = AlertIndex()
+    monkeypatch.setattr(alerts, "alert_index", index)
+    monkeypatch.setattr(api, "alert_index", index)
+    db.add(Item(id=4151, name="Abyssal whip", members="true"))
+    db.commit()
+    return TestClient(app)
+
+
+def test_index_matches_only_crossed_thresholds():
+    index = AlertIndex()
+    for alert_id, (direction, threshold) in enumerate(
+        [("above", 100), ("above", 150), ("above", 200), ("below", 90), ("below", 50)], start=1
+    ):
+        index.add(alert_id, Rule("c", 1, "high", direction, threshold))
+    index.add(6, Rule("c", 2, "high", "above", 120))
+
+    assert index.match(1, "high", 99, 150) == [1, 2]
+    # Thresholds equal to the old price were already reached
+    assert index.match(1, "high", 100, 199) == [2]
+    assert index.match(1, "high", 120, 40) == [5, 4]
+    assert index.match(1, "low", 99, 150) == []
+    assert index.match(1, "high", None, 150) == []
+
+    assert index.remove(2).threshold == 150
+    assert index.match(1, "high", 99, 250) == [1, 3]
+    assert index.remove(2) is None
+    assert len(index) == 5
+
+
+def test_alert_lifecycle(client):
+    created = client.post("/api/alerts", json={
+        "client_id": "browser-1", "item_id": 4151, "field": "high", "direction": "above", "threshold": 1600000,
+    })
+    assert created.status_code == 201
+    alert_id = created.json()["id"]
+    assert client.post("/api/alerts", json={
+        "client_id": "browser-1", "item_id": 1, "field": "high", "direction": "above", "threshold": 1,
+    }).status_code == 404
+    assert client.post("/api/alerts", json={
+        "client_id": "browser-1", "item_id": 4151, "field": "mid", "direction": "above", "threshold": 1,
+    }).status_code == 422
+
+    db = TestingSessionLocal()
+    try:
+        assert check_alerts(db, [(4151, "high", 1500000, 1550000)]) == []
+        fired = check_alerts(db, [(4151, "high", 1550000, 1650000), (4151, "low", 1500000, 1600000)])
+        assert [(m["alert_id"], m["client_id"], m["price"]) for m in fired] == [(alert_id, "browser-1", 1650000)]
+        # One-shot: crossing again does nothing
+        assert check_alerts(db, [(4151, "high", 1500000, 1700000)]) == []
+    finally:
+        db.close()
+
+    listed = client.get("/api/alerts", params={"client_id": "browser-1"}).json()
+    assert listed[0]["triggered_price"] == 1650000
+    assert client.delete(f"/api/alerts/{alert_id}", params={"client_id": "someone-else"}).status_code == 404
+    assert client.delete(f"/api/alerts/{alert_id}", params={"client_id": "browser-1"}).status_code == 204
+    assert client.get("/api/alerts", params={"client_id": "browser-1"}).json() == []
+
+
+def test_alerts_created_or_deleted_elsewhere(client):
+    db = TestingSessionLocal()
+    try:
+        # Already in the table: read when the index first loads
+        db.add_all([
+            PriceAlert(client_id="a", item_id=4151, field="low", direction="below", threshold=100),
+            PriceAlert(client_id="b", item_id=4151, field="low", direction="below", threshold=90),
+        ])
+        db.commit()
+        assert check_alerts(db, []) == []
+        assert len(alerts.alert_index) == 2
+
+        db.query(PriceAlert).filter(PriceAlert.client_id == "b").delete()
+        db.commit()
+        fired = check_alerts(db, [(4151, "low", 120, 80)])
+        assert [m["client_id"] for m in fired] == ["a"]
+        assert len(alerts.alert_index) == 0
+    finally:
+        db.close()
+
+
+def test_sync_rereads_every_untriggered_alert(client):
+    db = TestingSessionLocal()
+    try:
+        db.add(PriceAlert(id=5, client_id="a", item_id=4151, field="high", direction="above", threshold=100))
+        db.commit()
+        alerts.alert_index.sync(db)
+
+        # A lower id whose transaction committed after 5 was read, and 5 deleted elsewhere
+        db.add(PriceAlert(id=3, client_id="b", item_id=4151, field="high", direction="above", threshold=110))
+        db.query(PriceAlert).filter(PriceAlert.id == 5).delete()
+        db.commit()
+        alerts.alert_index.sync(db)
+
+        assert set(alerts.alert_index.rules) == {3}
+        assert alerts.alert_index.match(4151, "high", 90, 120) == [3]
+    finally:
+        db.close()
+
+
+def test_alert_changes_reach_other_workers(client, monkeypatch):
+    events = []
+
+    async def collect(message):
+        # As it arrives over a real backplane
+        events.append(json.loads(json.dumps(message)))
+
+    plane = InProcessBackplane()
+    plane.handler = collect
+    monkeypatch.setattr(api, "backplane", plane)
+    alert_id = client.post("/api/alerts", json={
+        "client_id": "browser-1", "item_id": 4151, "field": "high", "direction": "above", "threshold": 1600000,
+    }).json()["id"]
+    assert client.delete(f"/api/alerts/{alert_id}", params={"client_id": "browser-1"}).status_code == 204
+
+    other = AlertIndex()
+    monkeypatch.setattr(alerts, "alert_index", other)
+    alerts.apply_alert_event(events[0])
+    assert other.rules[alert_id] == Rule("browser-1", 4151, "high", "above", 1600000)
+    alerts.apply_alert_event(events[1])
+    assert len(other) == 0
+
+
+def test_loaded_index_is_not_reread_per_check(client):
+    db = TestingSessionLocal()
+    try:
+        assert check_alerts(db, []) == []
+        assert alerts.alert_index.loaded
+
+        # Written without an event: only a resync sees it
+        db.add(PriceAlert(client_id="a", item_id=4151, field="low", direction="below", threshold=100))
+        db.commit()
+        assert check_alerts(db, [(4151, "low", 120, 80)]) == []
+        alerts.sync_alerts(db)
+        assert [m["client_id"] for m in check_alerts(db, [(4151, "low", 120, 80)])] == ["a"]
+    finally:
+        db.close()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+def test_alerts_are_sent_to_their_owners_sockets():
+    async def scenario():
+        manager = ConnectionManager()
+        owner, other, anonymous = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(owner, client_id="a")
+        await manager.connect(other, client_id="b")
+        await manager.connect(anonymous)
+
+        manager.send_alerts([{"type": "price_alert", "alert_id": 1, "client_id": "a"}])
+        await asyncio.sleep(0.01)
+        assert [m["type"] for m in owner.sent] == ["connection_status", "price_alert"]
+        assert [m["type"] for m in other.sent + anonymous.sent] == ["connection_status"] * 2
+
+        manager.disconnect(owner)
+        assert "a" not in manager.alert_clients
+
+    asyncio.run(scenario())
@@ -0,0 +1,129 @@
+import math
+import pytest
+from datetime import datetime, timedelta
+
+import api
+import snapshot
+from analytics import compute_analytics, rolling_volatility
+from models import Item, ItemPrice, ItemPriceRollup
+
+ITEMS = [
+    # id, name, highalch, high, low
+    (561, "Nature rune", 108, 100, 95),
+    (4151, "Abyssal whip", 72000, 1500000, 1450000),
+    (1513, "Magic logs", 768, 500, 480),
+    (2, "Steel cannonball", 3, 200, 199),
+]
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    monkeypatch.setattr(snapshot, "_volatility", (None, {}))
+    now = datetime.now()
+    for item_id, name, highalch, high, low in ITEMS:
+        db.add(Item(id=item_id, name=name, members="false", highalch=highalch))
+        db.add(ItemPrice(item_id=item_id, high=high, low=low, highTime=now, lowTime=now))
+    for buckets, mid in enumerate((100, 110, 99, 104)):
+        add_bucket(db, 4151, now - timedelta(minutes=5 * (4 - buckets)), mid)
+    db.commit()
+    try:
+        yield db
+    finally:
+        snapshot.publish(None)
+
+
+def add_bucket(db, item_id, at, mid):
+    db.add(ItemPriceRollup(item_id=item_id, resolution="5m", bucket=at.replace(second=0, microsecond=0),
+                           avg_high=mid + 1, avg_low=mid - 1, samples=1))
+
+
+def test_compute_analytics():
+    signals = compute_analytics(
+        ids=(561, 1513, 9),
+        highs=(100, 500, None),
+        lows=(95, 480, 10),
+        highalchs=(108, 768, 50),
+    )
+    # 2% tax on the sale, rounded down
+    assert signals["margin"].tolist()[:2] == [3.0, 10.0]
+    assert signals["roi"][1] == pytest.approx(10 / 480 * 100)
+    assert signals["spread_pct"][1] == pytest.approx(4.0)
+    # Buy the logs at 500 and a nature rune at 100, alch for 768
+    assert signals["alch_profit"][1] == 168
+    assert math.isnan(signals["margin"][2]) and math.isnan(signals["alch_profit"][2])
+    assert all(math.isnan(v) for v in signals["volatility"])
+
+
+def test_rolling_volatility_groups_by_item():
+    volatility = rolling_volatility(
+        ids=(3, 1, 2),
+        tick_item_ids=(1, 1, 1, 2, 2, 3, 3, 3),
+        tick_highs=(100, 110, 99, 50, 60, None, 10, 10),
+        tick_lows=(100, 110, 99, 50, 60, 10, None, 10),
+    )
+    returns = [math.log(110 / 100), math.log(99 / 110)]
+    mean = sum(returns) / 2
+    expected = math.sqrt(sum((r - mean) ** 2 for r in returns)) * 100
+    assert volatility[1] == pytest.approx(expected)
+    # A single return is not enough; flat prices have zero volatility
+    assert math.isnan(volatility[2])
+    assert volatility[0] == 0
+
+
+def test_items_prices_sorts_and_filters_by_analytics(db, monkeypatch):
+    with pytest.raises(api.HTTPException) as exc:
+        api.list_items(db, sort_by="margin")
+    assert exc.value.status_code == 503
+
+    snapshot.refresh_snapshot(db)
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", False)
+
+    page = api.list_items(db, sort_by="margin", sort_order="desc", analytics=True, min_roi=1).model_dump()
+    assert [row["id"] for row in page["results"]] == [4151, 1513, 561]
+    whip = page["results"][0]
+    assert whip["margin"] == 1500000 - 30000 - 1450000
+    assert whip["alch_profit"] == 72000 - 1500000 - 100
+    assert whip["volatility"] > 0
+
+    plain = api.list_items(db, limit=1).model_dump()
+    assert "margin" not in plain["results"][0]
+
+
+def test_analytics_sort_pages_without_analytics_rows(db):
+    snapshot.refresh_snapshot(db)
+    expected = [row.id for row in api.list_items(db, sort_by="margin", sort_order="desc", analytics=True).results]
+
+    seen, cursor = [], None
+    while True:
+        page = api.list_items(db, sort_by="margin", sort_order="desc", limit=1, cursor=cursor, include_total=False)
+        seen += [row.id for row in page.results]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_analytics_top(db):
+    snapshot.refresh_snapshot(db)
+    top = api.analytics_top("alch_profit", limit=2).model_dump()
+    assert [row["id"] for row in top["results"]] == [1513, 561]
+    # Only the whip has history, so it is the only item ranked by volatility
+    assert [row.id for row in api.analytics_top("volatility").results] == [4151]
+    assert [row.id for row in api.analytics_top("spread_pct", order="asc", limit=1).results] == [2]
+
+
+def test_volatility_is_recomputed_only_for_new_buckets(db):
+    first = snapshot.item_volatility(db)
+    assert set(first) == {4151}
+
+    # Same newest bucket: the cached values are reused without reading rollups
+    db.add(ItemPriceRollup(item_id=1513, resolution="5m", bucket=datetime.now() - timedelta(hours=1),
+                           avg_high=500, avg_low=480, samples=1))
+    db.commit()
+    assert snapshot.item_volatility(db) is first
+
+    for minutes, mid in ((10, 500), (5, 550)):
+        add_bucket(db, 1513, datetime.now() - timedelta(minutes=minutes), mid)
+    add_bucket(db, 1513, datetime.now() + timedelta(minutes=5), 520)
+    db.commit()
+    assert set(snapshot.item_volatility(db)) == {4151, 1513}
@@ -0,0 +1,144 @@
+import asyncio
+
+from backplane import (
+    RELEASE_SCRIPT, RENEW_SCRIPT, InProcessBackplane, RedisBackplane, UnixSocketBackplane, _encode_command,
+    _read_reply,
+)
+
+
+class FakeRedis:
+    """Just enough of a Redis server for the backplane: strings with PX expiry and pub/sub."""
+
+    def __init__(self):
+        self.data = {}
+        self.subscribers = {}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                command = await _read_reply(reader)
+                name, args = command[0].decode().upper(), command[1:]
+                if name == "SUBSCRIBE":
+                    self.subscribers.setdefault(args[0], set()).add(writer)
+                    writer.write(_encode_command("subscribe", args[0], 1).replace(b"$1\r\n1", b":1"))
+                elif name == "PUBLISH":
+                    receivers = self.subscribers.get(args[0], set())
+                    for subscriber in receivers:
+                        subscriber.write(_encode_command("message", args[0], args[1]))
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == "SET":
+                    if b"NX" in args and args[0] in self.data:
+                        writer.write(b"$-1\r\n")
+                    else:
+                        self.data[args[0]] = args[1]
+                        writer.write(b"+OK\r\n")
+                elif name == "EVAL":
+                    # Only the backplane's own compare-and-act scripts
+                    script, key, node_id = args[0].decode(), args[2], args[3]
+                    held = self.data.get(key) == node_id
+                    if script not in (RENEW_SCRIPT, RELEASE_SCRIPT):
+                        writer.write(b"-ERR unknown script\r\n")
+                        continue
+                    if held and script == RELEASE_SCRIPT:
+                        del self.data[key]
+                    writer.write(b":1\r\n" if held else b":0\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+
+def collector():
+    received = []
+
+    async def handler(message):
+        received.append(message)
+
+    return received, handler
+
+
+async def settle(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_in_process_delivers_locally():
+    async def scenario():
+        backplane = InProcessBackplane()
+        received, handler = collector()
+        await backplane.start(handler)
+        assert await backplane.acquire_leadership()
+        await backplane.publish({"type": "refresh", "updates": []})
+        assert received == [{"type": "refresh", "updates": []}]
+
+    asyncio.run(scenario())
+
+
+def test_unix_socket_fans_out_and_fails_over(tmp_path):
+    path = str(tmp_path / "backplane.sock")
+
+    async def scenario():
+        leader, follower = UnixSocketBackplane(path), UnixSocketBackplane(path)
+        leader_received, leader_handler = collector()
+        follower_received, follower_handler = collector()
+        await leader.start(leader_handler)
+        await follower.start(follower_handler)
+
+        assert await leader.acquire_leadership()
+        assert not await follower.acquire_leadership()
+        await settle(lambda: leader.peers)
+
+        await leader.publish({"n": 1})
+        await follower.publish({"n": 2})
+        await settle(lambda: len(follower_received) == 2 and len(leader_received) == 2)
+        assert leader_received == follower_received == [{"n": 1}, {"n": 2}]
+
+        # The lock is freed with the leader, and the follower takes over the hub
+        await leader.close()
+        assert await follower.acquire_leadership()
+        await follower.publish({"n": 3})
+        assert follower_received[-1] == {"n": 3}
+        await follower.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_pubsub_and_leader_lock():
+    async def scenario():
+        fake = FakeRedis()
+        server = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+        url = "redis://127.0.0.1:%d/0" % server.sockets[0].getsockname()[1]
+        first = RedisBackplane(url, node_id="node-a")
+        second = RedisBackplane(url, node_id="node-b")
+        first_received, first_handler = collector()
+        second_received, second_handler = collector()
+        await first.start(first_handler)
+        await second.start(second_handler)
+        await settle(lambda: len(fake.subscribers.get(b"osrs:prices", ())) == 2)
+
+        assert await first.acquire_leadership()
+        assert not await second.acquire_leadership()
+        # Renewal by the holder
+        assert await first.acquire_leadership()
+
+        await first.publish({"type": "refresh", "updates": [{"item_id": 4151}]})
+        await settle(lambda: first_received and second_received)
+        assert second_received == [{"type": "refresh", "updates": [{"item_id": 4151}]}]
+
+        # The lock expires and another node takes it before the old holder renews
+        fake.data[b"osrs:leader"] = b"node-b"
+        assert not await first.acquire_leadership()
+        first.leader = True
+        await first.close()
+        assert fake.data[b"osrs:leader"] == b"node-b"
+
+        assert await second.acquire_leadership()
+        second.leader = True
+        await second.close()
+        assert b"osrs:leader" not in fake.data
+        server.close()
+
+    asyncio.run(scenario())
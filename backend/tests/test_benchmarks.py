@@ -0,0 +1,42 @@
+import json
+
+from benchmarks import compare
+from benchmarks.__main__ import main
+from benchmarks.payloads import make_latest, make_mapping
+from benchmarks.results import percentile
+
+
+def test_payloads_are_reproducible():
+    assert make_mapping(50) == make_mapping(50)
+    latest = make_latest(50)
+    assert set(latest["data"]) == {str(item_id) for item_id in range(1, 51)}
+
+    moved = make_latest(50, seed=1, base=latest, changed=0.2)
+    changed = [key for key in latest["data"] if moved["data"][key] != latest["data"][key]]
+    assert len(changed) == 10
+
+
+def test_percentile_is_nearest_rank():
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([3.0], 99) == 3.0
+
+
+def test_suite_writes_comparable_results(tmp_path):
+    output = tmp_path / "results.json"
+    main(["--sizes", "40", "--repeat", "1", "--requests", "8", "--concurrency", "2",
+          "--ws-clients", "5", "--ws-updates", "20", "--output", str(output)])
+
+    written = json.loads(output.read_text())
+    cases = {(entry["suite"], entry["name"]) for entry in written["results"]}
+    assert ("ingest", "fetch_and_store/changed_10pct") in cases
+    assert ("http", "items-prices/search") in cases
+    assert ("ws", "fan-out/delivered") in cases
+    assert written["meta"]["options"]["sizes"] == [40]
+
+    slower = json.loads(output.read_text())
+    for entry in slower["results"]:
+        entry["stats"]["p50"] *= 2
+    rows, regressions = compare.compare(written, slower)
+    assert len(rows) == len(regressions) == len(written["results"])
@@ -0,0 +1,98 @@
+import pytest
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api
+import cache
+import snapshot
+from cache import ResponseCache
+from models import Item, ItemPrice
+from .conftest import TestingSessionLocal, override_get_db
+
+
+app = FastAPI()
+app.include_router(api.router)
+app.dependency_overrides[api.get_db] = override_get_db
+
+
+@pytest.fixture
+def client(db):
+    db.add(Item(
+        id=4151, name="Abyssal whip", examine="A weapon from the abyss.", members="true",
+        icon="Abyssal whip.png", icon_large="Abyssal whip.png"
+    ))
+    db.add(ItemPrice(
+        item_id=4151, high=1500000, low=1490000,
+        highTime=datetime(2024, 3, 20, 12, 0), lowTime=datetime(2024, 3, 20, 11, 59)
+    ))
+    db.commit()
+    snapshot.publish(None)
+    cache.bump_generation()
+    try:
+        yield TestClient(app)
+    finally:
+        cache.bump_generation()
+
+
+def set_price(high: int):
+    session = TestingSessionLocal()
+    session.query(ItemPrice).filter(ItemPrice.item_id == 4151).update({"high": high})
+    session.commit()
+    session.close()
+
+
+def test_responses_are_cached_until_generation_bumps(client):
+    first = client.get("/api/items-prices")
+    assert first.status_code == 200
+    assert first.headers["cache-control"].startswith("public, max-age=")
+    assert first.json()["results"][0]["high"] == 1500000
+
+    set_price(1600000)
+    assert client.get("/api/items-prices").json()["results"][0]["high"] == 1500000
+
+    cache.bump_generation()
+    second = client.get("/api/items-prices")
+    assert second.json()["results"][0]["high"] == 1600000
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+def test_normalized_params_share_an_entry(client):
+    client.get("/api/items-prices?search=whip")
+    set_price(1600000)
+    # Same request after defaults and case folding: served from the cache
+    response = client.get("/api/items-prices?limit=50&search=WHIP&sort_order=asc")
+    assert response.json()["results"][0]["high"] == 1500000
+
+
+@pytest.mark.parametrize("path", ["/api/items-prices", "/api/items/4151", "/api/stats"])
+def test_if_none_match_returns_304(client, path):
+    etag = client.get(path).headers["etag"]
+    response = client.get(path, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    cache.bump_generation()
+    set_price(1600000)
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == (304 if path == "/api/stats" else 200)
+
+
+def test_errors_are_not_cached(client):
+    assert client.get("/api/items/1").status_code == 404
+    assert len(cache.response_cache) == 0
+    assert client.get("/api/items-prices?cursor=bogus").status_code == 400
+
+
+def test_lru_evicts_oldest_and_skips_stale_builds():
+    lru = ResponseCache(max_entries=2)
+    current = cache.generation()
+    lru.set("a", b"1", current)
+    lru.set("b", b"2", current)
+    assert lru.get("a").body == b"1"
+    lru.set("c", b"3", current)
+    assert lru.get("b") is None
+    assert lru.get("a") is not None and lru.get("c") is not None
+
+    lru.set("d", b"4", current - 1)
+    assert lru.get("d") is None
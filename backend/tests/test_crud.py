@@ -0,0 +1,95 @@
+import asyncio
+from sqlalchemy import event
+
+from models import Base, Item, ItemPrice
+from crud import upsert_items, update_prices
+from .conftest import engine
+
+MAPPING = [
+    {"id": 4151, "name": "Abyssal whip", "examine": "A weapon from the abyss.", "members": True,
+     "icon": "Abyssal whip.png", "lowalch": 48000, "highalch": 72000, "value": 120001, "limit": 70},
+    {"id": 536, "name": "Dragon bones", "examine": "These would feed a dogfish for months!", "members": False,
+     "icon": "Dragon bones.png", "value": 1, "limit": 7500},
+]
+
+
+def test_upsert_items_counts(db):
+    assert upsert_items(db, [dict(i) for i in MAPPING]) == {
+        "inserted": 2, "updated": 0, "unchanged": 0, "skipped": 0
+    }
+    whip = db.get(Item, 4151)
+    assert whip.members == "true"
+    assert db.get(Item, 536).highalch == 0
+
+    changed = [dict(i) for i in MAPPING]
+    changed[0]["value"] = 120002
+    assert upsert_items(db, changed) == {
+        "inserted": 0, "updated": 1, "unchanged": 1, "skipped": 0
+    }
+    db.expire_all()
+    assert db.get(Item, 4151).value == 120002
+
+
+def test_update_prices_counts(db):
+    upsert_items(db, [dict(i) for i in MAPPING])
+    prices = {
+        "4151": {"high": 1500000, "highTime": 1700000000, "low": 1490000, "lowTime": 1700000100},
+        "536": {"high": 2500, "highTime": 1700000000, "low": 2400, "lowTime": 1700000000},
+        "999": {"high": 1, "highTime": 1700000000, "low": 1, "lowTime": 1700000000},
+        "560": {"high": 1},
+    }
+    assert update_prices(db, prices) == {
+        "inserted": 2, "updated": 0, "unchanged": 0, "skipped": 2
+    }
+
+    prices["4151"]["high"] = 1510000
+    assert update_prices(db, prices) == {
+        "inserted": 0, "updated": 1, "unchanged": 1, "skipped": 2
+    }
+    db.expire_all()
+    assert db.query(ItemPrice).count() == 2
+    assert db.query(ItemPrice).filter_by(item_id=4151).one().high == 1510000
+
+
+def test_update_prices_uses_batched_statements(db):
+    mapping = [{"id": i, "name": f"Item {i}", "members": False} for i in range(1, 1201)]
+    upsert_items(db, mapping)
+    prices = {
+        str(i): {"high": i, "highTime": 1700000000, "low": i, "lowTime": 1700000000}
+        for i in range(1, 1201)
+    }
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        update_prices(db, prices)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 3
+    assert len(statements) < 12
+
+
+def test_async_variants_with_both_session_kinds(db, tmp_path):
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from crud import upsert_items_async, update_prices_async
+
+    prices = {"4151": {"high": 1500000, "highTime": 1700000000, "low": 1490000, "lowTime": 1700000100}}
+
+    async def scenario():
+        # Sync sessions are handed to the database thread pool
+        assert (await upsert_items_async(db, [dict(i) for i in MAPPING]))["inserted"] == 2
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'prices.db'}")
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(async_engine)() as session:
+            assert (await upsert_items_async(session, [dict(i) for i in MAPPING]))["inserted"] == 2
+            assert (await update_prices_async(session, prices))["inserted"] == 1
+            assert (await update_prices_async(session, prices))["unchanged"] == 1
+        await async_engine.dispose()
+
+    asyncio.run(scenario())
+    assert db.get(Item, 536).name == "Dragon bones"
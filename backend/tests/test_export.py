@@ -0,0 +1,116 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api
+import cache
+import export
+from models import Item, ItemPrice
+from .conftest import TestingSessionLocal, override_get_db
+
+
+app = FastAPI()
+app.include_router(api.router)
+app.dependency_overrides[api.get_db] = override_get_db
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    # Small batches so the export spans several fetches
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    # Exports open their own sessions rather than using get_db
+    monkeypatch.setattr(api, "SessionLocal", TestingSessionLocal)
+    for item_id in range(1, 11):
+        db.add(Item(id=item_id, name=f"Item {item_id}", examine="Ex, \"quoted\"", members="false",
+                    icon="i.png", icon_large="i.png"))
+        if item_id % 4:
+            db.add(ItemPrice(item_id=item_id, high=item_id * 10, low=item_id,
+                             highTime=datetime(2024, 3, 20, 12, item_id)))
+    db.commit()
+    cache.bump_generation()
+    try:
+        yield TestClient(app)
+    finally:
+        cache.bump_generation()
+
+
+def test_batch_answers_ids_in_request_order(client):
+    response = client.get("/api/items/batch", params={"ids": "8,3,99,3"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["results"]] == [8, 3]
+    assert body["results"][0]["high"] is None and body["results"][1]["high"] == 30.0
+    assert body["missing"] == [99]
+    # Same shape as the single-item endpoint
+    assert client.get("/api/items/3").json() == body["results"][1]
+
+
+def test_batch_cache_keeps_each_request_order(client):
+    first = client.get("/api/items/batch", params={"ids": "3,8,1"}).json()
+    second = client.get("/api/items/batch", params={"ids": "1,3,8"}).json()
+    assert [item["id"] for item in first["results"]] == [3, 8, 1]
+    assert [item["id"] for item in second["results"]] == [1, 3, 8]
+
+
+@pytest.mark.parametrize("ids", ["", "1,x", ",".join(map(str, range(api.BATCH_MAX_IDS + 1)))])
+def test_batch_rejects_bad_ids(client, ids):
+    assert client.get("/api/items/batch", params={"ids": ids}).status_code == 400
+
+
+def test_export_ndjson(client):
+    response = client.get("/api/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    rows = [json.loads(line) for line in gzip.decompress(response.content).splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, 11))
+    assert rows[0] == client.get("/api/items/1").json()
+    assert rows[3]["high"] is None
+
+
+def test_export_csv(client):
+    response = client.get("/api/export", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert len(rows) == 10
+    assert rows[0]["examine"] == 'Ex, "quoted"'
+    assert rows[1]["highTime"] == "2024-03-20T12:02:00"
+    assert rows[3]["high"] == ""
+
+
+def test_export_arrow(client):
+    response = client.get("/api/export", params={"format": "arrow"})
+    if export.pa is None:
+        assert response.status_code == 501
+        return
+    table = export.pa.ipc.open_stream(gzip.decompress(response.content)).read_all()
+    assert table.column("id").to_pylist() == list(range(1, 11))
+    assert table.column("high").to_pylist()[3] is None
+
+
+def test_export_stream_owns_its_session(client):
+    opened = []
+
+    def tracked():
+        session = TestingSessionLocal()
+        opened.append(session)
+        return session
+
+    stream = export.export_stream(tracked, "ndjson", batch_size=3)
+    assert opened == []
+    first = next(stream)
+    assert len(opened) == 1 and opened[0].in_transaction()
+
+    rest = b"".join(stream)
+    assert len(gzip.decompress(first + rest).splitlines()) == 10
+    assert not opened[0].in_transaction()
+
+    # A client that disconnects mid-download abandons the stream
+    stream = export.export_stream(tracked, "csv", batch_size=3)
+    next(stream)
+    stream.close()
+    assert not opened[1].in_transaction()
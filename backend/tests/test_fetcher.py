@@ -0,0 +1,365 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import alerts
+import cache
+import crud
+import fetcher
+import snapshot
+import warmstart
+from backplane import InProcessBackplane
+from websocket import ConnectionManager
+from models import Item, ItemPrice, PriceAlert
+from .conftest import TestingSessionLocal
+
+MAPPING = [
+    {"id": 4151, "name": "Abyssal whip", "examine": "A weapon from the abyss.", "members": True,
+     "icon": "Abyssal whip.png", "lowalch": 48000, "highalch": 72000, "value": 120001, "limit": 70},
+    {"id": 536, "name": "Dragon bones", "examine": "These would feed a dogfish for months!", "members": False,
+     "icon": "Dragon bones.png", "value": 1, "limit": 7500},
+]
+
+
+class FakeWiki:
+    """Local stand-in for the prices API that honours conditional requests."""
+
+    def __init__(self):
+        self.mapping = json.dumps(MAPPING).encode()
+        self.mapping_etag = '"m1"'
+        self.latest = {"data": {
+            "4151": {"high": 1500000, "highTime": 1700000000, "low": 1490000, "lowTime": 1700000000},
+            "536": {"high": 2500, "highTime": 1700000000, "low": 2400, "lowTime": 1700000000},
+        }}
+        self.latest_modified = "Tue, 14 Nov 2023 22:13:20 GMT"
+        self.window = {"timestamp": 1700000000, "data": {}}
+        self.requests = []
+
+    async def mapping_handler(self, request):
+        self.requests.append(("mapping", request.headers.get("If-None-Match")))
+        if request.headers.get("If-None-Match") == self.mapping_etag:
+            return web.Response(status=304)
+        headers = {"ETag": self.mapping_etag} if self.mapping_etag else {}
+        return web.Response(body=self.mapping, content_type="application/json", headers=headers)
+
+    async def latest_handler(self, request):
+        self.requests.append(("latest", request.headers.get("If-Modified-Since")))
+        if request.headers.get("If-Modified-Since") == self.latest_modified:
+            return web.Response(status=304)
+        headers = {"Last-Modified": self.latest_modified} if self.latest_modified else {}
+        return web.json_response(self.latest, headers=headers)
+
+    async def window_handler(self, request):
+        return web.json_response(self.window)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/mapping", self.mapping_handler)
+        app.router.add_get("/latest", self.latest_handler)
+        app.router.add_get("/5m", self.window_handler)
+        return app
+
+
+@pytest.fixture
+def wiki(tables, monkeypatch):
+    monkeypatch.setattr(fetcher, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(fetcher, "_validators", {})
+    monkeypatch.setattr(fetcher, "_mapping_hash", None)
+    monkeypatch.setattr(fetcher, "_price_state", None)
+    monkeypatch.setattr(fetcher, "_last_window", None)
+    monkeypatch.setattr(alerts, "alert_index", alerts.AlertIndex())
+
+    calls = []
+    for name in ("upsert_items", "update_prices"):
+        original = getattr(crud, name)
+        def spy(db, payload, _name=name, _original=original, **kwargs):
+            calls.append(_name)
+            return _original(db, payload, **kwargs)
+        monkeypatch.setattr(crud, name, spy)
+
+    fake = FakeWiki()
+    fake.calls = calls
+    yield fake
+    snapshot.publish(None)
+
+
+def run_cycles(wiki, monkeypatch, cycles):
+    async def scenario():
+        server = TestServer(wiki.app())
+        await server.start_server()
+        monkeypatch.setattr(fetcher, "API_BASE", str(server.make_url("")).rstrip("/"))
+        try:
+            for cycle in cycles:
+                cycle()
+                await fetcher.fetch_and_store()
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_not_modified_skips_all_work(wiki, monkeypatch):
+    run_cycles(wiki, monkeypatch, [lambda: None, lambda: None])
+
+    assert wiki.calls == ["upsert_items", "update_prices"]
+    assert ("mapping", '"m1"') in wiki.requests
+    assert ("latest", wiki.latest_modified) in wiki.requests
+
+
+def test_writes_run_on_the_database_threads(wiki, monkeypatch):
+    threads = []
+    for name in ("upsert_items", "update_prices"):
+        original = getattr(crud, name)
+        def watched(db, payload, _original=original, **kwargs):
+            threads.append(threading.current_thread().name)
+            return _original(db, payload, **kwargs)
+        monkeypatch.setattr(crud, name, watched)
+    monkeypatch.setattr(fetcher, "record_ticks",
+                        lambda db, prices, **kwargs: threads.append(threading.current_thread().name))
+
+    run_cycles(wiki, monkeypatch, [lambda: None])
+
+    assert len(threads) == 3
+    assert all(name.startswith("db") for name in threads)
+
+
+def test_unchanged_mapping_is_not_upserted(wiki, monkeypatch):
+    def change_prices():
+        # Upstream drops validators but serves the same mapping bytes
+        wiki.mapping_etag = None
+        wiki.latest_modified = None
+        wiki.latest["data"]["536"]["high"] = 2600
+
+    run_cycles(wiki, monkeypatch, [lambda: None, change_prices])
+
+    assert wiki.calls == ["upsert_items", "update_prices", "update_prices"]
+    db = TestingSessionLocal()
+    try:
+        assert db.query(ItemPrice).filter_by(item_id=536).one().high == 2600
+    finally:
+        db.close()
+
+
+def test_streaming_writes_prices_in_chunks(wiki, monkeypatch):
+    monkeypatch.setattr(fetcher, "STREAM_PRICES", True)
+    monkeypatch.setattr(fetcher, "STREAM_CHUNK_SIZE", 1)
+    monkeypatch.setattr(fetcher, "STREAM_READ_SIZE", 16)
+
+    run_cycles(wiki, monkeypatch, [lambda: None, lambda: None])
+
+    # One write per chunk, then nothing once /latest answers 304
+    assert wiki.calls == ["upsert_items", "update_prices", "update_prices"]
+    db = TestingSessionLocal()
+    try:
+        assert {p.item_id: p.high for p in db.query(ItemPrice)} == {4151: 1500000, 536: 2500}
+    finally:
+        db.close()
+
+
+def test_refresh_is_published_and_applied_by_followers(wiki, monkeypatch):
+    published = []
+
+    async def collect(message):
+        published.append(message)
+
+    leader = InProcessBackplane()
+    leader.handler = collect
+    monkeypatch.setattr(fetcher, "backplane", leader)
+
+    run_cycles(wiki, monkeypatch, [lambda: None])
+
+    assert len(published) == 1
+    assert published[0]["origin"] == fetcher.NODE_ID
+    assert {entry["item_id"] for entry in published[0]["updates"]} == {4151, 536}
+
+    # Another worker receives it: rebuilds its snapshot, invalidates its cache and fans out
+    snapshot.publish(None)
+    monkeypatch.setattr(fetcher, "manager", ConnectionManager())
+    # Created through this worker, since triggered by the leader
+    alerts.alert_index.add(99, alerts.Rule("browser-1", 4151, "high", "above", 1600000))
+    generation = cache.generation()
+    triggered = [{"type": "price_alert", "alert_id": 99, "client_id": "browser-1"}]
+    asyncio.run(fetcher.apply_refresh({**published[0], "origin": "other-node", "alerts": triggered}))
+    assert len(snapshot.get_snapshot()) == 2
+    assert cache.generation() == generation + 1
+    assert len(alerts.alert_index) == 0
+
+
+def test_crossed_alerts_are_published_with_the_refresh(wiki, monkeypatch):
+    published = []
+
+    async def collect(message):
+        published.append(message)
+
+    leader = InProcessBackplane()
+    leader.handler = collect
+    monkeypatch.setattr(fetcher, "backplane", leader)
+
+    def add_alert():
+        db = TestingSessionLocal()
+        db.add(PriceAlert(client_id="browser-1", item_id=4151, field="high", direction="above", threshold=1550000))
+        db.commit()
+        db.close()
+        wiki.latest["data"]["4151"]["high"] = 1600000
+        wiki.latest_modified = "Tue, 14 Nov 2023 22:18:20 GMT"
+
+    run_cycles(wiki, monkeypatch, [lambda: None, add_alert])
+
+    assert published[0]["alerts"] == []
+    assert [(alert["item_id"], alert["price"]) for alert in published[1]["alerts"]] == [(4151, 1600000)]
+
+
+def test_price_state_is_loaded_once_and_kept_current(wiki, monkeypatch):
+    loads = []
+    original = fetcher.PriceState.load
+    monkeypatch.setattr(fetcher.PriceState, "load", classmethod(lambda cls, db: loads.append(1) or original(db)))
+
+    def move_price():
+        wiki.latest["data"]["536"]["high"] = 2600
+        wiki.latest_modified = "Tue, 14 Nov 2023 22:18:20 GMT"
+
+    def same_prices():
+        wiki.latest_modified = "Tue, 14 Nov 2023 22:23:20 GMT"
+
+    run_cycles(wiki, monkeypatch, [lambda: None, move_price, same_prices])
+
+    # Mapping and first prices, then only the moved price; never reloaded
+    assert loads == [1]
+    assert wiki.calls == ["upsert_items", "update_prices", "update_prices"]
+    assert fetcher._price_state.diff([("536", {**wiki.latest["data"]["536"]})]) == {}
+
+
+def test_refresh_writes_the_warm_start_file(wiki, monkeypatch, tmp_path):
+    published = []
+
+    async def collect(message):
+        published.append(message)
+
+    leader = InProcessBackplane()
+    leader.handler = collect
+    monkeypatch.setattr(fetcher, "backplane", leader)
+    path = str(tmp_path / "snapshot.bin")
+    monkeypatch.setattr(fetcher, "SNAPSHOT_FILE", path)
+
+    run_cycles(wiki, monkeypatch, [lambda: None])
+
+    loaded, header = warmstart.read_snapshot_file(path)
+    assert set(loaded.ids) == {4151, 536}
+    # Written at the cycle the refresh announced
+    assert header["seq"] == published[0]["seq"]
+
+
+def test_failed_incremental_cycle_is_retried(wiki, monkeypatch):
+    monkeypatch.setattr(fetcher, "INCREMENTAL_SOURCE", "5m")
+    stored = crud.update_prices
+    failures = []
+
+    def flaky(db, payload, **kwargs):
+        if failures:
+            failures.pop()
+            raise RuntimeError("database went away")
+        return stored(db, payload, **kwargs)
+
+    monkeypatch.setattr(crud, "update_prices", flaky)
+
+    def trade_536():
+        wiki.window = {"timestamp": 1700000300, "data": {"536": {}}}
+        wiki.latest["data"]["536"]["high"] = 2600
+        wiki.latest_modified = "Tue, 14 Nov 2023 22:18:20 GMT"
+        failures.append(1)
+
+    run_cycles(wiki, monkeypatch, [lambda: None, trade_536, lambda: None])
+
+    # The failed cycle did not consume the window, so the retry diffed 536
+    assert fetcher._last_window == 1700000300
+    db = TestingSessionLocal()
+    try:
+        assert db.query(ItemPrice).filter_by(item_id=536).one().high == 2600
+    finally:
+        db.close()
+
+
+def test_unchanged_window_still_diffs_latest(wiki, monkeypatch):
+    monkeypatch.setattr(fetcher, "INCREMENTAL_SOURCE", "5m")
+
+    def move_within_window():
+        # Same 5m window, so its trades cannot say which prices moved
+        wiki.latest["data"]["536"]["high"] = 2600
+        wiki.latest_modified = "Tue, 14 Nov 2023 22:14:20 GMT"
+
+    run_cycles(wiki, monkeypatch, [lambda: None, move_within_window])
+
+    assert wiki.calls == ["upsert_items", "update_prices", "update_prices"]
+    db = TestingSessionLocal()
+    try:
+        assert db.query(ItemPrice).filter_by(item_id=536).one().high == 2600
+    finally:
+        db.close()
+
+
+def test_cycle_without_changes_publishes_nothing(wiki, monkeypatch):
+    published = []
+
+    async def collect(message):
+        published.append(message)
+
+    leader = InProcessBackplane()
+    leader.handler = collect
+    monkeypatch.setattr(fetcher, "backplane", leader)
+    generations = []
+
+    def same_prices():
+        generations.append(cache.generation())
+        wiki.latest_modified = "Tue, 14 Nov 2023 22:18:20 GMT"
+
+    run_cycles(wiki, monkeypatch, [lambda: None, same_prices])
+
+    assert len(published) == 1
+    assert cache.generation() == generations[0]
+
+
+def test_loop_keeps_running_while_a_large_snapshot_is_built(wiki, monkeypatch):
+    db = TestingSessionLocal()
+    db.add_all(Item(id=item_id, name=f"Item {item_id}") for item_id in range(1, 5001))
+    db.add_all(ItemPrice(item_id=item_id, high=item_id, low=item_id) for item_id in range(1, 5001))
+    db.commit()
+    db.close()
+
+    leader = InProcessBackplane()
+    leader.handler = lambda message: asyncio.sleep(0)
+    monkeypatch.setattr(fetcher, "backplane", leader)
+
+    building = threading.Event()
+    responded = threading.Event()
+    threads = []
+    build = fetcher.refresh_snapshot
+
+    def watched_build(db):
+        threads.append(threading.current_thread().name)
+        building.set()
+        built = build(db)
+        # Never set if the build holds the event loop
+        responded.wait(5)
+        return built
+
+    monkeypatch.setattr(fetcher, "refresh_snapshot", watched_build)
+
+    async def scenario():
+        async def heartbeat():
+            while not building.is_set():
+                await asyncio.sleep(0.001)
+            responded.set()
+
+        beat = asyncio.create_task(heartbeat())
+        await fetcher.publish_refresh([])
+        await beat
+
+    asyncio.run(scenario())
+
+    assert responded.is_set()
+    assert threads[0].startswith("db")
+    assert len(snapshot.get_snapshot()) == 5000
@@ -0,0 +1,61 @@
+import pytest
+from datetime import datetime, timedelta
+
+import history
+from models import Item, ItemPriceRollup
+
+START = datetime(2024, 3, 20, 12, 0)
+
+
+@pytest.fixture
+def db(db):
+    db.add(Item(id=4151, name="Abyssal whip", members="true"))
+    db.commit()
+    return db
+
+
+def tick(high, low):
+    return {4151: {"high": high, "low": low, "highTime": 1710936000, "lowTime": 1710936000}}
+
+
+def test_compaction_rolls_ticks_into_ohlc_buckets(db):
+    # Two hours of ticks every 5 minutes, mid price rising by 10 each time
+    for n in range(24):
+        at = START + timedelta(minutes=5 * n, seconds=30)
+        history.record_ticks(db, tick(1000 + 10 * n + 5, 1000 + 10 * n - 5), at=at)
+
+    written = history.compact(db, now=START + timedelta(hours=2, minutes=1))
+    assert written == {"5m": 24, "1h": 2, "1d": 0}
+
+    hours = history.query_history(db, 4151, START, START + timedelta(hours=2), "1h")
+    assert [(p["open"], p["high"], p["low"], p["close"], p["samples"]) for p in hours] == [
+        (1000, 1110, 1000, 1110, 12),
+        (1120, 1230, 1120, 1230, 12),
+    ]
+    assert hours[0]["avg_high"] == pytest.approx(1060)
+
+    # Re-running is idempotent and resumes after the newest bucket
+    assert history.compact(db, now=START + timedelta(hours=2, minutes=1)) == {"5m": 0, "1h": 0, "1d": 0}
+    assert db.query(ItemPriceRollup).count() == 26
+
+
+def test_retention_drops_old_rows(db):
+    history.record_ticks(db, tick(100, 90), at=START)
+    history.compact(db, now=START + timedelta(days=30))
+    assert history.query_history(db, 4151, START - timedelta(days=1), START + timedelta(days=1), "raw") == []
+    assert history.query_history(db, 4151, START - timedelta(days=1), START + timedelta(days=1), "5m") == []
+    assert len(history.query_history(db, 4151, START - timedelta(days=1), START + timedelta(days=1), "1h")) == 1
+
+
+@pytest.mark.parametrize("span, age, expected", [
+    (timedelta(hours=6), timedelta(0), "raw"),
+    (timedelta(days=1), timedelta(0), "raw"),
+    (timedelta(days=3), timedelta(0), "1h"),
+    (timedelta(days=1), timedelta(days=5), "5m"),
+    (timedelta(days=14), timedelta(0), "1h"),
+    (timedelta(days=365), timedelta(0), "1d"),
+])
+def test_pick_resolution(span, age, expected):
+    now = datetime(2024, 3, 20)
+    end = now - age
+    assert history.pick_resolution(end - span, end, now=now) == expected
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import jobs
+from jobs import Job, JobScheduler
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: high if low >= 0 else 0)
+
+
+def test_schedule_is_anchored_and_backs_off():
+    job = Job("latest", None, interval=60, backoff_base=5, backoff_max=30)
+    job.anchor = 1000
+    # A run that took 7 s does not push the next one back
+    job.schedule(1007)
+    assert job.due == 1060
+    # A run that overran two slots resumes on the next one
+    job.schedule(1185)
+    assert job.due == 1240
+
+    for failures, due in ((1, 1245), (2, 1250), (3, 1260), (4, 1270), (5, 1270)):
+        job.consecutive_failures = failures
+        job.schedule(1240, succeeded=False)
+        assert job.due == due
+    job.consecutive_failures = 0
+    job.schedule(1241)
+    assert job.due == 1300
+
+
+def test_runs_are_single_flight():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    async def scenario():
+        job = Job("latest", fetch, interval=60)
+        assert await asyncio.gather(job.run(), job.run(), job.run()) == [True] * 3
+        assert len(calls) == 1
+        assert await job.run()
+        return job
+
+    job = asyncio.run(scenario())
+    assert len(calls) == 2
+    stats = job.stats()
+    assert stats["runs"] == 2 and stats["failures"] == 0 and not stats["running"]
+    assert stats["last_duration"] >= 0.01
+
+
+def test_scheduler_runs_due_jobs_in_order_and_retries_failures():
+    runs = []
+    attempts = {"latest": 0}
+
+    async def mapping():
+        runs.append("mapping")
+
+    async def latest():
+        runs.append("latest")
+        attempts["latest"] += 1
+        if attempts["latest"] == 1:
+            raise RuntimeError("upstream 502")
+
+    async def scenario():
+        scheduler = JobScheduler()
+        scheduler.add(Job("mapping", mapping, interval=3600))
+        scheduler.add(Job("latest", latest, interval=60, backoff_base=0.01))
+        active = [False]
+        task = asyncio.create_task(scheduler.run(active=lambda: active[0], idle=0.01))
+        await asyncio.sleep(0.03)
+        assert runs == []
+        active[0] = True
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert runs == ["mapping", "latest", "latest"]
+    latest_stats = scheduler.get("latest").stats()
+    assert latest_stats["failures"] == 1 and latest_stats["consecutive_failures"] == 0
+    assert 50 < latest_stats["next_run_in"] <= 60
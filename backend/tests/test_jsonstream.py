@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+import pytest
+
+from jsonstream import iter_object_members
+
+DOCUMENT = {
+    "timestamp": 1700000000,
+    "data": {
+        str(item_id): {"high": item_id * 1.5, "highTime": 1700000000 + item_id, "low": None, "lowTime": 1700000000}
+        for item_id in range(200)
+    },
+    "note": "Dragon bones — ünïcode",
+}
+
+
+def collect(raw: bytes, chunk_size: int, key: str = "data"):
+    async def chunks():
+        for start in range(0, len(raw), chunk_size):
+            yield raw[start:start + chunk_size]
+
+    async def run():
+        return [member async for member in iter_object_members(chunks(), key)]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_members_match_full_parse(chunk_size, indent):
+    raw = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False).encode()
+    assert collect(raw, chunk_size) == list(DOCUMENT["data"].items())
+
+
+def test_empty_and_missing_key():
+    assert collect(b'{"data": {}}', 4) == []
+    assert collect(b'{"timestamp": 1}', 4) == []
+
+
+def test_truncated_stream_raises():
+    raw = json.dumps(DOCUMENT).encode()[:-40]
+    with pytest.raises(ValueError):
+        collect(raw, 64)
@@ -0,0 +1,83 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+import api
+import database
+import metrics
+
+
+def test_engine_instrumentation(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", poolclass=metrics.TimedQueuePool, pool_size=3)
+    metrics.instrument(engine, "test")
+
+    with engine.connect() as conn:
+        assert metrics.POOL_IN_USE.values[("test",)] == 1
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+        conn.execute(text("SELECT x FROM t"))
+        try:
+            conn.execute(text("SELECT missing FROM t"))
+        except Exception:
+            pass
+    assert metrics.POOL_IN_USE.values[("test",)] == 0
+
+    output = metrics.render_metrics()
+    assert 'db_query_duration_seconds_count{engine="test",operation="SELECT"} 1' in output
+    assert 'db_query_duration_seconds_count{engine="test",operation="INSERT"} 1' in output
+    assert 'db_query_duration_seconds_bucket{engine="test",operation="OTHER",le="+Inf"} 1' in output
+    assert 'db_query_errors_total{engine="test"} 1' in output
+    assert 'db_pool_connect_seconds_count{engine="test"} 1' in output
+    assert 'db_pool_size{engine="test"} 3' in output
+    assert 'db_pool_overflow{engine="test"} 0' in output
+    assert 'db_pool_wait_seconds_count{engine="test"} 1' in output
+    engine.dispose()
+
+
+def test_pool_overflow_is_reported(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'overflow.db'}", poolclass=metrics.TimedQueuePool,
+                           pool_size=1, max_overflow=2)
+    metrics.instrument(engine, "overflow")
+
+    with engine.connect(), engine.connect():
+        assert 'db_pool_overflow{engine="overflow"} 1' in metrics.render_metrics()
+        assert metrics.POOL_IN_USE.values[("overflow",)] == 2
+    assert 'db_pool_connect_seconds_count{engine="overflow"} 2' in metrics.render_metrics()
+    assert 'db_pool_wait_seconds_count{engine="overflow"} 2' in metrics.render_metrics()
+    engine.dispose()
+    # A recreated pool keeps reporting under the engine's label
+    with engine.connect():
+        pass
+    assert 'db_pool_wait_seconds_count{engine="overflow"} 3' in metrics.render_metrics()
+    engine.dispose()
+
+
+def test_server_databases_get_timed_pools():
+    assert database.pool_options("postgresql")["poolclass"] is metrics.TimedQueuePool
+    assert database.pool_options("postgresql", is_async=True)["poolclass"] is metrics.TimedAsyncAdaptedQueuePool
+    assert "poolclass" not in database.pool_options("sqlite")
+
+
+def test_histogram_buckets_are_cumulative(monkeypatch):
+    # Keep the throwaway metric out of /api/metrics
+    monkeypatch.setattr(metrics, "_registry", [])
+    histogram = metrics.Histogram("test_seconds", "Test", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'a"b')
+    lines = histogram.render().splitlines()
+    assert lines[2:] == [
+        'test_seconds_bucket{kind="a\\"b",le="0.1"} 2',
+        'test_seconds_bucket{kind="a\\"b",le="1.0"} 3',
+        'test_seconds_bucket{kind="a\\"b",le="+Inf"} 4',
+        'test_seconds_sum{kind="a\\"b"} 3.65',
+        'test_seconds_count{kind="a\\"b"} 4',
+    ]
+
+
+def test_metrics_endpoint():
+    app = FastAPI()
+    app.include_router(api.router)
+    response = TestClient(app).get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE db_query_duration_seconds histogram" in response.text
@@ -0,0 +1,44 @@
+
+import pytest
+
+from models import Item, ItemPrice
+from pricestate import PriceState
+
+
+def entry(high, low):
+    return {"high": high, "highTime": 1700000000, "low": low, "lowTime": 1700000000}
+
+
+@pytest.fixture
+def state(db):
+    for item_id in (2, 4, 6, 8):
+        db.add(Item(id=item_id, name=f"Item {item_id}"))
+    db.add(ItemPrice(item_id=2, high=100, low=90))
+    db.add(ItemPrice(item_id=4, high=None, low=40))
+    db.commit()
+    return PriceState.load(db)
+
+
+def test_diff_matches_stored_prices(state):
+    assert len(state) == 4
+    records = [
+        ("2", entry(100, 90)),    # unchanged
+        ("4", entry(None, 40)),   # unchanged, missing high on both sides
+        ("6", entry(60, 50)),     # known but never priced
+        ("8", {"high": 80}),      # incomplete entry
+        ("9", entry(1, 1)),       # not in the mapping
+        ("x", entry(1, 1)),
+    ]
+    assert state.diff(records) == {6: entry(60, 50)}
+    assert state.diff([("2", entry(101, 90)), ("4", entry(45, 40))]) == {2: entry(101, 90), 4: entry(45, 40)}
+    assert state.diff([("2", entry(101, 90)), ("6", entry(60, 50))], traded_ids={6}) == {6: entry(60, 50)}
+
+
+def test_moves_and_apply(state):
+    changed = {2: entry(120, 90), 4: entry(45, 40), 6: entry(60, 50), 9: entry(1, 1)}
+    assert state.moves(changed) == [(2, "high", 100.0, 120), (2, "low", 90.0, 90),
+                                    (4, "high", None, 45), (4, "low", 40.0, 40)]
+
+    state.apply(changed)
+    assert state.diff(changed.items()) == {}
+    assert state.moves({6: entry(70, 50)}) == [(6, "high", 60.0, 70), (6, "low", 50.0, 50)]
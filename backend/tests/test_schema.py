@@ -0,0 +1,89 @@
+import os
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, event
+
+import api
+from models import Base, Item, ItemPrice
+from .conftest import engine
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", False)
+    for item_id in range(1, 301):
+        db.add(Item(id=item_id, name=f"Item {item_id}", members="true" if item_id % 3 else "false"))
+        db.add(ItemPrice(item_id=item_id, high=item_id * 7 % 1000 or None, low=item_id))
+    db.commit()
+    # Give the planner statistics, as a populated database would have
+    db.connection().exec_driver_sql("ANALYZE")
+    db.commit()
+    return db
+
+
+def listing_plan(db, **params):
+    """SQLite's plan for the page query ``list_items`` issues."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "item_prices" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        api.list_items(db, include_total=False, **params)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = statements[0]
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"membership": "true"},
+    {"sort_by": "high", "sort_order": "desc"},
+    {"sort_by": "low"},
+    {"sort_by": "highTime", "sort_order": "desc"},
+    {"sort_by": "lowTime"},
+])
+def test_sorted_listings_walk_an_index(db, params):
+    plan = listing_plan(db, **params)
+    assert plan[0].startswith("SCAN") and "USING" in plan[0] and "INDEX" in plan[0], plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_keyset_pages_seek_into_the_index(db):
+    first = api.list_items(db, sort_by="high", sort_order="desc", limit=10, include_total=False)
+    plan = listing_plan(db, sort_by="high", sort_order="desc", limit=10, cursor=first.next_cursor)
+    assert any("ix_item_prices_high_item_id" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_price_filters_use_the_price_index(db):
+    plan = listing_plan(db, min_high=900)
+    # Not covering: the page reads its price columns in the same query
+    assert any(step.startswith("SEARCH item_prices USING INDEX ix_item_prices_high_item_id") for step in plan), plan
+
+
+def test_migrations_create_the_model_schema(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    # No ini file, so env.py leaves the test run's logging alone
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+    migrated = create_engine(url)
+    try:
+        with migrated.connect() as connection:
+            assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+    finally:
+        migrated.dispose()
+    command.downgrade(config, "base")
@@ -0,0 +1,54 @@
+import pytest
+
+import api
+from models import Item, ItemPrice
+from search import SearchIndex
+
+NAMES = [
+    "Abyssal whip", "Abyssal dagger", "Dragon bones", "Dragon scimitar", "Dragon",
+    "Bandos chestplate", "Nature rune", "Rune scimitar", "Magic logs", "100% cotton",
+    "Whip_of_tests",
+]
+INDEX = SearchIndex(tuple(range(len(NAMES))), NAMES)
+
+
+@pytest.mark.parametrize("query", ["dragon", "DRAG", "e", "scim", "on b", "rune", "%", "_of", "xyz", "ag"])
+def test_matches_equal_substring_scan(query):
+    expected = {pos for pos, name in enumerate(NAMES) if query.lower() in name.lower()}
+    assert INDEX.matches(query) == expected
+
+
+def test_suggest_ranks_exact_then_prefix_then_word_prefix():
+    names = [NAMES[pos] for pos in INDEX.suggest("dragon", limit=10)]
+    assert names == ["Dragon", "Dragon bones", "Dragon scimitar"]
+
+    names = [NAMES[pos] for pos in INDEX.suggest("rune", limit=10)]
+    assert names == ["Rune scimitar", "Nature rune"]
+
+    names = [NAMES[pos] for pos in INDEX.suggest("ip", limit=10)]
+    assert names == []
+    assert [NAMES[pos] for pos in INDEX.suggest("wh", limit=2)] == ["Whip_of_tests", "Abyssal whip"]
+
+
+PARITY_NAMES = NAMES + ["Rune-platebody", "Dragon (kiteshield)", "Dragon", "Ring of wealth (5)", None]
+
+
+@pytest.fixture
+def priced_db(db, monkeypatch):
+    for item_id, name in enumerate(PARITY_NAMES, start=1):
+        db.add(Item(id=item_id, name=name))
+        db.add(ItemPrice(item_id=item_id, high=100, low=90))
+    db.commit()
+    # The SQL fallback only runs before the first snapshot
+    monkeypatch.setattr(api, "get_snapshot", lambda: None)
+    return db
+
+
+@pytest.mark.parametrize("query", ["dragon", "drag", "d", "ri", "pl", "rune", "(k", "on b", "% c", "_of", "ip", " wh "])
+def test_sql_fallback_suggests_like_the_index(priced_db, query):
+    ids = tuple(range(1, len(PARITY_NAMES) + 1))
+    index = SearchIndex(ids, PARITY_NAMES)
+    expected = [(index.ids[pos], index.names[pos]) for pos in index.suggest(query, limit=5)]
+
+    response = api.suggest_items(db=priced_db, q=query, limit=5)
+    assert [(row.id, row.name) for row in response.results] == expected
@@ -0,0 +1,175 @@
+import json
+
+import pytest
+from datetime import datetime
+from sqlalchemy import event
+
+import api
+import cache
+import snapshot
+from models import Item, ItemPrice
+from .conftest import engine
+
+ITEMS = [
+    (4151, "Abyssal whip", "true", 1500000, 1490000),
+    (536, "Dragon bones", "false", 2500, 2400),
+    (11832, "Bandos chestplate", "true", 14000000, 13800000),
+    (561, "Nature rune", "false", 90, 88),
+    (1513, "Magic logs", "false", 1100, 1050),
+    (4587, "Dragon scimitar", "true", 60000, 59000),
+]
+
+
+@pytest.fixture
+def db(db):
+    for n, (item_id, name, members, high, low) in enumerate(ITEMS):
+        db.add(Item(id=item_id, name=name, members=members))
+        db.add(ItemPrice(
+            item_id=item_id, high=high, low=low,
+            highTime=datetime(2024, 3, 20, 12, n), lowTime=datetime(2024, 3, 20, 11, 59 - n)
+        ))
+    db.commit()
+    try:
+        yield db
+    finally:
+        snapshot.publish(None)
+        cache.bump_generation()
+
+
+def get_items(db, **params):
+    args = dict(
+        limit=50, offset=0, search="", sort_by="name", sort_order="asc",
+        min_high=None, max_high=None, min_low=None, max_low=None, membership=None,
+        cursor=None, include_total=True
+    )
+    args.update(params)
+    return api.list_items(db, **args).model_dump()
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"sort_by": "high", "sort_order": "desc"},
+    {"sort_by": "lowTime", "limit": 2, "offset": 1},
+    {"search": "DRAGON"},
+    {"membership": "true", "sort_by": "low"},
+    {"min_high": 1100, "max_high": 1500000},
+    {"min_low": 2400, "max_low": 2400},
+    {"search": "o", "min_high": 100, "sort_by": "highTime", "sort_order": "desc", "limit": 1, "offset": 2},
+    {"offset": 10},
+])
+def test_snapshot_matches_sql(db, monkeypatch, params):
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", False)
+    expected = get_items(db, **params)
+
+    snapshot.refresh_snapshot(db)
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", True)
+    assert get_items(db, **params) == expected
+
+
+def test_refresh_replaces_snapshot(db):
+    first = snapshot.refresh_snapshot(db)
+    db.query(ItemPrice).filter_by(item_id=561).update({"high": 95})
+    db.commit()
+
+    second = snapshot.refresh_snapshot(db)
+    assert snapshot.get_snapshot() is second
+    assert second.version == first.version + 1
+    assert first.row(first.positions[561])["high"] == 90
+    assert second.row(second.positions[561])["high"] == 95
+
+
+@pytest.mark.parametrize("use_snapshot", [False, True])
+@pytest.mark.parametrize("sort_by, sort_order", [("name", "asc"), ("high", "desc"), ("lowTime", "asc")])
+def test_cursor_pages_cover_listing(db, monkeypatch, use_snapshot, sort_by, sort_order):
+    # Two items share a price to exercise the id tiebreaker
+    db.query(ItemPrice).filter_by(item_id=1513).update({"high": 2500})
+    db.commit()
+    if use_snapshot:
+        snapshot.refresh_snapshot(db)
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", use_snapshot)
+
+    params = {"sort_by": sort_by, "sort_order": sort_order}
+    expected = [row["id"] for row in get_items(db, **params)["results"]]
+
+    seen, cursor = [], None
+    while True:
+        page = get_items(db, limit=4 if not seen else 2, cursor=cursor, include_total=False, **params)
+        assert page["total"] is None
+        seen += [row["id"] for row in page["results"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_cursor_must_match_sort(db):
+    with pytest.raises(api.HTTPException) as exc:
+        get_items(db, sort_by="high", cursor=api.encode_cursor("name", "asc", "Abyssal whip", 4151))
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"sort_by": "high", "sort_order": "desc", "limit": 2},
+    {"sort_by": "lowTime", "limit": 2, "offset": 1, "include_total": False},
+    {"search": "dragon", "membership": "false"},
+])
+def test_encoded_page_matches_model(db, monkeypatch, params):
+    # A one-sided price and a non-ASCII name go through the fragment path too
+    db.query(ItemPrice).filter_by(item_id=536).update({"high": None, "highTime": None})
+    db.query(Item).filter_by(id=4587).update({"name": "Dragon scimitar (ørnament)"})
+    db.commit()
+    snapshot.refresh_snapshot(db)
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", True)
+
+    args = dict(limit=50, offset=0, search="", sort_by="name", sort_order="asc", include_total=True)
+    args.update(params)
+    encoded = api.list_items(db, encoded=True, **args)
+    assert isinstance(encoded, bytes)
+    assert encoded == api._encode(api.list_items(db, **args))
+
+
+def test_refresh_reencodes_only_changed_items(db):
+    first = snapshot.refresh_snapshot(db)
+    fragments = {item_id: first.fragment(first.positions[item_id]) for item_id in (561, 4151)}
+    db.query(ItemPrice).filter_by(item_id=561).update({"high": 95})
+    db.commit()
+
+    second = snapshot.refresh_snapshot(db)
+    assert second.fragments[second.positions[4151]] is fragments[4151]
+    assert second.positions[561] not in second.fragments
+    assert b'"high":95.0' in second.fragment(second.positions[561])
+
+
+@pytest.mark.parametrize("use_snapshot", [False, True])
+def test_sparse_fields(db, monkeypatch, use_snapshot):
+    if use_snapshot:
+        snapshot.refresh_snapshot(db)
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", use_snapshot)
+
+    fields = api.parse_fields("high, name,id")
+    assert fields == ("name", "high")
+    body = json.loads(api.list_items(db, sort_by="low", limit=2, fields=fields))
+    assert body["results"] == [{"id": 561, "name": "Nature rune", "high": 90.0},
+                               {"id": 1513, "name": "Magic logs", "high": 1100.0}]
+    full = get_items(db, sort_by="low", limit=2)
+    assert (body["total"], body["next_cursor"]) == (full["total"], full["next_cursor"])
+
+    with pytest.raises(api.HTTPException) as exc:
+        api.parse_fields("name,examine")
+    assert exc.value.status_code == 400
+
+
+def test_sql_listing_is_one_query(db, monkeypatch):
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", False)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        page = get_items(db, include_total=False)
+        assert api.stats(db)["items_with_prices"] == len(ITEMS)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # No per-row lazy loads, and stats in a single query
+    assert page["count"] == len(ITEMS)
+    assert len(statements) == 2
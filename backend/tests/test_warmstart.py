@@ -0,0 +1,70 @@
+import os
+import struct
+
+import pytest
+from datetime import datetime
+
+import api
+import snapshot
+import warmstart
+from models import Item, ItemPrice
+
+
+@pytest.fixture
+def built(db):
+    db.add(Item(id=4151, name="Abyssal whip", members="true", highalch=72000))
+    db.add(ItemPrice(item_id=4151, high=1500000, low=1490000,
+                     highTime=datetime(2024, 3, 20, 12, 0, 0, 123456), lowTime=None))
+    db.add(Item(id=561, name="Nature rune (ø)", members=None, highalch=None))
+    db.add(ItemPrice(item_id=561, high=None, low=88, highTime=None, lowTime=datetime(2024, 3, 20, 11, 59)))
+    db.commit()
+    try:
+        yield snapshot.build_snapshot(db)
+    finally:
+        snapshot.publish(None)
+
+
+def test_round_trip(built, tmp_path, monkeypatch):
+    path = str(tmp_path / "state" / "snapshot.bin")
+    assert warmstart.write_snapshot_file(built, seq=7, path=path)
+    loaded, header = warmstart.read_snapshot_file(path)
+
+    assert header["seq"] == 7 and loaded.version == built.version
+    assert loaded.ids == built.ids
+    assert loaded.columns == built.columns
+    assert loaded.order == built.order
+
+    # The API serves the loaded snapshot exactly as the one it was written from
+    monkeypatch.setattr(api, "SNAPSHOT_ENABLED", True)
+    pages = []
+    for current in (built, loaded):
+        snapshot.publish(current)
+        pages.append(api.list_items(None, sort_by="margin", analytics=True).model_dump())
+    assert pages[0] == pages[1]
+
+
+def test_unusable_files_are_ignored(built, tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot.bin")
+    assert warmstart.read_snapshot_file(path) is None
+    assert not warmstart.write_snapshot_file(built, path="")
+
+    warmstart.write_snapshot_file(built, path=path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # Another format version
+    with open(path, "wb") as f:
+        f.write(struct.pack("<8sII", warmstart.MAGIC, warmstart.FORMAT_VERSION + 1, 0) + data[16:])
+    assert warmstart.read_snapshot_file(path) is None
+
+    # Truncated
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    assert warmstart.read_snapshot_file(path) is None
+
+    # Too old
+    with open(path, "wb") as f:
+        f.write(data)
+    monkeypatch.setattr(warmstart, "SNAPSHOT_FILE_MAX_AGE", -1)
+    assert warmstart.read_snapshot_file(path) is None
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
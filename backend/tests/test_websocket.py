@@ -0,0 +1,215 @@
+import asyncio
+import json
+import struct
+from collections import deque, namedtuple
+from datetime import datetime
+
+import msgpack
+
+import websocket
+from snapshot import PriceSnapshot
+from websocket import ConnectionManager, ClientConnection
+
+Row = namedtuple("Row", "id name members high low highTime lowTime")
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+
+def price(item_id, high):
+    return {"item_id": item_id, "high": high, "low": high - 1,
+            "high_time": datetime(2024, 3, 20), "low_time": datetime(2024, 3, 20)}
+
+
+def test_batches_are_capped_and_slow_client_does_not_block(monkeypatch):
+    async def scenario():
+        manager = ConnectionManager()
+        monkeypatch.setattr(websocket, "manager", manager)
+        monkeypatch.setattr(websocket, "BATCH_MAX_UPDATES", 2)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await websocket.broadcast_price_updates([price(i, 100 + i) for i in range(5)])
+        assert loop.time() - started < 0.1
+
+        await asyncio.sleep(0.01)
+        batches = [m for m in fast.sent if m["type"] == "price_batch"]
+        assert [len(m["updates"]) for m in batches] == [2, 2, 1]
+        assert batches[0]["updates"][0] == {
+            "item_id": 0, "high": 100, "low": 99,
+            "highTime": "2024-03-20T00:00:00", "lowTime": "2024-03-20T00:00:00",
+        }
+        assert slow.sent == []
+
+        manager.disconnect(fast)
+        manager.disconnect(slow)
+        assert not manager.active_connections
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_coalesces_price_batches():
+    async def scenario():
+        client = ClientConnection(FakeWebSocket(), max_queue=2)
+        client.send({"type": "connection_status"})
+        client.send({"type": "price_batch", "updates": [{"item_id": 1, "high": 1}, {"item_id": 2, "high": 2}]})
+        client.send({"type": "price_batch", "updates": [{"item_id": 1, "high": 3}]})
+
+        assert client.coalesced == 1
+        assert list(client.queue) == [
+            {"type": "connection_status"},
+            {"type": "price_batch", "updates": [{"item_id": 1, "high": 3}, {"item_id": 2, "high": 2}]},
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_updates_are_routed_to_subscribers(monkeypatch):
+    async def scenario():
+        manager = ConnectionManager()
+        monkeypatch.setattr(websocket, "manager", manager)
+        firehose, watcher, filtered = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws in (firehose, watcher, filtered):
+            await manager.connect(ws)
+
+        manager.subscribe(watcher, item_ids=[1, 2])
+        manager.subscribe(watcher, item_ids=[3], replace=True)
+        manager.subscribe(filtered, price_filter=websocket.PriceFilter.from_message({"min_high": 150}))
+        assert set(manager.subscribers) == {3}
+
+        await websocket.broadcast_price_updates([price(i, 100 * i) for i in range(1, 4)])
+        await asyncio.sleep(0.01)
+
+        def received(ws):
+            return [u["item_id"] for m in ws.sent if m["type"] == "price_batch" for u in m["updates"]]
+
+        assert received(firehose) == [1, 2, 3]
+        assert received(watcher) == [3]
+        assert received(filtered) == [2, 3]
+
+        manager.disconnect(watcher)
+        assert manager.subscribers == {}
+
+    asyncio.run(scenario())
+
+
+def test_empty_watchlist_receives_nothing(monkeypatch):
+    async def scenario():
+        manager = ConnectionManager()
+        monkeypatch.setattr(websocket, "manager", manager)
+        page = FakeWebSocket()
+        await manager.connect(page)
+
+        # A page with results, then an empty one
+        manager.subscribe(page, item_ids=[1], replace=True)
+        manager.subscribe(page, item_ids=[], replace=True)
+        assert manager.subscription(page)["subscribed"] and manager.subscribers == {}
+
+        await websocket.broadcast_price_updates([price(i, 100 * i) for i in range(1, 4)])
+        await asyncio.sleep(0.01)
+        assert not [m for m in page.sent if m["type"] == "price_batch"]
+
+        # Only a bare unsubscribe returns it to the firehose
+        manager.clear_subscriptions(page)
+        await websocket.broadcast_price_updates([price(1, 100)])
+        await asyncio.sleep(0.01)
+        assert [m["type"] for m in page.sent].count("price_batch") == 1
+
+    asyncio.run(scenario())
+
+
+def test_batches_are_encoded_once_per_format(monkeypatch):
+    async def scenario():
+        manager = ConnectionManager()
+        monkeypatch.setattr(websocket, "manager", manager)
+        sockets = {encoding: [FakeWebSocket(), FakeWebSocket()] for encoding in ("json", "msgpack", "packed")}
+        for encoding, pair in sockets.items():
+            for ws in pair:
+                await manager.connect(ws, encoding=encoding)
+        fallback = FakeWebSocket()
+        await manager.connect(fallback, encoding="xml")
+
+        encoded = []
+        original = websocket.ENCODERS["packed"]
+        monkeypatch.setitem(websocket.ENCODERS, "packed", lambda m: encoded.append(m) or original(m))
+
+        await websocket.broadcast_price_updates([price(4151, 1500000), {**price(536, 0), "high": None, "low": None}])
+        await asyncio.sleep(0.01)
+
+        assert len([m for m in encoded if m["type"] == "price_batch"]) == 1
+        assert fallback.sent[0]["encoding"] == "json"
+
+        packed = sockets["packed"][0].sent[-1]
+        assert packed is sockets["packed"][1].sent[-1]
+        kind, version, seq, count = struct.unpack_from("<BBII", packed)
+        assert (kind, version, seq, count) == (1, 2, 1, 2)
+        stamp = int(datetime(2024, 3, 20).timestamp())
+        assert list(struct.iter_unpack("<IiiII", packed[10:])) == [
+            (4151, 1500000, 1499999, stamp, stamp),
+            (536, -1, -1, stamp, stamp),
+        ]
+
+        batch = msgpack.unpackb(sockets["msgpack"][0].sent[-1])
+        assert batch["fields"] == ["item_id", "high", "low", "highTime", "lowTime"]
+        assert batch["updates"][0] == [4151, 1500000, 1499999, stamp, stamp]
+
+        assert sockets["json"][0].sent[-1]["updates"][1]["high"] is None
+        assert sockets["json"][0].sent[-1] == sockets["json"][1].sent[-1]
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_replays_missed_cycles_or_sends_snapshot(monkeypatch):
+    async def scenario():
+        manager = ConnectionManager()
+        monkeypatch.setattr(websocket, "manager", manager)
+        manager.history = deque(maxlen=2)
+        for cycle in range(1, 4):
+            await websocket.broadcast_price_updates([price(cycle, 100 * cycle), price(9, cycle)])
+        assert manager.seq == 3
+
+        # Cycles 2 and 3 are buffered: merged, newest price per item
+        resumed = FakeWebSocket()
+        await manager.connect(resumed, since=1)
+        await asyncio.sleep(0.01)
+        assert resumed.sent[0]["seq"] == 3
+        batch = resumed.sent[1]
+        assert (batch["type"], batch["seq"]) == ("price_batch", 3)
+        assert {u["item_id"]: u["high"] for u in batch["updates"]} == {2: 200, 3: 300, 9: 3}
+
+        current = FakeWebSocket()
+        await manager.connect(current, since=3)
+        await asyncio.sleep(0.01)
+        assert len(current.sent) == 1
+
+        # Cycle 1 has been evicted: fall back to a full snapshot
+        monkeypatch.setattr(websocket, "get_snapshot", lambda: PriceSnapshot([
+            Row(9, "Feather", "false", 3, 2, datetime(2024, 3, 20), None),
+        ], version=7))
+        behind = FakeWebSocket()
+        await manager.connect(behind, since=0)
+        await asyncio.sleep(0.01)
+        assert behind.sent[1] == {
+            "type": "price_snapshot", "seq": 3,
+            "updates": [{"item_id": 9, "high": 3, "low": 2, "highTime": "2024-03-20T00:00:00", "lowTime": None}],
+        }
+        assert manager.full_snapshot() is manager.full_snapshot()
+
+    asyncio.run(scenario())
@@ -0,0 +1,188 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from analytics import ANALYTICS_FIELDS, to_floats
+from snapshot import PriceSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Latest snapshot persisted by the leader after each refresh and loaded by
+# every worker at boot; empty disables writing and loading it
+SNAPSHOT_FILE = os.getenv("PRICE_SNAPSHOT_FILE", "")
+# Older files are ignored at boot rather than serving very stale prices
+SNAPSHOT_FILE_MAX_AGE = float(os.getenv("PRICE_SNAPSHOT_FILE_MAX_AGE", "86400"))
+
+MAGIC = b"OSRSSNAP"
+# Bump whenever the layout or the stored columns change; other versions are ignored
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+
+EPOCH = datetime(1970, 1, 1)
+# Stored for a missing time
+NO_TIME = np.iinfo(np.int64).min
+STRING_COLUMNS = ("name", "members")
+PRICE_COLUMNS = ("high", "low")
+TIME_COLUMNS = ("highTime", "lowTime")
+
+
+class SnapshotRow(NamedTuple):
+    id: int
+    name: Optional[str]
+    members: Optional[str]
+    high: Optional[float]
+    low: Optional[float]
+    highTime: Optional[datetime]
+    lowTime: Optional[datetime]
+
+
+def _pad(size: int) -> int:
+    return -size % 8
+
+
+def _micros(values) -> np.ndarray:
+    # Naive datetimes, as stored; microseconds keep them exact
+    return np.array([NO_TIME if value is None else (value - EPOCH) // timedelta(microseconds=1)
+                     for value in values], dtype=np.int64)
+
+
+def _strings(name: str, values) -> Dict[str, np.ndarray]:
+    encoded = [b"" if value is None else value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {
+        f"{name}.offsets": offsets,
+        f"{name}.nulls": np.array([value is None for value in values], dtype=np.uint8),
+        f"{name}.data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    }
+
+
+def encode(snapshot: PriceSnapshot, seq: int = 0) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """The header and the arrays stored for ``snapshot``."""
+    columns = snapshot.columns
+    arrays = {"ids": np.array(snapshot.ids, dtype=np.int64)}
+    for column in STRING_COLUMNS:
+        arrays.update(_strings(column, columns[column]))
+    for column in PRICE_COLUMNS + ANALYTICS_FIELDS:
+        arrays[column] = to_floats(columns[column])
+    for column in TIME_COLUMNS:
+        arrays[column] = _micros(columns[column])
+
+    header = {
+        "count": len(snapshot),
+        "version": snapshot.version,
+        "seq": seq,
+        "written_at": time.time(),
+        "analytics": list(ANALYTICS_FIELDS),
+        "arrays": {},
+    }
+    offset = 0
+    for key, values in arrays.items():
+        header["arrays"][key] = {"dtype": values.dtype.str, "offset": offset, "count": len(values)}
+        offset += values.nbytes + _pad(values.nbytes)
+    return header, arrays
+
+
+def write_snapshot_file(snapshot: PriceSnapshot, seq: int = 0, path: Optional[str] = None) -> bool:
+    """Atomically replace the warm-start file; False if it could not be written.
+
+    Layout, little-endian: the magic, the format version and the length of
+    a JSON header (two uint32), the header padded to 8 bytes, then each
+    array at the 8-byte aligned offset the header gives, so every column
+    can be read straight out of a memory map.
+    """
+    path = path if path is not None else SNAPSHOT_FILE
+    if not path:
+        return False
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        header, arrays = encode(snapshot, seq)
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes + b"\0" * _pad(PREAMBLE.size + len(header_bytes)))
+            for values in arrays.values():
+                f.write(values.tobytes() + b"\0" * _pad(values.nbytes))
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers see the old file or the new one, never a partial write
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Error writing snapshot file {path}: {e}", exc_info=True)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def _decode_strings(arrays: Dict[str, np.ndarray], name: str) -> tuple:
+    offsets = arrays[f"{name}.offsets"].tolist()
+    nulls = arrays[f"{name}.nulls"].tolist()
+    data = arrays[f"{name}.data"].tobytes()
+    return tuple(None if nulls[i] else data[offsets[i]:offsets[i + 1]].decode("utf-8")
+                 for i in range(len(nulls)))
+
+
+def _decode_times(values: np.ndarray) -> tuple:
+    return tuple(None if value == NO_TIME else EPOCH + timedelta(microseconds=value) for value in values.tolist())
+
+
+def _decode_floats(values: np.ndarray) -> tuple:
+    return tuple(None if value != value else value for value in values.tolist())
+
+
+def read_snapshot_file(path: Optional[str] = None) -> Optional[Tuple[PriceSnapshot, dict]]:
+    """``(snapshot, header)`` from the warm-start file, or None if there is no usable one."""
+    path = path if path is not None else SNAPSHOT_FILE
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, header_size = PREAMBLE.unpack_from(mm)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                logger.info(f"Ignoring snapshot file {path}: format {version}, expected {FORMAT_VERSION}")
+                return None
+            header = json.loads(mm[PREAMBLE.size:PREAMBLE.size + header_size])
+            if list(header["analytics"]) != list(ANALYTICS_FIELDS):
+                logger.info(f"Ignoring snapshot file {path}: written with other analytics fields")
+                return None
+            age = time.time() - header["written_at"]
+            if age > SNAPSHOT_FILE_MAX_AGE:
+                logger.info(f"Ignoring snapshot file {path}: {age:.0f}s old")
+                return None
+
+            base = PREAMBLE.size + header_size + _pad(PREAMBLE.size + header_size)
+            arrays = {
+                key: np.frombuffer(mm, dtype=spec["dtype"], count=spec["count"], offset=base + spec["offset"])
+                for key, spec in header["arrays"].items()
+            }
+            try:
+                count = header["count"]
+                columns = [arrays["ids"].tolist()]
+                columns += [_decode_strings(arrays, column) for column in STRING_COLUMNS]
+                columns += [_decode_floats(arrays[column]) for column in PRICE_COLUMNS]
+                columns += [_decode_times(arrays[column]) for column in TIME_COLUMNS]
+                # Copies, so the map can be closed
+                signals = {field: arrays[field].copy() for field in ANALYTICS_FIELDS}
+            finally:
+                # Views into the map must go before it is closed
+                del arrays
+        if any(len(column) != count for column in columns):
+            raise ValueError("column lengths do not match the header")
+        rows = [SnapshotRow(*values) for values in zip(*columns)]
+        return PriceSnapshot(rows, version=header["version"], signals=signals), header
+    except Exception as e:
+        logger.error(f"Error reading snapshot file {path}: {e}", exc_info=True)
+        return None
@@ -1,69 +1,500 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from typing import Dict, Iterable, List, Optional, Set
+from collections import deque
 from datetime import datetime
+from snapshot import get_snapshot
+import asyncio
+import json
 import logging
+import os
+import struct
 import traceback
 
+try:
+    import msgpack
+except ImportError:  # optional: "msgpack" encoding is then unavailable
+    msgpack = None
+
 logger = logging.getLogger(__name__)
 
+# Maximum number of price entries carried by one batch message
+BATCH_MAX_UPDATES = int(os.getenv("WS_BATCH_MAX_UPDATES", "1000"))
+# Messages a client may have pending before its queue is coalesced
+CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "8"))
+# Refresh cycles kept for clients resuming with ?since=<seq>
+REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "256"))
+
+PRICE_FIELDS = ("item_id", "high", "low", "highTime", "lowTime")
+# Binary price frame: kind, format version, sequence number and entry
+# count, then one record per entry. Missing prices are -1 and missing times 0.
+PACKED_HEADER = struct.Struct("<BBII")
+PACKED_ENTRY = struct.Struct("<IiiII")
+PACKED_KINDS = {"price_batch": 1, "price_snapshot": 2}
+PACKED_VERSION = 2
+
+
+class SharedMessage(dict):
+    """A message sent to many clients, encoded once per wire format."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frames: Dict[str, object] = {}
+
+
+def _iso(timestamp: Optional[int]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def _encode_json(message: Dict) -> str:
+    if message.get("type") in PACKED_KINDS:
+        message = {**message, "updates": [
+            {**entry, "highTime": _iso(entry["highTime"]), "lowTime": _iso(entry["lowTime"])}
+            for entry in message["updates"]
+        ]}
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def _encode_msgpack(message: Dict) -> bytes:
+    if message.get("type") in PACKED_KINDS:
+        # Rows instead of repeated keys; times stay epoch seconds
+        message = {**message, "fields": PRICE_FIELDS, "updates": [
+            [entry[field] for field in PRICE_FIELDS] for entry in message["updates"]
+        ]}
+    return msgpack.packb(message)
+
+
+def _encode_packed(message: Dict):
+    kind = PACKED_KINDS.get(message.get("type"))
+    if kind is None:
+        return _encode_json(message)
+    updates = message["updates"]
+    frame = bytearray(PACKED_HEADER.size + PACKED_ENTRY.size * len(updates))
+    PACKED_HEADER.pack_into(frame, 0, kind, PACKED_VERSION, message.get("seq") or 0, len(updates))
+    offset = PACKED_HEADER.size
+    for entry in updates:
+        PACKED_ENTRY.pack_into(
+            frame, offset, entry["item_id"],
+            -1 if entry["high"] is None else int(entry["high"]),
+            -1 if entry["low"] is None else int(entry["low"]),
+            entry["highTime"] or 0, entry["lowTime"] or 0
+        )
+        offset += PACKED_ENTRY.size
+    return bytes(frame)
+
+
+ENCODERS = {"json": _encode_json, "packed": _encode_packed}
+if msgpack is not None:
+    ENCODERS["msgpack"] = _encode_msgpack
+
+
+def encode_message(message: Dict, encoding: str):
+    """Wire frame for ``message``: ``str`` for text frames, ``bytes`` for binary."""
+    frames = getattr(message, "frames", None)
+    if frames is None:
+        return ENCODERS[encoding](message)
+    frame = frames.get(encoding)
+    if frame is None:
+        frame = frames[encoding] = ENCODERS[encoding](message)
+    return frame
+
+
+class PriceFilter:
+    """Server-side predicate mirroring the /api/items-prices filters."""
+
+    RANGE_FIELDS = ("min_high", "max_high", "min_low", "max_low")
+
+    def __init__(self, search: str = "", membership: Optional[str] = None, **ranges):
+        self.search = (search or "").lower()
+        self.membership = membership or None
+        self.ranges = {
+            field: float(ranges[field])
+            for field in self.RANGE_FIELDS
+            if ranges.get(field) is not None
+        }
+
+    @classmethod
+    def from_message(cls, data: Dict) -> "PriceFilter":
+        fields = ("search", "membership") + cls.RANGE_FIELDS
+        return cls(**{k: v for k, v in data.items() if k in fields})
+
+    @property
+    def key(self) -> tuple:
+        return (self.search, self.membership, tuple(sorted(self.ranges.items())))
+
+    def to_dict(self) -> Dict:
+        return {"search": self.search, "membership": self.membership, **self.ranges}
+
+    def matches(self, entry: Dict, snapshot=None) -> bool:
+        for field, bound in self.ranges.items():
+            value = entry["high"] if field.endswith("high") else entry["low"]
+            if value is None:
+                return False
+            if field.startswith("min") and value < bound:
+                return False
+            if field.startswith("max") and value > bound:
+                return False
+
+        if self.search or self.membership:
+            # Name and membership come from the snapshot the API serves
+            pos = snapshot.positions.get(entry["item_id"]) if snapshot is not None else None
+            if pos is None:
+                return False
+            if self.search and self.search not in snapshot.names_lower[pos]:
+                return False
+            if self.membership and snapshot.columns["members"][pos] != self.membership:
+                return False
+        return True
+
+
+class ClientConnection:
+    """A connected socket with its own writer task and bounded send queue.
+
+    Broadcasting only enqueues, so a slow client never delays the others.
+    When the queue is full, pending price batches are merged into one that
+    keeps the newest price per item; other messages are dropped oldest
+    first if that is still not enough.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int = CLIENT_QUEUE_SIZE, on_error=None,
+                 encoding: str = "json", client_id: Optional[str] = None):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.client_id = client_id
+        self.max_queue = max_queue
+        self.on_error = on_error
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+        self.item_ids: Set[int] = set()
+        self.filter: Optional[PriceFilter] = None
+        # Set by the first subscribe, cleared only by a bare unsubscribe
+        self.watching = False
+
+    @property
+    def subscribed(self) -> bool:
+        """Clients that never subscribed receive every update.
+
+        A subscribed client whose watchlist is empty (e.g. it shows an
+        empty page) receives nothing rather than falling back to the
+        firehose.
+        """
+        return self.watching
+
+    def start(self):
+        self.task = asyncio.create_task(self._writer())
+
+    def close(self):
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+        self.queue.clear()
+
+    def send(self, message: Dict):
+        if len(self.queue) >= self.max_queue:
+            self._coalesce(message)
+        else:
+            self.queue.append(message)
+        self.ready.set()
+
+    def _coalesce(self, message: Dict):
+        merged = {}
+        seq = None
+        others = deque()
+        for queued in (*self.queue, message):
+            if queued.get("type") == "price_batch":
+                for update in queued["updates"]:
+                    merged[update["item_id"]] = update
+                if queued.get("seq") is not None:
+                    seq = max(seq or 0, queued["seq"])
+            else:
+                others.append(queued)
+
+        limit = self.max_queue - 1 if merged else self.max_queue
+        while len(others) > limit:
+            others.popleft()
+            self.dropped += 1
+        if merged:
+            batch = {"type": "price_batch", "updates": list(merged.values())}
+            if seq is not None:
+                batch["seq"] = seq
+            others.append(batch)
+
+        self.queue = others
+        self.coalesced += 1
+        logger.debug(f"Coalesced send queue for slow client ({len(merged)} pending prices)")
+
+    async def _writer(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    frame = encode_message(self.queue.popleft(), self.encoding)
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+                self.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending WebSocket message: {e}")
+            if self.on_error is not None:
+                self.on_error(self.websocket)
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        # Reverse index of watched item ids to the clients watching them
+        self.subscribers: Dict[int, Set[ClientConnection]] = {}
+        self.filtered_clients: Set[ClientConnection] = set()
+        # Sockets per alert owner, see alerts.py
+        self.alert_clients: Dict[str, Set[ClientConnection]] = {}
+        # Sequence number of the latest refresh cycle and the recent cycles' entries
+        self.seq = 0
+        self.history: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self._full_snapshot = (None, None)
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, encoding: str = "json", since: Optional[int] = None,
+                      client_id: Optional[str] = None):
+        """Accept a socket; ``encoding`` picks the wire format of its price batches.
+
+        Unknown or unavailable encodings fall back to JSON; the one in use
+        is reported in the ``connection_status`` message. A client that
+        last saw sequence number ``since`` is caught up right away; see
+        ``resume``. Price alerts owned by ``client_id`` are delivered here.
+        """
         try:
             await websocket.accept()
-            self.active_connections.append(websocket)
+            if encoding not in ENCODERS:
+                encoding = "json"
+            client = ClientConnection(websocket, on_error=self.disconnect, encoding=encoding, client_id=client_id)
+            self.active_connections[websocket] = client
+            if client_id:
+                self.alert_clients.setdefault(client_id, set()).add(client)
             logger.info(f"New WebSocket connection established. Total connections: {len(self.active_connections)}")
-            
+
             # Send initial connection success message
-            await websocket.send_json({
+            client.send({
                 "type": "connection_status",
                 "status": "connected",
-                "message": "Successfully connected to WebSocket server"
+                "message": "Successfully connected to WebSocket server",
+                "encoding": encoding,
+                "seq": self.seq
             })
+            if since is not None:
+                self.resume(client, since)
+            client.start()
         except Exception as e:
             logger.error(f"Error accepting WebSocket connection: {e}")
             logger.error(traceback.format_exc())
             raise
 
+    def resume(self, client: ClientConnection, since: int):
+        """Send what a reconnecting client missed after cycle ``since``.
+
+        Missed cycles still in the replay buffer are merged into price
+        batches holding the newest entry per item. A client further behind,
+        or ahead of this server after a restart, gets a full price_snapshot.
+        """
+        if since == self.seq:
+            return
+        if 0 <= since < self.seq and self.history and self.history[0][0] <= since + 1:
+            missed: Dict[int, Dict] = {}
+            for seq, entries in self.history:
+                if seq > since:
+                    for entry in entries:
+                        missed[entry["item_id"]] = entry
+            for batch in _batches(list(missed.values()), self.seq):
+                client.send(batch)
+            return
+
+        message = self.full_snapshot()
+        if message is not None:
+            client.send(message)
+
+    def full_snapshot(self) -> Optional[SharedMessage]:
+        """Every current price as one message, shared until the data changes."""
+        snapshot = get_snapshot()
+        if snapshot is None:
+            return None
+        key = (snapshot.version, self.seq)
+        if self._full_snapshot[0] != key:
+            columns = snapshot.columns
+            entries = [
+                price_entry(item_id, columns["high"][pos], columns["low"][pos],
+                            columns["highTime"][pos], columns["lowTime"][pos])
+                for pos, item_id in enumerate(snapshot.ids)
+            ]
+            self._full_snapshot = (key, SharedMessage(type="price_snapshot", seq=self.seq, updates=entries))
+        return self._full_snapshot[1]
+
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client is not None:
+            self.clear_subscriptions(websocket, client=client)
+            owned = self.alert_clients.get(client.client_id)
+            if owned is not None:
+                owned.discard(client)
+                if not owned:
+                    del self.alert_clients[client.client_id]
+            client.close()
             logger.info(f"WebSocket connection closed. Remaining connections: {len(self.active_connections)}")
 
+    def send_personal(self, websocket: WebSocket, message: Dict):
+        """Queue a message for one client behind anything already pending."""
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.send(message)
+
+    def subscribe(self, websocket: WebSocket, item_ids: Iterable[int] = (),
+                  price_filter: Optional[PriceFilter] = None, replace: bool = False):
+        """Watch item ids and/or replace the client's filter predicate.
+
+        With ``replace`` the given ids become the whole watchlist, which
+        may be empty.
+        """
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        client.watching = True
+        item_ids = {int(item_id) for item_id in item_ids}
+        if replace:
+            self.unsubscribe(websocket, item_ids=client.item_ids - item_ids, client=client)
+
+        for item_id in item_ids - client.item_ids:
+            self.subscribers.setdefault(item_id, set()).add(client)
+        client.item_ids |= item_ids
+
+        if price_filter is not None:
+            client.filter = price_filter
+            self.filtered_clients.add(client)
+
+    def unsubscribe(self, websocket: WebSocket, item_ids: Iterable[int] = (),
+                    price_filter: bool = False, client: Optional[ClientConnection] = None):
+        client = client or self.active_connections.get(websocket)
+        if client is None:
+            return
+        for item_id in {int(item_id) for item_id in item_ids}:
+            watchers = self.subscribers.get(item_id)
+            if watchers is not None:
+                watchers.discard(client)
+                if not watchers:
+                    del self.subscribers[item_id]
+            client.item_ids.discard(item_id)
+
+        if price_filter:
+            client.filter = None
+            self.filtered_clients.discard(client)
+
+    def clear_subscriptions(self, websocket: WebSocket, client: Optional[ClientConnection] = None):
+        client = client or self.active_connections.get(websocket)
+        if client is not None:
+            self.unsubscribe(websocket, item_ids=client.item_ids, price_filter=True, client=client)
+            client.watching = False
+
+    def subscription(self, websocket: WebSocket) -> Dict:
+        client = self.active_connections.get(websocket)
+        return {
+            "type": "subscription",
+            "item_ids": sorted(client.item_ids) if client else [],
+            "filter": client.filter.to_dict() if client and client.filter else None,
+            # False means every update is sent
+            "subscribed": client.subscribed if client else False,
+        }
+
     async def broadcast(self, message: Dict):
-        if not self.active_connections:
+        for client in list(self.active_connections.values()):
+            client.send(message)
+
+    async def broadcast_prices(self, entries: List[Dict], seq: Optional[int] = None):
+        """Send each price entry only to the clients interested in it.
+
+        Unsubscribed clients share the full batch. Watchlist clients are
+        found through the reverse index, and each distinct filter is
+        evaluated once no matter how many clients share it. Every batch of
+        the cycle carries ``seq``, the next sequence number by default.
+        """
+        if not entries:
             return
+        seq = seq if seq is not None else self.seq + 1
+        self.seq = max(self.seq, seq)
+        self.history.append((seq, entries))
+
+        routed: Dict[ClientConnection, List[Dict]] = {}
+        for entry in entries:
+            for client in self.subscribers.get(entry["item_id"], ()):
+                routed.setdefault(client, []).append(entry)
 
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-                logger.error(traceback.format_exc())
-                disconnected.append(connection)
+        if self.filtered_clients:
+            snapshot = get_snapshot()
+            by_filter: Dict[tuple, List[ClientConnection]] = {}
+            for client in self.filtered_clients:
+                by_filter.setdefault(client.filter.key, []).append(client)
+            for clients in by_filter.values():
+                matched = [entry for entry in entries if clients[0].filter.matches(entry, snapshot)]
+                for client in clients:
+                    extra = [entry for entry in matched if entry["item_id"] not in client.item_ids]
+                    if extra:
+                        routed.setdefault(client, []).extend(extra)
 
-        # Clean up broken connections
-        for connection in disconnected:
-            self.disconnect(connection)
+        firehose = [client for client in self.active_connections.values() if not client.subscribed]
+        for batch in _batches(entries, seq):
+            for client in firehose:
+                client.send(batch)
+        for client, client_entries in routed.items():
+            for batch in _batches(client_entries, seq):
+                client.send(batch)
+
+    def send_alerts(self, alerts: List[Dict]):
+        """Deliver triggered ``price_alert`` messages to their owners' sockets."""
+        for alert in alerts:
+            for client in self.alert_clients.get(alert.get("client_id"), ()):
+                client.send(alert)
 
 
 manager = ConnectionManager()
 
 
-async def broadcast_price_update(item_id: int, high: float, low: float, high_time: datetime, low_time: datetime):
+def _batches(entries: List[Dict], seq: int):
+    for start in range(0, len(entries), BATCH_MAX_UPDATES):
+        yield SharedMessage(type="price_batch", seq=seq, updates=entries[start:start + BATCH_MAX_UPDATES])
+
+
+def price_entry(item_id: int, high: float, low: float, high_time: datetime, low_time: datetime) -> Dict:
+    """Price entry as carried by ``price_batch`` messages.
+
+    Times are epoch seconds; the JSON encoding renders them as ISO strings.
+    """
+    return {
+        "item_id": item_id,
+        "high": high,
+        "low": low,
+        "highTime": int(high_time.timestamp()) if high_time else None,
+        "lowTime": int(low_time.timestamp()) if low_time else None,
+    }
+
+
+async def broadcast_price_updates(updates: List[Dict]):
+    """Broadcast one refresh cycle's changed prices as batch messages.
+
+    ``updates`` holds dicts with ``item_id``, ``high``, ``low``,
+    ``high_time`` and ``low_time``. Batches are capped at
+    ``BATCH_MAX_UPDATES`` entries.
+    """
     try:
-        message = {
-            "type": "price_update",
-            "item_id": item_id,
-            "high": high,
-            "low": low,
-            "highTime": high_time.isoformat() if high_time else None,
-            "lowTime": low_time.isoformat() if low_time else None,
-        }
-        await manager.broadcast(message)
+        await manager.broadcast_prices([price_entry(**update) for update in updates])
     except Exception as e:
-        logger.error(f"Error broadcasting price update: {e}")
+        logger.error(f"Error broadcasting price updates: {e}")
         logger.error(traceback.format_exc())
+
+
+async def broadcast_price_update(item_id: int, high: float, low: float, high_time: datetime, low_time: datetime):
+    await broadcast_price_updates([{
+        "item_id": item_id,
+        "high": high,
+        "low": low,
+        "high_time": high_time,
+        "low_time": low_time,
+    }])
@@ -74,6 +74,7 @@ export function useItemsData() {
 
       setRows(updatedRows);
       setTotal(response.total);
+      websocketService.watchItems(response.results.map(item => item.id));
       setError(null);
     } catch (e) {
       setError(e.message || 'Failed to fetch data. Please try again later.');
@@ -108,32 +109,42 @@ export function useItemsData() {
   // WebSocket subscription for real-time updates
   useEffect(() => {
     const unsubscribe = websocketService.subscribe((data) => {
-      if (data.type === 'price_update') {
-        setRows(currentRows => {
-          const updatedRows = currentRows.map(row => {
-            // Convert both IDs to strings for comparison since row.id is a string
-            if (row.id === String(data.item_id)) {
-              // Store old prices in ref
-              oldPricesRef.current.set(data.item_id, {
-                high: row.high,
-                low: row.low
-              });
-
-              return {
-                ...row,
-                oldHigh: row.high,
-                oldLow: row.low,
-                high: data.high,
-                low: data.low,
-                highTime: data.highTime,
-                lowTime: data.lowTime,
-              };
-            }
-            return row;
-          });
-          return updatedRows;
-        });
+      let updates;
+      if (data.type === 'price_batch' || data.type === 'price_snapshot') {
+        updates = data.updates;
+      } else if (data.type === 'price_update') {
+        updates = [data];
+      } else {
+        return;
       }
+
+      // Index the batch by item id so each row is matched in one lookup
+      const updatesById = new Map(updates.map(update => [String(update.item_id), update]));
+
+      setRows(currentRows => {
+        const updatedRows = currentRows.map(row => {
+          const update = updatesById.get(row.id);
+          if (update) {
+            // Store old prices in ref
+            oldPricesRef.current.set(update.item_id, {
+              high: row.high,
+              low: row.low
+            });
+
+            return {
+              ...row,
+              oldHigh: row.high,
+              oldLow: row.low,
+              high: update.high,
+              low: update.low,
+              highTime: update.highTime,
+              lowTime: update.lowTime,
+            };
+          }
+          return row;
+        });
+        return updatedRows;
+      });
     });
 
     return () => {
@@ -10,6 +10,9 @@ class WebSocketService {
     this.connectionTimeout = null;
     this.baseUrl = process.env.REACT_APP_WS_URL || 'ws://localhost:8000/ws';
     this.heartbeatInterval = null;
+    this.subscription = null;
+    // Sequence number of the last price message, used to resume after a reconnect
+    this.lastSeq = null;
   }
 
   connect() {
@@ -20,7 +23,8 @@ class WebSocketService {
     this.isConnecting = true;
 
     try {
-      this.ws = new WebSocket(this.baseUrl);
+      const url = this.lastSeq === null ? this.baseUrl : `${this.baseUrl}?since=${this.lastSeq}`;
+      this.ws = new WebSocket(url);
 
       // Set connection timeout
       this.connectionTimeout = setTimeout(() => {
@@ -42,6 +46,11 @@ class WebSocketService {
 
         // Start heartbeat
         this.startHeartbeat();
+
+        // Restore the server-side watchlist after a reconnect
+        if (this.subscription) {
+          this.send(this.subscription);
+        }
       };
 
       this.ws.onclose = (event) => {
@@ -73,6 +82,9 @@ class WebSocketService {
       this.ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          if (data.seq !== undefined && (data.type === 'price_batch' || data.type === 'price_snapshot')) {
+            this.lastSeq = data.seq;
+          }
           if (data.type === 'heartbeat') {
             // Respond to heartbeat
             this.ws.send(JSON.stringify({ type: 'pong' }));
@@ -96,6 +108,20 @@ class WebSocketService {
     }
   }
 
+  send(message) {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(JSON.stringify(message));
+    }
+  }
+
+  // Only receive price updates for these items. An empty list watches
+  // nothing; the server only falls back to every update after a bare
+  // unsubscribe.
+  watchItems(itemIds) {
+    this.subscription = { type: 'subscribe', item_ids: itemIds, replace: true };
+    this.send(this.subscription);
+  }
+
   startHeartbeat() {
     this.stopHeartbeat(); // Clear any existing heartbeat
     this.heartbeatInterval = setInterval(() => {
@@ -0,0 +1,27 @@
+import { websocketService } from './websocket';
+
+describe('WebSocket watchlist', () => {
+  let sent;
+
+  beforeEach(() => {
+    sent = [];
+    websocketService.ws = { readyState: WebSocket.OPEN, send: (data) => sent.push(JSON.parse(data)) };
+  });
+
+  afterEach(() => {
+    websocketService.ws = null;
+    websocketService.subscription = null;
+  });
+
+  it('sends an empty watchlist for an empty page', () => {
+    websocketService.watchItems([4151]);
+    websocketService.watchItems([]);
+
+    expect(sent).toEqual([
+      { type: 'subscribe', item_ids: [4151], replace: true },
+      { type: 'subscribe', item_ids: [], replace: true },
+    ]);
+    // Restored as-is after a reconnect, never as an unsubscribe
+    expect(websocketService.subscription).toEqual({ type: 'subscribe', item_ids: [], replace: true });
+  });
+});